@@ -0,0 +1,149 @@
+"""Rolling per-bank aggregates (GET /stats): update cost, snapshot cost vs window size, memory, quantile accuracy.
+
+Feeds services.aggregates.RollingAggregates --payments payments per size (amounts log-normal, 8 banks, outcomes
+and reasons as /pay produces them) over a simulated window, and compares with the obvious alternative: keep every
+payment in the window and sort on each query. Reports per record() cost (1 and --threads threads), snapshot p50,
+traced memory, and the worst relative error of p50/p90/p99 against exact quantiles, for one process and for
+--replicas replicas merged with merge_snapshots().
+
+    python scripts/bench/aggregates.py --payments 1000 100000 1000000 --replicas 4
+"""
+import sys, time, random, argparse, threading, tracemalloc
+
+from common import REPO_ROOT, percentile, save_results
+
+sys.path.insert(0, str(REPO_ROOT))
+from services.aggregates import QUANTILES, RollingAggregates, merge_snapshots  # noqa: E402
+from services.banks import BANK_IDS  # noqa: E402
+
+REASONS = ["Request timeout", "Insufficient funds", "Invalid recipient", "incorrect card details", "Suspected Fraud"]
+WINDOW = 300.0
+
+
+class Clock:
+    """Simulated time, starting on a bucket boundary."""
+
+    def __init__(self):
+        self.now = 999_990.0
+
+    def __call__(self):
+        return self.now
+
+
+def payments(n: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        failed = rng.random() < 0.15
+        out.append((rng.choice(BANK_IDS), "failed" if failed else "settled", round(rng.lognormvariate(4, 1), 2),
+                    rng.choice(REASONS) if failed else None))
+    return out
+
+
+def feed(agg: RollingAggregates, clock: Clock, data: list) -> float:
+    # Spread over 9/10 of the window so that none of it has expired by the end
+    step = WINDOW * 0.9 / len(data)
+    t0 = time.perf_counter()
+    for p in data:
+        clock.now += step
+        agg.record(*p)
+    return time.perf_counter() - t0
+
+
+def threaded_record(data: list, threads: int) -> float:
+    """Microseconds per record() with `threads` threads recording at once (real clock)."""
+    agg = RollingAggregates(BANK_IDS, window=WINDOW)
+    chunks = [data[i::threads] for i in range(threads)]
+    pool = [threading.Thread(target=lambda c=c: [agg.record(*p) for p in c]) for c in chunks]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return (time.perf_counter() - t0) / len(data) * 1e6
+
+
+def exact(data: list) -> dict:
+    by_bank = {}
+    for bank, _, amount, _ in data:
+        by_bank.setdefault(bank, []).append(amount)
+    out = {}
+    for bank, amounts in by_bank.items():
+        amounts.sort()
+        out[bank] = {f"p{round(q * 100)}": amounts[int(q * (len(amounts) - 1))] for q in QUANTILES}
+    return out
+
+
+def max_rel_error(snap: dict, truth: dict) -> float:
+    return max(abs(snap["banks"][bank]["amount"][k] - v) / v for bank, qs in truth.items() for k, v in qs.items())
+
+
+def timed(fn, n: int) -> float:
+    lat = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        lat.append((time.perf_counter() - t0) * 1e6)
+    lat.sort()
+    return round(percentile(lat, 50), 1)
+
+
+def run(n: int, threads: int, replicas: int, samples: int) -> dict:
+    data = payments(n)
+    clock = Clock()
+    agg = RollingAggregates(BANK_IDS, window=WINDOW, clock=clock)
+    elapsed = feed(agg, clock, data)
+    clock = Clock()
+    tracemalloc.start()
+    measured = RollingAggregates(BANK_IDS, window=WINDOW, clock=clock)
+    feed(measured, clock, data)
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del measured
+    truth = exact(data)
+
+    parts = []
+    for r in range(replicas):
+        rc = Clock()
+        ra = RollingAggregates(BANK_IDS, window=WINDOW, clock=rc)
+        feed(ra, rc, data[r::replicas])
+        parts.append(ra.snapshot(sketch=True))
+
+    def naive():
+        # Every payment in the window, grouped and sorted per query
+        by_bank = {}
+        for bank, _, amount, _ in data:
+            by_bank.setdefault(bank, []).append(amount)
+        return {b: sorted(v) for b, v in by_bank.items()}
+
+    return {
+        "payments": n, "record_us": round(elapsed / n * 1e6, 2), f"record_us_{threads}_threads": round(threaded_record(data, threads), 2),
+        "snapshot_p50_us": timed(agg.snapshot, samples), "naive_query_p50_us": timed(naive, max(1, min(samples, 2_000_000 // n))),
+        "merge_p50_us": timed(lambda: merge_snapshots(parts), samples), "memory_kib": round(mem / 1024, 1),
+        "max_rel_error": round(max_rel_error(agg.snapshot(), truth), 4),
+        "merged_max_rel_error": round(max_rel_error(merge_snapshots(parts), truth), 4),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--payments", nargs="+", type=int, default=[1000, 100000, 1000000], help="payments in the window")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--replicas", type=int, default=4)
+    ap.add_argument("--samples", type=int, default=200, help="timed snapshot / merge calls")
+    ap.add_argument("--out", default="bench-results/aggregates.json")
+    args = ap.parse_args()
+
+    results = {"config": vars(args), "runs": []}
+    for n in args.payments:
+        res = run(n, args.threads, args.replicas, args.samples)
+        results["runs"].append(res)
+        print(f"{n:8d} payments: record {res['record_us']}us ({res[f'record_us_{args.threads}_threads']}us at {args.threads} threads)  "
+              f"snapshot p50={res['snapshot_p50_us']}us vs sort-per-query {res['naive_query_p50_us']}us  "
+              f"merge x{args.replicas} {res['merge_p50_us']}us  memory {res['memory_kib']} KiB  "
+              f"max rel error {res['max_rel_error']} (merged {res['merged_max_rel_error']})")
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
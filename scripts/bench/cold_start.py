@@ -0,0 +1,71 @@
+"""Service cold start: import + initialisation time and time until uvicorn answers, per service.
+
+Compares ddtrace's patch_all() (TRACE_INTEGRATIONS=all, the old behaviour) with each service's own integration
+list. Tracing is enabled (against the fake agent from trace_sampling.py) so patching does real work. Medians over
+--runs fresh processes, alternating the two modes so machine noise hits both alike; use `python -m services.startup --profile-startup <module>` to see where the time goes.
+
+    python scripts/bench/cold_start.py --runs 7
+"""
+import sys, time, argparse, statistics
+
+import httpx
+
+from common import REPO_ROOT, free_port, launch, save_results, stop
+from trace_sampling import FakeAgent
+
+sys.path.insert(0, str(REPO_ROOT))
+from services.startup import SERVICES, profile  # noqa: E402
+
+MODES = {"patch_all": {"TRACE_INTEGRATIONS": "all"}, "selected": {"TRACE_INTEGRATIONS": ""}}
+ENV = {
+    "DD_TRACE_ENABLED": "true", "LOG_LEVEL": "WARNING",
+    "DD_LLMOBS_ML_APP": "bench", "DD_LLMOBS_AGENTLESS_ENABLED": "false", "JIRA_POLL_ENABLED": "false",
+}
+
+
+def time_to_ready(module: str, env: dict, timeout: float = 60) -> float:
+    """Seconds from spawning uvicorn until the app answers its first request."""
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = launch(f"{module}:app", port, env=env)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/openapi.json", timeout=1)
+                return time.perf_counter() - t0
+            except httpx.HTTPError:
+                time.sleep(0.01)
+        raise RuntimeError(f"{module} did not come up within {timeout}s")
+    finally:
+        stop(proc)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--services", nargs="+", default=list(SERVICES))
+    ap.add_argument("--runs", type=int, default=7)
+    ap.add_argument("--out", default="bench-results/cold_start.json")
+    args = ap.parse_args()
+
+    agent = FakeAgent()
+    agent.start()
+    results = {"config": vars(args), "services": {}}
+    for module in args.services:
+        samples = {mode: {"import_ms": [], "ready_ms": []} for mode in MODES}
+        for _ in range(args.runs):
+            for mode, mode_env in MODES.items():
+                env = {**ENV, **mode_env, "DD_TRACE_AGENT_URL": f"http://127.0.0.1:{agent.port}"}
+                samples[mode]["import_ms"].append(profile(module, env=env)["import_ms"])
+                samples[mode]["ready_ms"].append(time_to_ready(module, env) * 1000)
+        res = results["services"][module] = {
+            mode: {k: round(statistics.median(v), 1) for k, v in s.items()} for mode, s in samples.items()
+        }
+        a, s = res["patch_all"], res["selected"]
+        print(f"{module:26s} import {a['import_ms']:6.0f} -> {s['import_ms']:6.0f} ms   "
+              f"ready {a['ready_ms']:6.0f} -> {s['ready_ms']:6.0f} ms   (patch_all -> selected)")
+    agent.server.shutdown()
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Helpers shared by the benchmark scripts in this directory."""
+import os, sys, json, time, socket, asyncio, pathlib, subprocess
+
+import httpx
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parents[2]
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+
+# Quiet, agent-less defaults so benchmarks measure the services rather than Datadog I/O
+BASE_ENV = {
+    "DD_TRACE_ENABLED": "false",
+    "DD_AGENT_HOST": "127.0.0.1",
+    "DD_DOGSTATSD_PORT": "8125",
+    "JIRA_POLL_ENABLED": "false",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def launch(app: str, port: int, env: dict = None, app_dir: pathlib.Path = REPO_ROOT, workers: int = 1) -> subprocess.Popen:
+    """Start `uvicorn <app>` as a child process; `app` is "module:attr" relative to `app_dir`."""
+    # uvicorn takes its worker count from WEB_CONCURRENCY; the services split per-pod limits by it
+    cmd = [sys.executable, "-m", "uvicorn", app, "--app-dir", str(app_dir), "--host", "127.0.0.1", "--port", str(port),
+           "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=REPO_ROOT, env={**os.environ, **BASE_ENV, "WEB_CONCURRENCY": str(workers), **(env or {})})
+
+
+def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def stop(*procs: subprocess.Popen) -> None:
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def summarize(latencies_s: list, errors: int, elapsed_s: float) -> dict:
+    lat = sorted(x * 1000 for x in latencies_s)
+    total = len(lat) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "throughput_rps": round(total / elapsed_s, 1) if elapsed_s else 0.0,
+        "p50_ms": round(percentile(lat, 50), 2),
+        "p95_ms": round(percentile(lat, 95), 2),
+        "p99_ms": round(percentile(lat, 99), 2),
+        "max_ms": round(lat[-1], 2) if lat else 0.0,
+    }
+
+
+async def closed_loop(send, concurrency: int, duration_s: float) -> dict:
+    """Run `concurrency` workers that each call `await send()` back to back for `duration_s`.
+
+    `send` returns True on success; exceptions and False count as errors.
+    """
+    latencies, errors = [], 0
+    stop_at = time.monotonic() + duration_s
+
+    async def worker():
+        nonlocal errors
+        while time.monotonic() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                ok = await send()
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    t0 = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.monotonic() - t0)
+
+
+def save_results(path: str, results: dict) -> None:
+    out = pathlib.Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2))
+    print(f"results written to {out}")
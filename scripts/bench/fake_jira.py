@@ -0,0 +1,152 @@
+"""In-memory stand-in for the Jira Cloud REST API v3, enough for jira_poller.
+
+    uvicorn fake_jira:app --app-dir scripts/bench --port 9002
+    JIRA_BASE_URL=http://127.0.0.1:9002 JIRA_EMAIL=x JIRA_API_TOKEN=x uvicorn services.jira_poller:app
+
+FAKE_JIRA_RATE_PER_SEC caps accepted API calls per second (token bucket); excess calls get 429 with
+Retry-After. Issues whose summary contains "REJECT" fail validation. GET /_stats reports call counts,
+POST /_resolve/{key} moves an issue to Done. Search understands the JQL clauses jira_poller emits
+(`updated >= -Nm`, `statusCategory != Done`, `ORDER BY updated|created ASC|DESC`).
+"""
+import os, re, time, asyncio, itertools
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FAKE_JIRA_LATENCY_SECONDS = float(os.getenv("FAKE_JIRA_LATENCY_SECONDS", "0.05"))
+FAKE_JIRA_RATE_PER_SEC = float(os.getenv("FAKE_JIRA_RATE_PER_SEC", "0"))  # 0 = unlimited
+
+app = FastAPI(title="Fake Jira")
+
+ISSUES = {}  # key -> issue dict
+UPDATED_AT = {}  # key -> epoch seconds of last update
+COMMENTS = Counter()
+STATS = Counter()
+_ids = itertools.count(10000)
+_bucket = {"tokens": FAKE_JIRA_RATE_PER_SEC, "at": time.monotonic()}
+
+
+def _throttled() -> JSONResponse:
+    if FAKE_JIRA_RATE_PER_SEC <= 0:
+        return None
+    now = time.monotonic()
+    _bucket["tokens"] = min(FAKE_JIRA_RATE_PER_SEC, _bucket["tokens"] + (now - _bucket["at"]) * FAKE_JIRA_RATE_PER_SEC)
+    _bucket["at"] = now
+    if _bucket["tokens"] >= 1:
+        _bucket["tokens"] -= 1
+        return None
+    STATS["throttled"] += 1
+    retry = (1 - _bucket["tokens"]) / FAKE_JIRA_RATE_PER_SEC
+    return JSONResponse(status_code=429, content={"errorMessages": ["Rate limit exceeded"]}, headers={"Retry-After": f"{retry:.2f}"})
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000+0000", time.gmtime())
+
+
+def _touch(key: str) -> None:
+    ISSUES[key]["fields"]["updated"] = _now()
+    UPDATED_AT[key] = time.time()
+
+
+def _new_issue(fields: dict) -> dict:
+    n = next(_ids)
+    project = (fields.get("project") or {}).get("key", "PER")
+    now = _now()
+    issue = {
+        "id": str(n),
+        "key": f"{project}-{n}",
+        "fields": {
+            "summary": fields.get("summary", ""),
+            "status": {"name": "To Do", "statusCategory": {"key": "new"}},
+            "created": now,
+            "updated": now,
+        },
+    }
+    ISSUES[issue["key"]] = issue
+    UPDATED_AT[issue["key"]] = time.time()
+    return issue
+
+
+@app.post("/rest/api/3/issue")
+async def create(request: Request):
+    STATS["create"] += 1
+    if (r := _throttled()) is not None:
+        return r
+    body = await request.json()
+    await asyncio.sleep(FAKE_JIRA_LATENCY_SECONDS)
+    fields = body.get("fields") or {}
+    if "REJECT" in fields.get("summary", ""):
+        return JSONResponse(status_code=400, content={"errors": {"summary": "rejected by fake jira"}})
+    issue = _new_issue(fields)
+    return JSONResponse(status_code=201, content={"id": issue["id"], "key": issue["key"], "self": f"/rest/api/3/issue/{issue['id']}"})
+
+
+@app.post("/rest/api/3/issue/bulk")
+async def bulk(request: Request):
+    STATS["bulk"] += 1
+    if (r := _throttled()) is not None:
+        return r
+    body = await request.json()
+    await asyncio.sleep(FAKE_JIRA_LATENCY_SECONDS)
+    updates = body.get("issueUpdates") or []
+    STATS["bulk_issues"] += len(updates)
+    issues, errors = [], []
+    for i, u in enumerate(updates):
+        fields = u.get("fields") or {}
+        if "REJECT" in fields.get("summary", ""):
+            errors.append({"status": 400, "failedElementNumber": i, "elementErrors": {"errors": {"summary": "rejected by fake jira"}}})
+            continue
+        issue = _new_issue(fields)
+        issues.append({"id": issue["id"], "key": issue["key"], "self": f"/rest/api/3/issue/{issue['id']}"})
+    return JSONResponse(status_code=201 if issues else 400, content={"issues": issues, "errors": errors})
+
+
+@app.post("/rest/api/3/issue/{key}/comment")
+async def comment(key: str, request: Request):
+    STATS["comment"] += 1
+    if (r := _throttled()) is not None:
+        return r
+    await asyncio.sleep(FAKE_JIRA_LATENCY_SECONDS)
+    if key not in ISSUES:
+        return JSONResponse(status_code=404, content={"errorMessages": ["Issue does not exist"]})
+    COMMENTS[key] += 1
+    _touch(key)
+    return JSONResponse(status_code=201, content={"id": str(next(_ids))})
+
+
+@app.get("/rest/api/3/search")
+async def search(jql: str = "", startAt: int = 0, maxResults: int = 50, fields: str = ""):
+    STATS["search"] += 1
+    if (r := _throttled()) is not None:
+        return r
+    await asyncio.sleep(FAKE_JIRA_LATENCY_SECONDS)
+    keys = list(ISSUES)
+    if m := re.search(r"updated\s*>=\s*-(\d+)m", jql):
+        since = time.time() - int(m.group(1)) * 60
+        keys = [k for k in keys if UPDATED_AT[k] >= since]
+    if re.search(r"statusCategory\s*!=\s*Done", jql, re.I):
+        keys = [k for k in keys if ISSUES[k]["fields"]["status"]["statusCategory"]["key"] != "done"]
+    order = re.search(r"ORDER BY (\w+)\s*(ASC|DESC)?", jql, re.I)
+    by, desc = (order.group(1), (order.group(2) or "ASC").upper() == "DESC") if order else ("created", True)
+    keys.sort(key=lambda k: ISSUES[k]["fields"].get(by, ""), reverse=desc)
+    wanted = [f for f in fields.split(",") if f]
+    page = []
+    for k in keys[startAt:startAt + maxResults]:
+        issue = ISSUES[k]
+        page.append({**issue, "fields": {f: v for f, v in issue["fields"].items() if not wanted or f in wanted}})
+    return {"startAt": startAt, "maxResults": maxResults, "total": len(keys), "issues": page}
+
+
+@app.post("/_resolve/{key}")
+async def resolve(key: str):
+    if key not in ISSUES:
+        return JSONResponse(status_code=404, content={"errorMessages": ["Issue does not exist"]})
+    ISSUES[key]["fields"]["status"] = {"name": "Done", "statusCategory": {"key": "done"}}
+    _touch(key)
+    return {"ok": True}
+
+
+@app.get("/_stats")
+async def stats():
+    return {"calls": dict(STATS), "issues": len(ISSUES), "comments": sum(COMMENTS.values())}
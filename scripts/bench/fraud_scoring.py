@@ -0,0 +1,87 @@
+"""Fraud-scoring engine: memory per tracked customer and scoring throughput vs batch size.
+
+Fills a FraudScorer with --customers customers (each with a full transaction history), then scores
+random transactions against them in batches. Batch size 1 is what /check does per request;
+larger batches are what /check/batch amortizes.
+
+    python scripts/bench/fraud_scoring.py --customers 100000 --batch-sizes 1 16 128 1024 8192
+"""
+import sys, time, random, argparse, tracemalloc
+
+from common import REPO_ROOT, save_results
+
+sys.path.insert(0, str(REPO_ROOT))
+import numpy as np
+from services.banks import BANK_IDS
+from services.fraud_scoring import FraudScorer
+
+
+def fill(customers: int, history: int) -> tuple:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    scorer = FraudScorer(BANK_IDS, max_customers=customers, history=history)
+    ids = [f"cust_{i:08d}" for i in range(customers)]
+    rng = np.random.default_rng(1)
+    chunk = 8192
+    t0 = time.perf_counter()
+    for _ in range(history):
+        for lo in range(0, customers, chunk):
+            part = ids[lo:lo + chunk]
+            scorer.score_batch(part, rng.choice(BANK_IDS, len(part)).tolist(), rng.gamma(2.0, 60.0, len(part)))
+    fill_s = time.perf_counter() - t0
+    total = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return scorer, ids, {
+        "customers": customers,
+        "history": history,
+        "array_bytes_per_customer": round(scorer.state_bytes() / customers, 1),
+        "total_bytes_per_customer": round(total / customers, 1),  # arrays + customer index (ids, dict)
+        "fill_transactions_per_s": round(customers * history / fill_s),
+    }
+
+
+def throughput(scorer: FraudScorer, ids: list, batch: int, seconds: float) -> dict:
+    rng = random.Random(batch)
+    scored, t0 = 0, time.perf_counter()
+    latencies = []
+    while time.perf_counter() - t0 < seconds:
+        cust = rng.choices(ids, k=batch)
+        banks = rng.choices(BANK_IDS, k=batch)
+        amounts = [rng.gammavariate(2.0, 60.0) for _ in range(batch)]
+        t1 = time.perf_counter()
+        scorer.score_batch(cust, banks, amounts)
+        latencies.append(time.perf_counter() - t1)
+        scored += batch
+    busy = sum(latencies)
+    latencies.sort()
+    return {
+        "batch_size": batch,
+        "scores_per_s": round(scored / busy),
+        "us_per_score": round(busy / scored * 1e6, 2),
+        "p50_batch_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_batch_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--customers", type=int, default=100000)
+    ap.add_argument("--history", type=int, default=32)
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 128, 1024, 8192])
+    ap.add_argument("--seconds", type=float, default=3.0, help="scoring time per batch size")
+    ap.add_argument("--out", default="bench-results/fraud_scoring.json")
+    args = ap.parse_args()
+
+    scorer, ids, memory = fill(args.customers, args.history)
+    print(f"{memory['customers']} customers x {memory['history']} txns: {memory['array_bytes_per_customer']} B/customer in arrays, "
+          f"{memory['total_bytes_per_customer']} B/customer incl. index")
+    results = {"config": vars(args), "memory": memory, "throughput": []}
+    for batch in args.batch_sizes:
+        res = throughput(scorer, ids, batch, args.seconds)
+        results["throughput"].append(res)
+        print(f"batch {batch:5d}: {res['scores_per_s']:>10,} scores/s  {res['us_per_score']:8.2f} us/score  p99 batch {res['p99_batch_ms']:.3f} ms")
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
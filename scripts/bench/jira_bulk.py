@@ -0,0 +1,76 @@
+"""Jira issue creation under a fraud spike: one POST per issue vs coalesced bulk-create.
+
+Runs jira_poller (outbox off, so each caller waits for its own issue key) against fake_jira.py with
+a rate limit, fires a burst of concurrent create requests and reports Jira calls, 429s and latency.
+
+    python scripts/bench/jira_bulk.py --requests 500 --concurrency 100 --jira-rate 10
+"""
+import argparse, asyncio, uuid
+
+import httpx
+
+from common import BENCH_DIR, free_port, launch, save_results, stop, summarize, wait_ready
+
+
+async def burst(base_url: str, n: int, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies, keys, errors = [], [], 0
+    loop = asyncio.get_running_loop()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one():
+            nonlocal errors
+            async with sem:
+                t0 = loop.time()
+                pid = str(uuid.uuid4())
+                r = await client.post("/jira/create_suspected_fraud", json={
+                    "trace_id": "0", "payment_id": pid, "customer_id": "cust_bench", "bank_id": "ING", "amount": 10.0, "reason": "Suspected Fraud",
+                })
+                if r.status_code == 200 and r.json().get("issue_key"):
+                    latencies.append(loop.time() - t0)
+                    keys.append(r.json()["issue_key"])
+                else:
+                    errors += 1
+
+        t0 = loop.time()
+        await asyncio.gather(*(one() for _ in range(n)))
+        res = summarize(latencies, errors, loop.time() - t0)
+    res["unique_issue_keys"] = len(set(keys))
+    return res
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=100)
+    ap.add_argument("--jira-rate", type=float, default=10, help="fake Jira accepted calls per second")
+    ap.add_argument("--out", default="bench-results/jira_bulk.json")
+    args = ap.parse_args()
+
+    results = {"config": vars(args), "modes": {}}
+    for mode in ("single", "bulk"):
+        jira_port, poller_port = free_port(), free_port()
+        jira = launch("fake_jira:app", jira_port, env={"FAKE_JIRA_RATE_PER_SEC": str(args.jira_rate)}, app_dir=BENCH_DIR)
+        poller = launch("services.jira_poller:app", poller_port, env={
+            "JIRA_BASE_URL": f"http://127.0.0.1:{jira_port}",
+            "JIRA_EMAIL": "bench@example.com",
+            "JIRA_API_TOKEN": "bench",
+            "JIRA_OUTBOX_ENABLED": "false",
+            "JIRA_BULK_ENABLED": "true" if mode == "bulk" else "false",
+            "HTTP_POOL_MAXSIZE": str(args.concurrency),
+        })
+        try:
+            wait_ready(f"http://127.0.0.1:{jira_port}/_stats")
+            wait_ready(f"http://127.0.0.1:{poller_port}/docs")
+            res = asyncio.run(burst(f"http://127.0.0.1:{poller_port}", args.requests, args.concurrency))
+            res["jira"] = httpx.get(f"http://127.0.0.1:{jira_port}/_stats").json()
+            results["modes"][mode] = res
+            print(f"{mode:6s} ok={args.requests - res['errors']}/{args.requests} p50={res['p50_ms']:.0f}ms p99={res['p99_ms']:.0f}ms "
+                  f"jira_calls={res['jira']['calls']} unique_keys={res['unique_issue_keys']}")
+        finally:
+            stop(poller, jira)
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Payment ledger: durable write throughput with group commit, and lookup latency through the mmap'd indexes.
+
+Writes: --threads callers each record a payment (created + settled, as /pay does) and wait until it is durable,
+back to back for --duration seconds. Modes: group commit (one write + fdatasync for everything queued),
+one fdatasync per payment (LEDGER_MAX_BATCH=2, what a per-request flush costs) and no fsync at all. Reports
+durable payments/s, commit wait p50/p99 and payments per fsync.
+
+Lookups: fills a ledger with --payments payments over --customers customers, reopens it (index rebuild
+time), then times get(payment_id) and customer_payments(customer, 50) on random keys.
+
+Put --dir on the disk you care about; /tmp may be tmpfs, where fsync is free.
+
+    python scripts/bench/ledger.py --threads 1 8 64 --duration 5 --payments 200000 --dir /var/tmp
+"""
+import os, sys, time, uuid, random, argparse, tempfile, threading, tracemalloc
+
+from common import REPO_ROOT, percentile, save_results
+
+sys.path.insert(0, str(REPO_ROOT))
+from services.ledger import Ledger  # noqa: E402
+
+MODES = {"group_commit": {"fsync": True, "max_batch": 1024}, "fsync_per_payment": {"fsync": True, "max_batch": 2},
+         "no_fsync": {"fsync": False, "max_batch": 1024}}
+BANKS = ("ING", "ABN", "RABO", "BUNQ")
+
+
+class BatchSizes:
+    """statsd stand-in that keeps the ledger's batch sizes."""
+
+    def __init__(self):
+        self.sizes = []
+
+    def distribution(self, metric, value, tags=None):
+        if metric.endswith("batch.size"):
+            self.sizes.append(value)
+
+
+def writes(directory: str, mode: str, threads: int, duration: float) -> dict:
+    sizes = BatchSizes()
+    ledger = Ledger(os.path.join(tempfile.mkdtemp(dir=directory), "ledger.bin"), statsd=sizes, **MODES[mode])
+    waits, stop_at = [[] for _ in range(threads)], time.monotonic() + duration
+
+    def worker(out: list):
+        while time.monotonic() < stop_at:
+            pid = str(uuid.uuid4())
+            ledger.append(pid, "created", "cust_1", "ING", 10.0)
+            ledger.append(pid, "settled", "cust_1", "ING", 10.0)
+            t0 = time.perf_counter()
+            ledger.sync()
+            out.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(w,)) for w in waits]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    ledger.close()
+    lat = sorted(x * 1000 for w in waits for x in w)
+    return {
+        "payments_per_s": round(len(lat) / elapsed), "commit_wait_p50_ms": round(percentile(lat, 50), 3),
+        "commit_wait_p99_ms": round(percentile(lat, 99), 3),
+        "payments_per_fsync": round(sum(sizes.sizes) / 2 / len(sizes.sizes), 1) if sizes.sizes else 0.0,
+    }
+
+
+def time_calls(fn, keys: list) -> dict:
+    lat = []
+    for k in keys:
+        t0 = time.perf_counter()
+        fn(k)
+        lat.append((time.perf_counter() - t0) * 1e6)
+    lat.sort()
+    return {"p50_us": round(percentile(lat, 50), 1), "p99_us": round(percentile(lat, 99), 1), "calls_per_s": round(len(lat) / sum(lat) * 1e6)}
+
+
+def lookups(directory: str, payments: int, customers: int, samples: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(dir=directory), "ledger.bin")
+    ledger = Ledger(path, fsync=False)
+    rng = random.Random(1)
+    ids, custs = [], [f"cust_{i:06d}" for i in range(customers)]
+    for _ in range(payments):
+        pid, cust, bank, amount = str(uuid.uuid4()), rng.choice(custs), rng.choice(BANKS), round(rng.uniform(1, 500), 2)
+        ledger.append(pid, "created", cust, bank, amount)
+        if rng.random() < 0.15:
+            ledger.append(pid, "failed", cust, bank, amount, "Insufficient funds")
+        else:
+            ledger.append(pid, "settled", cust, bank, amount)
+        ids.append(pid)
+    ledger.close()
+
+    t0 = time.perf_counter()
+    Ledger(path, fsync=False).close()
+    reopen_s = time.perf_counter() - t0
+    tracemalloc.start()
+    ledger = Ledger(path, fsync=False)
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    res = {
+        "payments": payments, "customers": customers, "file_bytes_per_payment": round(ledger.size_bytes() / payments, 1),
+        "reopen_s": round(reopen_s, 3), "index_bytes_per_payment": round(index_bytes / payments, 1),
+        "get": time_calls(ledger.get, rng.choices(ids, k=samples)),
+        "customer_payments": time_calls(lambda c: ledger.customer_payments(c, 50), rng.choices(custs, k=samples)),
+    }
+    ledger.close()
+    return res
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    ap.add_argument("--threads", nargs="+", type=int, default=[1, 8, 64])
+    ap.add_argument("--duration", type=float, default=5.0, help="seconds per write run")
+    ap.add_argument("--payments", type=int, default=200000)
+    ap.add_argument("--customers", type=int, default=10000)
+    ap.add_argument("--samples", type=int, default=20000, help="lookups timed per query type")
+    ap.add_argument("--dir", default=tempfile.gettempdir(), help="where the ledger files go")
+    ap.add_argument("--out", default="bench-results/ledger.json")
+    args = ap.parse_args()
+
+    results = {"config": vars(args), "writes": {}, "lookups": None}
+    for mode in args.modes:
+        for threads in args.threads:
+            res = results["writes"][f"{mode}/{threads}"] = writes(args.dir, mode, threads, args.duration)
+            print(f"{mode:18s} threads={threads:<4d} {res['payments_per_s']:8d} payments/s  commit wait p50={res['commit_wait_p50_ms']:.2f}ms "
+                  f"p99={res['commit_wait_p99_ms']:.2f}ms  {res['payments_per_fsync']:.1f} payments/fsync")
+    res = results["lookups"] = lookups(args.dir, args.payments, args.customers, args.samples)
+    print(f"{res['payments']} payments: {res['file_bytes_per_payment']} B/payment on disk, index {res['index_bytes_per_payment']} B/payment, "
+          f"reopen {res['reopen_s']}s")
+    for name in ("get", "customer_payments"):
+        r = res[name]
+        print(f"  {name:18s} p50={r['p50_us']}us p99={r['p99_us']}us  {r['calls_per_s']}/s")
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
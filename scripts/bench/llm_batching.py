@@ -0,0 +1,85 @@
+"""llm-service micro-batching and streaming: throughput, latency and time-to-first-token.
+
+Runs llm_service with LLM_BATCH_MAX_SIZE=1 (one forward pass per prompt) and with batching on, and
+drives /llm/generate with unique prompts (no cache hits) closed-loop. Then compares time-to-first-token
+of /llm/generate against the SSE /llm/generate/stream variant at low concurrency.
+
+    python scripts/bench/llm_batching.py --concurrency 32 --duration 10
+"""
+import time, asyncio, argparse, itertools
+
+import httpx
+
+from common import closed_loop, free_port, launch, percentile, save_results, stop, wait_ready
+
+PROMPT = "please describe request {} of the benchmark in a few words"
+
+
+async def throughput(base_url: str, concurrency: int, duration: float) -> dict:
+    counter = itertools.count()
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def send() -> bool:
+            r = await client.post("/llm/generate", json={"prompt": PROMPT.format(next(counter))})
+            return r.status_code in (200, 502)  # 502 = simulated model error, still a completed model call
+        return await closed_loop(send, concurrency, duration)
+
+
+async def ttft(base_url: str, concurrency: int, requests: int) -> dict:
+    counter = itertools.count()
+    out = {"generate": [], "stream": []}
+    sem = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one(endpoint: str) -> None:
+            async with sem:
+                t0 = time.perf_counter()
+                if endpoint == "generate":
+                    r = await client.post("/llm/generate", json={"prompt": PROMPT.format(next(counter))})
+                    if r.status_code == 200:
+                        out[endpoint].append(time.perf_counter() - t0)
+                    return
+                async with client.stream("POST", "/llm/generate/stream", json={"prompt": PROMPT.format(next(counter))}) as r:
+                    async for line in r.aiter_lines():
+                        if line.startswith("event: token"):
+                            out[endpoint].append(time.perf_counter() - t0)
+                            break
+        await asyncio.gather(*(one(e) for _ in range(requests) for e in ("generate", "stream")))
+    res = {}
+    for endpoint, values in out.items():
+        lat = sorted(v * 1000 for v in values)
+        res[endpoint] = {"p50_ttft_ms": round(percentile(lat, 50), 1), "p99_ttft_ms": round(percentile(lat, 99), 1)}
+    return res
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--max-wait-ms", type=float, default=10)
+    ap.add_argument("--ttft-requests", type=int, default=200)
+    ap.add_argument("--ttft-concurrency", type=int, default=4, help="kept low so queueing doesn't hide decode time")
+    ap.add_argument("--out", default="bench-results/llm_batching.json")
+    args = ap.parse_args()
+
+    results = {"config": vars(args), "modes": {}}
+    for mode, size in (("unbatched", 1), ("batched", args.batch_size)):
+        port = free_port()
+        svc = launch("services.llm_service:app", port, env={
+            "LLM_BATCH_MAX_SIZE": str(size), "LLM_BATCH_MAX_WAIT_MS": str(args.max_wait_ms),
+            "LLM_CACHE_ENABLED": "false", "DD_LLMOBS_AGENTLESS_ENABLED": "false", "DD_LLMOBS_ML_APP": "bench",
+        })
+        try:
+            wait_ready(f"http://127.0.0.1:{port}/docs")
+            base = f"http://127.0.0.1:{port}"
+            res = asyncio.run(throughput(base, args.concurrency, args.duration))
+            res["ttft"] = asyncio.run(ttft(base, args.ttft_concurrency, args.ttft_requests))
+            results["modes"][mode] = res
+            print(f"{mode:9s} {res['throughput_rps']:>7.1f} req/s  p50={res['p50_ms']:.0f}ms  p99={res['p99_ms']:.0f}ms  "
+                  f"ttft p50 generate={res['ttft']['generate']['p50_ttft_ms']:.0f}ms stream={res['ttft']['stream']['p50_ttft_ms']:.0f}ms")
+        finally:
+            stop(svc)
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
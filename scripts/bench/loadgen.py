@@ -0,0 +1,266 @@
+"""End-to-end load generator: login -> pay through web-frontend, with every hop running locally.
+
+Starts auth-service, payment-service, fraud-service, jira-poller and web-frontend as uvicorn processes,
+with Jira replaced by fake_jira.py and the Datadog agent by a UDP sink that counts DogStatsD traffic.
+Each virtual user logs in, then pays with the session cookie. Drive it closed-loop (--concurrency) or
+open-loop at a fixed arrival rate (--rps; latency is measured from the scheduled start, so a stalled
+stack shows up as queueing instead of being hidden).
+
+Scenarios:
+  normal        logins succeed, no payment failures or fraud checks
+  fraud         every payment is suspected fraud: Jira ticket + fraud-service check + Jira comment
+  auth_failure  every login is rejected; no payments are attempted
+
+    python scripts/bench/loadgen.py --scenario normal fraud auth_failure --concurrency 32 --duration 20
+    python scripts/bench/loadgen.py --scenario normal --rps 100 --duration 30
+"""
+import os, time, random, socket, asyncio, argparse, tempfile, threading
+from collections import Counter
+
+import httpx
+
+from common import BENCH_DIR, free_port, launch, save_results, stop, summarize, wait_ready
+
+SCENARIOS = {
+    "normal": {"AUTH_FAIL_RATE": "0", "PAYMENT_FAIL_RATE": "0", "PAYMENT_SUSPECTED_FRAUD_RATE": "0"},
+    "fraud": {"AUTH_FAIL_RATE": "0", "PAYMENT_FAIL_RATE": "0", "PAYMENT_SUSPECTED_FRAUD_RATE": "1"},
+    "auth_failure": {"AUTH_FAIL_RATE": "1", "PAYMENT_FAIL_RATE": "0", "PAYMENT_SUSPECTED_FRAUD_RATE": "0"},
+}
+SERVICES = ("auth-service", "payment-service", "fraud-service", "jira-poller", "web-frontend")
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+class StatsdSink(threading.Thread):
+    """Stands in for the agent's DogStatsD port; counts datagrams and metric lines."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.2)
+        self.port = self.sock.getsockname()[1]
+        self.datagrams = 0
+        self.lines = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                data = self.sock.recv(65535)
+            except socket.timeout:
+                continue
+            self.datagrams += 1
+            self.lines += data.count(b"\n") or 1
+
+    def snapshot(self) -> tuple:
+        return self.datagrams, self.lines
+
+    def stop(self):
+        self._stopped.set()
+
+
+def _children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            kids = [int(x) for x in f.read().split()]
+    except OSError:
+        return []
+    return kids + [g for k in kids for g in _children(k)]
+
+
+def cpu_seconds(pid: int) -> float:
+    """utime + stime of a process and its live descendants (uvicorn workers), from /proc."""
+    total = 0
+    for p in [pid, *_children(pid)]:
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        total += int(fields[11]) + int(fields[12])
+    return total / CLK_TCK
+
+
+class Stack:
+    """The five services plus fake Jira, wired to each other on free local ports."""
+
+    def __init__(self, scenario_env: dict, statsd_port: int, workers: int, jira_latency: float):
+        self.state_dir = tempfile.mkdtemp(prefix="loadgen-")
+        self.ports = {name: free_port() for name in (*SERVICES, "fake-jira")}
+        url = {name: f"http://127.0.0.1:{port}" for name, port in self.ports.items()}
+        common_env = {**scenario_env, "DD_DOGSTATSD_PORT": str(statsd_port), "LOG_LEVEL": "WARNING"}
+        self.procs = {
+            "fake-jira": launch("fake_jira:app", self.ports["fake-jira"], env={"FAKE_JIRA_LATENCY_SECONDS": str(jira_latency)}, app_dir=BENCH_DIR),
+            "auth-service": launch("services.auth_service:app", self.ports["auth-service"], env={**common_env, "DD_SERVICE": "auth-service"}),
+            "fraud-service": launch("services.fraud_service:app", self.ports["fraud-service"], env={
+                **common_env, "DD_SERVICE": "fraud-service", "JIRA_POLLER_URL": url["jira-poller"],
+            }),
+            "jira-poller": launch("services.jira_poller:app", self.ports["jira-poller"], env={
+                **common_env, "DD_SERVICE": "jira-poller",
+                "JIRA_BASE_URL": url["fake-jira"], "JIRA_EMAIL": "bench@example.com", "JIRA_API_TOKEN": "bench",
+                "JIRA_OUTBOX_PATH": os.path.join(self.state_dir, "outbox.db"),
+                "JIRA_POLL_STATE_PATH": os.path.join(self.state_dir, "poll-state.json"),
+            }),
+            "payment-service": launch("services.payment_service:app", self.ports["payment-service"], env={
+                **common_env, "DD_SERVICE": "payment-service",
+                "FRAUD_SERVICE_URL": url["fraud-service"], "JIRA_POLLER_URL": url["jira-poller"],
+                "LEDGER_PATH": os.path.join(self.state_dir, "ledger.bin"),
+            }, workers=workers),
+            "web-frontend": launch("services.web_frontend:app", self.ports["web-frontend"], env={
+                **common_env, "DD_SERVICE": "web-frontend", "SESSION_BACKEND": "sqlite" if workers > 1 else "memory",
+                "SESSION_DB_PATH": os.path.join(self.state_dir, "sessions.db"),
+                "AUTH_SERVICE_URL": url["auth-service"], "PAYMENT_SERVICE_URL": url["payment-service"],
+            }, workers=workers),
+        }
+        self.base_url = url["web-frontend"]
+
+    def wait(self):
+        wait_ready(f"http://127.0.0.1:{self.ports['fake-jira']}/_stats")
+        for name in SERVICES:
+            wait_ready(f"http://127.0.0.1:{self.ports[name]}/docs")
+
+    def cpu(self) -> dict:
+        return {name: cpu_seconds(p.pid) for name, p in self.procs.items()}
+
+    def stop(self):
+        stop(*self.procs.values())
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {"login": [], "pay": [], "flow": []}
+        self.errors = Counter()
+        self.statuses = {"login": Counter(), "pay": Counter()}
+
+    def step(self, name: str, status, latency: float, ok: bool):
+        self.statuses[name][str(status)] += 1
+        if ok:
+            self.latencies[name].append(latency)
+        else:
+            self.errors[name] += 1
+
+    def report(self, elapsed: float) -> dict:
+        out = {}
+        for name, lat in self.latencies.items():
+            out[name] = summarize(lat, self.errors[name], elapsed)
+            if name in self.statuses:
+                out[name]["status_counts"] = dict(self.statuses[name])
+        return out
+
+
+async def user_flow(client: httpx.AsyncClient, rec: Recorder, n: int, t_start: float) -> None:
+    """One login -> pay iteration; `t_start` is when the iteration was scheduled to begin."""
+    now = time.perf_counter
+    try:
+        r = await client.post("/api/login", json={"username": f"user{n % 1000}", "password": "pw"})
+        t1 = now()
+        # A rejected login (401) is the auth_failure scenario working as intended, not an error
+        rec.step("login", r.status_code, t1 - t_start, r.status_code in (200, 401))
+    except httpx.HTTPError:
+        rec.step("login", "exception", 0, False)
+        return
+    if r.status_code != 200:
+        return
+    # Explicit Cookie header: the client's shared cookie jar would otherwise mix sessions across users
+    cookie = f"session_id={r.cookies.get('session_id')}"
+    try:
+        r = await client.post("/api/pay", json={"bank_id": "ING", "amount": round(random.uniform(1, 500), 2)}, headers={"Cookie": cookie})
+        t2 = now()
+        # Confirmed fraud comes back as a 502 payment_failed by design; only unexpected statuses are errors
+        ok = r.status_code == 200 or (r.status_code == 502 and "payment_failed" in r.text)
+        rec.step("pay", r.status_code, t2 - t1, ok)
+        if ok:
+            rec.latencies["flow"].append(t2 - t_start)
+        else:
+            rec.errors["flow"] += 1
+    except httpx.HTTPError:
+        rec.step("pay", "exception", 0, False)
+        rec.errors["flow"] += 1
+
+
+async def closed(base_url: str, concurrency: int, duration: float, rec: Recorder) -> float:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        stop_at = time.monotonic() + duration
+        counter = iter(range(10 ** 9))
+
+        async def worker():
+            while time.monotonic() < stop_at:
+                await user_flow(client, rec, next(counter), time.perf_counter())
+
+        t0 = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.monotonic() - t0
+
+
+async def open_loop(base_url: str, rps: float, duration: float, rec: Recorder, max_in_flight: int) -> float:
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        tasks = []
+        t0 = time.perf_counter()
+        n = int(rps * duration)
+        for i in range(n):
+            scheduled = t0 + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(user_flow(client, rec, i, scheduled)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - t0
+
+
+def run_scenario(name: str, args, sink: StatsdSink) -> dict:
+    stack = Stack(SCENARIOS[name], sink.port, args.workers, args.jira_latency)
+    try:
+        stack.wait()
+        # Warm up connection pools and lazy imports so they don't land in the measured window
+        asyncio.run(closed(stack.base_url, 2, 1.0, Recorder()))
+        rec = Recorder()
+        cpu0, statsd0 = stack.cpu(), sink.snapshot()
+        if args.rps:
+            elapsed = asyncio.run(open_loop(stack.base_url, args.rps, args.duration, rec, args.max_in_flight))
+        else:
+            elapsed = asyncio.run(closed(stack.base_url, args.concurrency, args.duration, rec))
+        cpu1, statsd1 = stack.cpu(), sink.snapshot()
+        jira = httpx.get(f"http://127.0.0.1:{stack.ports['fake-jira']}/_stats").json()
+    finally:
+        stack.stop()
+
+    res = rec.report(elapsed)
+    res["elapsed_s"] = round(elapsed, 2)
+    res["cpu_percent"] = {svc: round((cpu1[svc] - cpu0[svc]) / elapsed * 100, 1) for svc in cpu1}
+    res["statsd"] = {"datagrams": statsd1[0] - statsd0[0], "metric_lines": statsd1[1] - statsd0[1]}
+    res["jira"] = jira
+    return res
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=["normal", "fraud", "auth_failure"])
+    ap.add_argument("--concurrency", type=int, default=32, help="closed-loop virtual users")
+    ap.add_argument("--rps", type=float, default=0, help="open-loop login->pay flows per second (overrides --concurrency)")
+    ap.add_argument("--max-in-flight", type=int, default=512, help="open-loop connection cap")
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds per scenario")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers for web-frontend and payment-service")
+    ap.add_argument("--jira-latency", type=float, default=0.05, help="seconds fake Jira adds per call")
+    ap.add_argument("--out", default="bench-results/loadgen.json")
+    args = ap.parse_args()
+
+    sink = StatsdSink()
+    sink.start()
+    results = {"config": vars(args), "scenarios": {}}
+    try:
+        for name in args.scenario:
+            res = run_scenario(name, args, sink)
+            results["scenarios"][name] = res
+            head = res["flow"] if res["flow"]["requests"] else res["login"]
+            cpu = " ".join(f"{svc}={pct:.0f}%" for svc, pct in res["cpu_percent"].items())
+            print(f"{name:12s} {head['throughput_rps']:>7.1f} flows/s  p50={head['p50_ms']:.0f}ms p95={head['p95_ms']:.0f}ms "
+                  f"p99={head['p99_ms']:.0f}ms  login_err={res['login']['error_rate']:.1%} pay_err={res['pay']['error_rate']:.1%}  cpu: {cpu}")
+    finally:
+        sink.stop()
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Per-request logging overhead on the request thread: LOG_MODE=sync vs async.
+
+Each simulated request emits the payment_service hot-path pair (payment_created + payment_settled)
+with the usual `extra` fields. Output goes to /dev/null so only the logging cost is measured.
+
+    python scripts/bench/logging_overhead.py --requests 50000
+"""
+import os, sys, json, argparse, subprocess
+
+from common import REPO_ROOT, save_results
+
+CHILD = r"""
+import os, sys, time, json, logging
+sys.path.insert(0, os.environ["REPO_ROOT"])
+from services import obs
+obs.init_observability()
+LOG = logging.getLogger("payment_service")
+n = int(os.environ["N"])
+extra_static = {"customer_id": "cust_0123456789", "bank_id": "ING", "amount": 125.5}
+t0 = time.perf_counter()
+for i in range(n):
+    LOG.info("payment_created", extra={**obs.base_fields("payment-service"), **obs.current_dd_ids(), **extra_static, "payment_id": str(i), "status": "created"})
+    LOG.info("payment_settled", extra={**obs.base_fields("payment-service"), **obs.current_dd_ids(), **extra_static, "payment_id": str(i), "status": "settled"})
+hot = time.perf_counter() - t0
+if obs._writer is not None:
+    obs._writer.stop(timeout=60)
+total = time.perf_counter() - t0
+print(json.dumps({"request_thread_us_per_request": hot / n * 1e6, "total_us_per_request": total / n * 1e6}), file=sys.__stdout__)
+"""
+
+
+def run(mode: str, n: int) -> dict:
+    env = {**os.environ, "REPO_ROOT": str(REPO_ROOT), "N": str(n), "LOG_MODE": mode, "DD_TRACE_ENABLED": "false", "LOG_LEVEL": "INFO"}
+    with open(os.devnull, "w") as devnull:
+        out = subprocess.run([sys.executable, "-c", CHILD], env=env, stdout=subprocess.PIPE, stderr=devnull, check=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=50000)
+    ap.add_argument("--out", default="bench-results/logging_overhead.json")
+    args = ap.parse_args()
+
+    results = {"config": vars(args), "modes": {}}
+    for mode in ("sync", "async"):
+        res = run(mode, args.requests)
+        results["modes"][mode] = res
+        print(f"{mode:5s} request thread {res['request_thread_us_per_request']:7.1f} us/request   incl. writer drain {res['total_us_per_request']:7.1f} us/request")
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Multi-process topology (one uvicorn per service, as in the cluster) vs all services in one process.
+
+Runs the loadgen login -> pay flow against three topologies:
+  pods           the five services as separate uvicorn processes talking HTTP (loadgen.py's stack)
+  monolith_http  services/monolith.py with MONOLITH_DISPATCH=http: one process, inter-service calls still HTTP over loopback
+  monolith       services/monolith.py with MONOLITH_DISPATCH=inprocess: inter-service calls dispatched in process
+Jira is fake_jira.py in all three. Reports flow/login/pay latency and total CPU per flow, per scenario.
+
+    python scripts/bench/monolith.py --rps 20 --duration 20
+    python scripts/bench/monolith.py --scenario fraud --topologies pods monolith --concurrency 8
+"""
+import os, asyncio, argparse, tempfile
+
+from common import BENCH_DIR, free_port, launch, save_results, stop, wait_ready
+from loadgen import SCENARIOS, Recorder, Stack, StatsdSink, closed, cpu_seconds, open_loop
+
+TOPOLOGIES = ("pods", "monolith_http", "monolith")
+
+
+class MonolithStack:
+    """services.monolith plus fake Jira; same interface as loadgen.Stack."""
+
+    def __init__(self, scenario_env: dict, statsd_port: int, jira_latency: float, dispatch: str):
+        self.state_dir = tempfile.mkdtemp(prefix="monolith-")
+        self.ports = {"monolith": free_port(), "fake-jira": free_port()}
+        self.base_url = f"http://127.0.0.1:{self.ports['monolith']}"
+        self.procs = {
+            "fake-jira": launch("fake_jira:app", self.ports["fake-jira"], env={"FAKE_JIRA_LATENCY_SECONDS": str(jira_latency)}, app_dir=BENCH_DIR),
+            "monolith": launch("services.monolith:app", self.ports["monolith"], env={
+                **scenario_env, "DD_DOGSTATSD_PORT": str(statsd_port), "LOG_LEVEL": "WARNING", "MONOLITH_DISPATCH": dispatch,
+                # Only used with MONOLITH_DISPATCH=http: every service is reached through this same process
+                **{var: self.base_url for var in ("AUTH_SERVICE_URL", "PAYMENT_SERVICE_URL", "FRAUD_SERVICE_URL", "JIRA_POLLER_URL")},
+                "JIRA_BASE_URL": f"http://127.0.0.1:{self.ports['fake-jira']}", "JIRA_EMAIL": "bench@example.com", "JIRA_API_TOKEN": "bench",
+                "JIRA_OUTBOX_PATH": os.path.join(self.state_dir, "outbox.db"),
+                "JIRA_POLL_STATE_PATH": os.path.join(self.state_dir, "poll-state.json"),
+                "LEDGER_PATH": os.path.join(self.state_dir, "ledger.bin"),
+                "DD_LLMOBS_ML_APP": "bench", "DD_LLMOBS_AGENTLESS_ENABLED": "false",
+            }),
+        }
+
+    def wait(self):
+        wait_ready(f"http://127.0.0.1:{self.ports['fake-jira']}/_stats")
+        wait_ready(f"{self.base_url}/docs")
+
+    def cpu(self) -> dict:
+        return {name: cpu_seconds(p.pid) for name, p in self.procs.items()}
+
+    def stop(self):
+        stop(*self.procs.values())
+
+
+def make_stack(topology: str, scenario: str, args, sink: StatsdSink):
+    if topology == "pods":
+        return Stack(SCENARIOS[scenario], sink.port, 1, args.jira_latency)
+    return MonolithStack(SCENARIOS[scenario], sink.port, args.jira_latency, "http" if topology == "monolith_http" else "inprocess")
+
+
+def run(topology: str, scenario: str, args, sink: StatsdSink) -> dict:
+    stack = make_stack(topology, scenario, args, sink)
+    try:
+        stack.wait()
+        asyncio.run(closed(stack.base_url, 2, 1.0, Recorder()))
+        rec = Recorder()
+        cpu0 = stack.cpu()
+        if args.rps:
+            elapsed = asyncio.run(open_loop(stack.base_url, args.rps, args.duration, rec, args.max_in_flight))
+        else:
+            elapsed = asyncio.run(closed(stack.base_url, args.concurrency, args.duration, rec))
+        cpu1 = stack.cpu()
+    finally:
+        stack.stop()
+
+    res = rec.report(elapsed)
+    flows = res["flow"]["requests"] or res["login"]["requests"] or 1
+    cpu = sum(cpu1[svc] - cpu0[svc] for svc in cpu1 if svc != "fake-jira")
+    res["elapsed_s"] = round(elapsed, 2)
+    res["cpu_ms_per_flow"] = round(cpu / flows * 1000, 2)
+    return res
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--topologies", nargs="+", choices=TOPOLOGIES, default=list(TOPOLOGIES))
+    ap.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=["normal", "fraud"])
+    ap.add_argument("--rps", type=float, default=20, help="open-loop login->pay flows per second (0 = closed loop)")
+    ap.add_argument("--concurrency", type=int, default=8, help="closed-loop virtual users (with --rps 0)")
+    ap.add_argument("--max-in-flight", type=int, default=256)
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds per topology and scenario")
+    ap.add_argument("--jira-latency", type=float, default=0.05, help="seconds fake Jira adds per call")
+    ap.add_argument("--out", default="bench-results/monolith.json")
+    args = ap.parse_args()
+
+    sink = StatsdSink()
+    sink.start()
+    results = {"config": vars(args), "scenarios": {}}
+    try:
+        for scenario in args.scenario:
+            out = results["scenarios"][scenario] = {}
+            for topology in args.topologies:
+                res = out[topology] = run(topology, scenario, args, sink)
+                flow, login, pay = res["flow"], res["login"], res["pay"]
+                print(f"{scenario:8s} {topology:14s} flow p50={flow['p50_ms']:5.0f}ms p99={flow['p99_ms']:5.0f}ms  "
+                      f"login p50={login['p50_ms']:5.1f}ms  pay p50={pay['p50_ms']:5.0f}ms  "
+                      f"cpu {res['cpu_ms_per_flow']:6.2f} ms/flow  errors={flow['errors']}")
+    finally:
+        sink.stop()
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
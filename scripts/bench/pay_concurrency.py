@@ -0,0 +1,63 @@
+"""Concurrent-payment scaling of payment_service /pay: sync (threadpool) vs async handler.
+
+Starts one payment_service process per handler mode, backed by stub fraud/jira upstreams, and drives
+/pay closed-loop at increasing concurrency levels.
+
+    python scripts/bench/pay_concurrency.py --concurrency 8 32 128 512 --duration 10 --fraud-rate 0.05
+"""
+import argparse, asyncio, random
+
+import httpx
+
+from common import BENCH_DIR, closed_loop, free_port, launch, save_results, stop, wait_ready
+
+
+async def drive(base_url: str, concurrency: int, duration: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def send() -> bool:
+            r = await client.post("/pay", json={"customer_id": "cust_bench", "bank_id": "ING", "amount": round(random.uniform(1, 500), 2)})
+            return r.status_code == 200
+        return await closed_loop(send, concurrency, duration)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128, 512])
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    ap.add_argument("--fraud-rate", type=float, default=0.05, help="PAYMENT_SUSPECTED_FRAUD_RATE")
+    ap.add_argument("--stub-latency", type=float, default=0.05, help="seconds added by each stubbed upstream call")
+    ap.add_argument("--out", default="bench-results/pay_concurrency.json")
+    args = ap.parse_args()
+
+    stub_port = free_port()
+    stub = launch("stubs:app", stub_port, env={"STUB_LATENCY_SECONDS": str(args.stub_latency)}, app_dir=BENCH_DIR)
+    results = {"config": vars(args), "handlers": {}}
+    try:
+        wait_ready(f"http://127.0.0.1:{stub_port}/docs")
+        for handler in ("sync", "async"):
+            port = free_port()
+            svc = launch("services.payment_service:app", port, env={
+                "PAYMENT_HANDLER": handler,
+                "PAYMENT_FAIL_RATE": "0",
+                "DEDUP_ENABLED": "false",  # one customer at high rate would repeat amounts within the window
+                "PAYMENT_SUSPECTED_FRAUD_RATE": str(args.fraud_rate),
+                "FRAUD_SERVICE_URL": f"http://127.0.0.1:{stub_port}",
+                "JIRA_POLLER_URL": f"http://127.0.0.1:{stub_port}",
+            })
+            try:
+                wait_ready(f"http://127.0.0.1:{port}/banks")
+                results["handlers"][handler] = {}
+                for c in args.concurrency:
+                    res = asyncio.run(drive(f"http://127.0.0.1:{port}", c, args.duration))
+                    results["handlers"][handler][str(c)] = res
+                    print(f"{handler:5s} c={c:<5d} {res['throughput_rps']:>8.1f} req/s  p50={res['p50_ms']:.0f}ms  p99={res['p99_ms']:.0f}ms  errors={res['errors']}")
+            finally:
+                stop(svc)
+    finally:
+        stop(stub)
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""JSON serialization: FastAPI's default path (jsonable_encoder + json.dumps) vs services/fastjson.py, per endpoint.
+
+encode     the body each endpoint returns (or sends upstream), encoded the old way and through fastjson: responses
+           as JSONResponse(jsonable_encoder(x)) vs FastJSONResponse(x), outbound bodies as requests / httpx encode
+           json= (stdlib json.dumps) vs dumps(), and the Jira ADF payloads rebuilt as nested dicts vs fragments.
+endpoints  CPU per request through each service's ASGI app in process (tracing off), with FAST_JSON_ENABLED=false
+           and true in separate processes, alternating --runs times; fraud-service uses FRAUD_SCORING=random so
+           that the model does not drown out the encoding.
+
+    python scripts/bench/serialization.py --requests 2000 --runs 3
+"""
+import os, sys, json, time, uuid, random, asyncio, argparse, statistics, subprocess, tempfile, timeit
+
+from common import BASE_ENV, REPO_ROOT, save_results
+
+sys.path.insert(0, str(REPO_ROOT))
+
+WORKER_ENV = {
+    **BASE_ENV, "AUTH_FAIL_RATE": "0", "DEDUP_ENABLED": "false", "FRAUD_SCORING": "random", "JIRA_OUTBOX_ENABLED": "false",
+    "LOG_LEVEL": "ERROR", "DD_LLMOBS_ML_APP": "bench", "DD_LLMOBS_AGENTLESS_ENABLED": "false",
+}
+BATCH = 50
+
+
+def check_items(n: int = BATCH) -> list:
+    rng = random.Random(1)
+    return [{"trace_id": str(rng.getrandbits(64)), "payment_id": str(uuid.uuid4()), "customer_id": f"cust_{rng.randrange(10**9):010x}",
+             "bank_id": rng.choice(("ING", "ABN", "RABO")), "amount": round(rng.uniform(1, 500), 2), "issue_key": ""} for _ in range(n)]
+
+
+# -- encode ---------------------------------------------------------------
+
+def old_issue_fields(project: str, issue_type: str, req) -> dict:
+    """jira_poller._issue_fields before the ADF skeleton was pre-encoded."""
+    lines = [f"Trace ID: {req.trace_id}", f"Payment ID: {req.payment_id}", f"Customer ID: {req.customer_id}",
+             f"Bank: {req.bank_id}", f"Amount: {req.amount}", f"Reason: {req.reason}"]
+    return {"project": {"key": project}, "summary": f"Suspected Fraud {req.trace_id}", "issuetype": {"name": issue_type},
+            "description": {"type": "doc", "version": 1,
+                            "content": [{"type": "paragraph", "content": [{"type": "text", "text": t}]} for t in lines]}}
+
+
+def per_call_us(fn, budget_s: float = 0.3) -> float:
+    n = max(1, int(budget_s / max(timeit.timeit(fn, number=1), 1e-7)))
+    return min(timeit.repeat(fn, number=n, repeat=3)) / n * 1e6
+
+
+def encode_cases() -> dict:
+    os.environ.update(WORKER_ENV)
+    from fastapi.encoders import jsonable_encoder
+    from starlette.responses import JSONResponse
+    from services.fastjson import FastJSONResponse, dumps
+    from services.aggregates import RollingAggregates
+    from services.banks import BANK_IDS
+    from services import jira_poller, llm_service, web_frontend
+
+    agg = RollingAggregates(BANK_IDS)
+    rng = random.Random(1)
+    for _ in range(10000):
+        agg.record(rng.choice(BANK_IDS), rng.choice(("settled", "failed")), round(rng.lognormvariate(4, 1), 2), rng.choice((None, "Insufficient funds")))
+    items = check_items()
+    responses = {
+        "POST /auth/login": {"ok": True, "customer_id": "cust_ca978112ca"},
+        "POST /pay": {"ok": True, "payment_id": str(uuid.uuid4()), "status": "settled", "bank_id": "ING", "bank_name": "ING"},
+        "POST /check/batch (50)": {"results": [{"payment_id": i["payment_id"], "fraudulent": False, "reason": None, "score": 0.1234} for i in items]},
+        "GET /customers/{id}/payments (50)": {"customer_id": "cust_1", "payments": [
+            {"payment_id": str(uuid.uuid4()), "bank_id": "ING", "amount": 12.5, "status": "settled", "reason": None,
+             "created_at": 1.7e9, "updated_at": 1.7e9} for _ in range(50)]},
+        "GET /stats": agg.snapshot(),
+        "GET /stats?sketch=true": agg.snapshot(sketch=True),
+    }
+    cases = {}
+    for name, body in responses.items():
+        assert json.loads(JSONResponse(jsonable_encoder(body)).body) == json.loads(FastJSONResponse(body).body)
+        cases[name] = (lambda b=body: JSONResponse(jsonable_encoder(b)).body, lambda b=body: FastJSONResponse(b).body)
+
+    login = web_frontend.LoginReq(username="alice", password="secret")
+    req = jira_poller.CreateReq(trace_id="123456789", payment_id=str(uuid.uuid4()), customer_id="cust_1", bank_id="ING", amount=12.5, reason="Suspected Fraud")
+    project, issue_type = jira_poller.JIRA_PROJECT_KEY, jira_poller.JIRA_ISSUE_TYPE
+    outbound = {
+        "web -> auth /auth/login": (lambda: json.dumps(login.model_dump()).encode(), lambda: dumps(login.model_dump())),
+        "payment -> fraud /check": (lambda: json.dumps(items[0]).encode(), lambda: dumps(items[0])),
+        "jira bulk create (50)": (
+            lambda: json.dumps({"issueUpdates": [{"fields": old_issue_fields(project, issue_type, req)} for _ in range(50)]}).encode(),
+            lambda: dumps({"issueUpdates": [{"fields": jira_poller._issue_fields(req)} for _ in range(50)]})),
+        "jira comment": (
+            lambda: json.dumps({"body": {"type": "doc", "version": 1, "content": [{"type": "paragraph", "content": [{"type": "text", "text": "Confirmed fraudulent activity"}]}]}}).encode(),
+            lambda: dumps({"body": jira_poller._adf("Confirmed fraudulent activity")})),
+        "llm SSE token event": (lambda: f"event: token\ndata: {json.dumps({'text': 'hello '})}\n\n".encode(), lambda: llm_service._sse("token", {"text": "hello "})),
+    }
+    assert json.loads(outbound["jira bulk create (50)"][0]()) == json.loads(outbound["jira bulk create (50)"][1]())
+    cases.update(outbound)
+    return {name: {"old_us": round(per_call_us(old), 2), "fast_us": round(per_call_us(fast), 2)} for name, (old, fast) in cases.items()}
+
+
+# -- endpoints (worker) ---------------------------------------------------
+
+def worker(requests: int) -> dict:
+    import httpx
+    from services import auth_service, fraud_service, payment_service
+
+    rng = random.Random(1)
+    for _ in range(10000):
+        payment_service.STATS.record(rng.choice(("ING", "ABN", "RABO")), "settled", round(rng.lognormvariate(4, 1), 2))
+    pid = None
+    for _ in range(50):
+        pid = str(uuid.uuid4())
+        payment_service.LEDGER.append(pid, "created", "cust_bench", "ING", 12.5)
+        payment_service.LEDGER.append(pid, "settled", "cust_bench", "ING", 12.5)
+    payment_service.LEDGER.sync()
+    batch = {"items": check_items()}
+
+    endpoints = [
+        ("POST /auth/login", auth_service.app, "POST", "/auth/login", {"json": {"username": "alice", "password": "secret"}}),
+        ("GET /payments/{id}", payment_service.app, "GET", f"/payments/{pid}", {}),
+        ("GET /customers/{id}/payments (50)", payment_service.app, "GET", "/customers/cust_bench/payments?limit=50", {}),
+        ("GET /stats", payment_service.app, "GET", "/stats", {}),
+        ("GET /stats?sketch=true", payment_service.app, "GET", "/stats?sketch=true", {}),
+        ("POST /check/batch (50)", fraud_service.app, "POST", "/check/batch", {"json": batch}),
+    ]
+
+    async def run() -> dict:
+        out = {}
+        for name, app, method, path, kw in endpoints:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                n = requests if "50" not in name else max(1, requests // 5)
+                for _ in range(min(50, n)):
+                    assert (await client.request(method, path, **kw)).status_code == 200, name
+                t0 = time.process_time()
+                for _ in range(n):
+                    await client.request(method, path, **kw)
+                out[name] = (time.process_time() - t0) / n * 1e6
+        return out
+
+    return asyncio.run(run())
+
+
+def endpoints(requests: int, runs: int) -> dict:
+    samples = {}
+    for _ in range(runs):
+        for mode, enabled in (("fastapi", "false"), ("fastjson", "true")):
+            env = {**os.environ, **WORKER_ENV, "FAST_JSON_ENABLED": enabled, "LEDGER_PATH": os.path.join(tempfile.mkdtemp(), "ledger.bin")}
+            p = subprocess.run([sys.executable, __file__, "--worker", "--requests", str(requests)], env=env, cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True)
+            res = json.loads(p.stdout.strip().splitlines()[-1])
+            for name, us in res.items():
+                samples.setdefault(name, {}).setdefault(mode, []).append(us)
+    return {name: {mode: round(statistics.median(v), 1) for mode, v in s.items()} for name, s in samples.items()}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=2000, help="requests per endpoint per run (a fifth for the 50-item ones)")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--out", default="bench-results/serialization.json")
+    args = ap.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.requests)))
+        return
+
+    results = {"config": vars(args), "encode": encode_cases(), "endpoints": endpoints(args.requests, args.runs)}
+    print("encode (us per body)                   FastAPI/stdlib  fastjson")
+    for name, r in results["encode"].items():
+        print(f"  {name:36s} {r['old_us']:10.2f} {r['fast_us']:9.2f}   x{r['old_us'] / r['fast_us']:.1f}")
+    print("endpoints (CPU us per request)         FAST_JSON_ENABLED=false  true")
+    for name, r in results["endpoints"].items():
+        print(f"  {name:36s} {r['fastapi']:10.1f} {r['fastjson']:9.1f}   {100 * (r['fastjson'] / r['fastapi'] - 1):+.0f}%")
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""Stand-in upstreams for benchmarks: fraud-service and jira-poller with a fixed simulated latency.
+
+    uvicorn stubs:app --app-dir scripts/bench --port 9001
+"""
+import os, asyncio
+from fastapi import FastAPI, Request
+
+STUB_LATENCY_SECONDS = float(os.getenv("STUB_LATENCY_SECONDS", "0.05"))
+
+app = FastAPI(title="Benchmark stubs")
+
+
+@app.post("/jira/create_suspected_fraud")
+async def create(request: Request):
+    body = await request.json()
+    await asyncio.sleep(STUB_LATENCY_SECONDS)
+    return {"issue_key": f"PER-{body.get('payment_id', '')[:8]}"}
+
+
+@app.post("/jira/comment")
+async def comment(request: Request):
+    await asyncio.sleep(STUB_LATENCY_SECONDS)
+    return {"ok": True}
+
+
+@app.post("/check")
+async def check(request: Request):
+    await asyncio.sleep(STUB_LATENCY_SECONDS)
+    return {"fraudulent": False, "reason": "", "comment": "stub"}
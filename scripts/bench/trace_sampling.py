@@ -0,0 +1,136 @@
+"""Tracer overhead at several trace-sampling levels, end to end through the loadgen stack.
+
+Runs the same open-loop login -> pay load (default failure/fraud mix) with tracing off, with every trace kept
+(the old DD_TRACE_SAMPLE_RATE=1 setup) and with the outcome-aware sampler at several TRACE_TARGET_TPS values.
+A fake trace agent stands in for the Datadog agent and counts what the tracers send it. Reports per-service
+CPU (ms per flow), payloads/bytes/traces sent to the agent, and latency. "traces" are per-service chunks. They
+include jira-poller's background traces (outbox dispatcher), which are rooted locally and so are sampled by agent
+rates; the fake agent leaves those at 100%.
+
+    python scripts/bench/trace_sampling.py --rps 20 --duration 30
+    python scripts/bench/trace_sampling.py --levels off keep_all tps_10
+"""
+import asyncio, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import save_results
+from loadgen import Recorder, Stack, StatsdSink, closed, open_loop
+
+LEVELS = {
+    "off": {"DD_TRACE_ENABLED": "false"},
+    "keep_all": {"DD_TRACE_ENABLED": "true", "TRACE_SAMPLING_ENABLED": "false", "DD_TRACE_SAMPLE_RATE": "1"},
+    **{f"tps_{n}": {"DD_TRACE_ENABLED": "true", "TRACE_SAMPLING_ENABLED": "true", "TRACE_TARGET_TPS": str(n),
+                    "DD_TRACE_STATS_COMPUTATION_ENABLED": "true"} for n in (100, 10, 1)},
+}
+
+
+class FakeAgent(threading.Thread):
+    """Minimal trace-agent stand-in: advertises client-side stats / P0 dropping and counts trace payloads."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        agent = self
+        self.lock = threading.Lock()
+        self.reset()
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body: bytes):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/info"):
+                    return self._reply(b'{"version":"7.99.0","client_drop_p0s":true,'
+                                       b'"endpoints":["/v0.4/traces","/v0.5/traces","/v0.6/stats"]}')
+                self._reply(b"{}")
+
+            def do_PUT(self):
+                self.do_POST()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with agent.lock:
+                    if "/traces" in self.path:
+                        agent.payloads += 1
+                        agent.bytes += len(body)
+                        agent.traces += int(self.headers.get("X-Datadog-Trace-Count") or 0)
+                    elif "/stats" in self.path:
+                        agent.stats_bytes += len(body)
+                self._reply(b'{"rate_by_service":{}}')
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+
+    def reset(self):
+        with self.lock:
+            self.payloads = self.bytes = self.traces = self.stats_bytes = 0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"payloads": self.payloads, "bytes": self.bytes, "traces": self.traces, "stats_bytes": self.stats_bytes}
+
+    def run(self):
+        self.server.serve_forever()
+
+
+def run_level(name: str, args, sink: StatsdSink, agent: FakeAgent) -> dict:
+    env = {**LEVELS[name], "DD_TRACE_AGENT_URL": f"http://127.0.0.1:{agent.port}", "DD_TRACE_PROPAGATION_STYLE": "tracecontext,datadog"}
+    stack = Stack(env, sink.port, 1, args.jira_latency)
+    try:
+        stack.wait()
+        asyncio.run(closed(stack.base_url, 2, 1.0, Recorder()))
+        rec = Recorder()
+        cpu0 = stack.cpu()
+        agent.reset()
+        elapsed = asyncio.run(open_loop(stack.base_url, args.rps, args.duration, rec, args.max_in_flight))
+        cpu1 = stack.cpu()
+    finally:
+        # Tracers flush their last chunks on shutdown; that belongs to the run
+        stack.stop()
+    sent = agent.snapshot()
+
+    res = rec.report(elapsed)
+    flows = res["login"]["requests"] or 1
+    cpu = {svc: cpu1[svc] - cpu0[svc] for svc in cpu1 if svc != "fake-jira"}
+    res["elapsed_s"] = round(elapsed, 2)
+    res["cpu_ms_per_flow"] = {svc: round(s / flows * 1000, 2) for svc, s in cpu.items()}
+    res["cpu_ms_per_flow_total"] = round(sum(cpu.values()) / flows * 1000, 2)
+    res["agent"] = {**sent, "bytes_per_flow": round(sent["bytes"] / flows, 1), "traces_per_s": round(sent["traces"] / elapsed, 1)}
+    return res
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--levels", nargs="+", choices=list(LEVELS), default=list(LEVELS))
+    ap.add_argument("--rps", type=float, default=20, help="login->pay flows per second (open loop)")
+    ap.add_argument("--max-in-flight", type=int, default=256)
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    ap.add_argument("--jira-latency", type=float, default=0.05, help="seconds fake Jira adds per call")
+    ap.add_argument("--out", default="bench-results/trace_sampling.json")
+    args = ap.parse_args()
+
+    sink, agent = StatsdSink(), FakeAgent()
+    sink.start()
+    agent.start()
+    results = {"config": vars(args), "levels": {}}
+    try:
+        for name in args.levels:
+            res = run_level(name, args, sink, agent)
+            results["levels"][name] = res
+            flow, sent = res["flow"], res["agent"]
+            print(f"{name:9s} cpu {res['cpu_ms_per_flow_total']:6.2f} ms/flow  agent {sent['traces_per_s']:6.1f} traces/s "
+                  f"{sent['bytes_per_flow']:8.0f} B/flow  flow p50={flow['p50_ms']:.0f}ms p99={flow['p99_ms']:.0f}ms")
+    finally:
+        sink.stop()
+        agent.server.shutdown()
+    save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
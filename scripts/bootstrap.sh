@@ -68,13 +68,66 @@ kubectl --kubeconfig "$KUBECONFIG" -n dd-demo create configmap demo-config \
   --from-literal DD_VERSION="$DD_VERSION" \
   --from-literal PAYMENT_FAIL_RATE="${PAYMENT_FAIL_RATE:-0.15}" \
   --from-literal PAYMENT_SUSPECTED_FRAUD_RATE="${PAYMENT_SUSPECTED_FRAUD_RATE:-0.05}" \
+  --from-literal PAYMENT_HANDLER="${PAYMENT_HANDLER:-async}" \
   --from-literal AUTH_FAIL_RATE="${AUTH_FAIL_RATE:-0.12}" \
+  --from-literal FRAUD_SCORING="${FRAUD_SCORING:-random}" \
   --from-literal FRAUD_CONFIRM_RATE="${FRAUD_CONFIRM_RATE:-0.35}" \
+  --from-literal FRAUD_SCORE_THRESHOLD="${FRAUD_SCORE_THRESHOLD:-0.5}" \
+  --from-literal FRAUD_MAX_CUSTOMERS="${FRAUD_MAX_CUSTOMERS:-100000}" \
+  --from-literal FRAUD_INITIAL_CUSTOMERS="${FRAUD_INITIAL_CUSTOMERS:-1024}" \
   --from-literal JIRA_BASE_URL="${JIRA_BASE_URL:-}" \
   --from-literal JIRA_EMAIL="${JIRA_EMAIL:-}" \
   --from-literal JIRA_PROJECT_KEY="${JIRA_PROJECT_KEY:-PER}" \
   --from-literal JIRA_ISSUE_TYPE="${JIRA_ISSUE_TYPE:-Task}" \
   --from-literal JIRA_POLL_INTERVAL_SECONDS="${JIRA_POLL_INTERVAL_SECONDS:-1800}" \
+  --from-literal JIRA_OUTBOX_ENABLED="${JIRA_OUTBOX_ENABLED:-true}" \
+  --from-literal JIRA_OUTBOX_MAX_ATTEMPTS="${JIRA_OUTBOX_MAX_ATTEMPTS:-8}" \
+  --from-literal JIRA_BULK_ENABLED="${JIRA_BULK_ENABLED:-true}" \
+  --from-literal JIRA_BULK_MAX_SIZE="${JIRA_BULK_MAX_SIZE:-50}" \
+  --from-literal JIRA_BULK_MAX_WAIT_MS="${JIRA_BULK_MAX_WAIT_MS:-200}" \
+  --from-literal LOG_MODE="${LOG_MODE:-async}" \
+  --from-literal LOG_QUEUE_SIZE="${LOG_QUEUE_SIZE:-10000}" \
+  --from-literal LOG_BATCH_SIZE="${LOG_BATCH_SIZE:-256}" \
+  --from-literal LOG_FLUSH_INTERVAL_MS="${LOG_FLUSH_INTERVAL_MS:-200}" \
+  --from-literal LOG_SAMPLE_RATES="${LOG_SAMPLE_RATES:-}" \
+  --from-literal LOG_SAMPLE_BUDGET_PER_SEC="${LOG_SAMPLE_BUDGET_PER_SEC:-0}" \
+  --from-literal TRACE_SAMPLING_ENABLED="${TRACE_SAMPLING_ENABLED:-true}" \
+  --from-literal TRACE_TARGET_TPS="${TRACE_TARGET_TPS:-10}" \
+  --from-literal TRACE_INTEGRATIONS="${TRACE_INTEGRATIONS:-}" \
+  --from-literal STATSD_AGGREGATION="${STATSD_AGGREGATION:-true}" \
+  --from-literal STATSD_FLUSH_INTERVAL_SECONDS="${STATSD_FLUSH_INTERVAL_SECONDS:-2}" \
+  --from-literal ADMISSION_LIMITS="${ADMISSION_LIMITS:-/pay=64:128,/api/pay=128:256}" \
+  --from-literal ADMISSION_QUEUE_TIMEOUT_MS="${ADMISSION_QUEUE_TIMEOUT_MS:-500}" \
+  --from-literal ADMISSION_ADAPTIVE="${ADMISSION_ADAPTIVE:-false}" \
+  --from-literal ADMISSION_TARGET_LATENCY_MS="${ADMISSION_TARGET_LATENCY_MS:-1000}" \
+  --from-literal CIRCUIT_ENABLED="${CIRCUIT_ENABLED:-true}" \
+  --from-literal CIRCUIT_FAILURE_RATE="${CIRCUIT_FAILURE_RATE:-0.5}" \
+  --from-literal CIRCUIT_MIN_CALLS="${CIRCUIT_MIN_CALLS:-20}" \
+  --from-literal CIRCUIT_OPEN_SECONDS="${CIRCUIT_OPEN_SECONDS:-15}" \
+  --from-literal REQUEST_DEADLINE_MS="${REQUEST_DEADLINE_MS:-15000}" \
+  --from-literal PAYMENT_FRAUD_FALLBACK="${PAYMENT_FRAUD_FALLBACK:-reject}" \
+  --from-literal IDEMPOTENCY_TTL_SECONDS="${IDEMPOTENCY_TTL_SECONDS:-3600}" \
+  --from-literal IDEMPOTENCY_MAX_ENTRIES="${IDEMPOTENCY_MAX_ENTRIES:-100000}" \
+  --from-literal DEDUP_ENABLED="${DEDUP_ENABLED:-true}" \
+  --from-literal DUPLICATE_WINDOW_SECONDS="${DUPLICATE_WINDOW_SECONDS:-60}" \
+  --from-literal DEDUP_EXPECTED_PER_WINDOW="${DEDUP_EXPECTED_PER_WINDOW:-100000}" \
+  --from-literal LEDGER_ENABLED="${LEDGER_ENABLED:-true}" \
+  --from-literal LEDGER_FSYNC="${LEDGER_FSYNC:-true}" \
+  --from-literal LEDGER_MAX_BATCH="${LEDGER_MAX_BATCH:-1024}" \
+  --from-literal LEDGER_SYNC_TIMEOUT_SECONDS="${LEDGER_SYNC_TIMEOUT_SECONDS:-5}" \
+  --from-literal STATS_WINDOW_SECONDS="${STATS_WINDOW_SECONDS:-300}" \
+  --from-literal STATS_BUCKETS="${STATS_BUCKETS:-10}" \
+  --from-literal STATS_SKETCH_ACCURACY="${STATS_SKETCH_ACCURACY:-0.01}" \
+  --from-literal FAST_JSON_ENABLED="${FAST_JSON_ENABLED:-true}" \
+  --from-literal LLM_CACHE_ENABLED="${LLM_CACHE_ENABLED:-true}" \
+  --from-literal LLM_CACHE_MAX_ENTRIES="${LLM_CACHE_MAX_ENTRIES:-10000}" \
+  --from-literal LLM_CACHE_TTL_SECONDS="${LLM_CACHE_TTL_SECONDS:-600}" \
+  --from-literal LLM_BATCH_MAX_SIZE="${LLM_BATCH_MAX_SIZE:-8}" \
+  --from-literal LLM_BATCH_MAX_WAIT_MS="${LLM_BATCH_MAX_WAIT_MS:-10}" \
+  --from-literal SESSION_BACKEND="${SESSION_BACKEND:-sqlite}" \
+  --from-literal SESSION_TTL_SECONDS="${SESSION_TTL_SECONDS:-3600}" \
+  --from-literal SESSION_MAX_ENTRIES="${SESSION_MAX_ENTRIES:-100000}" \
+  --from-literal SESSION_REDIS_URL="${SESSION_REDIS_URL:-}" \
   --from-literal DD_RUM_APPLICATION_ID="${DD_RUM_APPLICATION_ID:-}" \
   --from-literal DD_RUM_SITE="${DD_RUM_SITE:-$DD_SITE}" \
   --from-literal DD_RUM_SERVICE="${DD_RUM_SERVICE:-web-frontend}" \
@@ -0,0 +1,180 @@
+import os, math, time, asyncio
+from collections import deque
+from typing import Optional
+from .metrics import tags
+
+# Per-route concurrency limits, e.g. "/pay=64,/api/pay=128:256" (route=limit[:queue]). Routes not listed are
+# not limited. Limits are per pod: each of the WEB_CONCURRENCY uvicorn workers gets an even share.
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "")
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))  # uvicorn's default for --workers
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "500"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+# AIMD: grow the limit by ~1 per limit's worth of fast completions, cut it by 10% when latency exceeds the target
+ADMISSION_ADAPTIVE = os.getenv("ADMISSION_ADAPTIVE", "false").lower() in ("1", "true", "yes", "y")
+ADMISSION_TARGET_LATENCY_MS = float(os.getenv("ADMISSION_TARGET_LATENCY_MS", "1000"))
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "4"))
+
+
+def parse_limits(spec: str, workers: int = 1) -> dict:
+    out = {}
+    for part in spec.split(","):
+        route, _, value = part.strip().partition("=")
+        if not route or not value:
+            continue
+        limit, _, queue = value.partition(":")
+        limit, queue = int(limit), int(queue) if queue else int(limit)
+        out[route] = (math.ceil(limit / workers), math.ceil(queue / workers))
+    return out
+
+
+def route_path(scope) -> str:
+    """The path the app routes on: without the root_path of a mount (e.g. /payment-service in the monolith)."""
+    path, root = scope["path"], scope.get("root_path", "")
+    if root and path.startswith(root):
+        return path[len(root):] or "/"
+    return path
+
+
+class RouteLimiter:
+    """In-flight limit with a bounded FIFO wait queue for one route; lives on the event loop (no locks)."""
+
+    def __init__(self, route: str, limit: int, max_queue: int, queue_timeout: float, statsd=None,
+                 adaptive: bool = False, target_latency: float = 1.0, min_limit: int = 1, max_limit: int = None):
+        self.route = route
+        self.limit = float(limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit * 4
+        self.in_flight = 0
+        self._waiters = deque()
+        self._last_decrease = 0.0
+        self._statsd = statsd
+        self._tags = tags("route", route)
+
+    def _report(self) -> None:
+        if self._statsd is not None:
+            self._statsd.gauge("admission.in_flight", self.in_flight, tags=self._tags)
+            self._statsd.gauge("admission.queued", len(self._waiters), tags=self._tags)
+            self._statsd.gauge("admission.limit", int(self.limit), tags=self._tags)
+
+    def _shed(self, reason: str) -> str:
+        if self._statsd is not None:
+            self._statsd.increment("admission.shed", tags=tags("route", self.route, "reason", reason))
+        return reason
+
+    async def acquire(self) -> Optional[str]:
+        """Returns None once admitted, or the reason the request was shed."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self._report()
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return self._shed("queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._report()
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait({fut}, timeout=self.queue_timeout)
+        except BaseException:
+            # Client went away while queued: give back a slot that was already handed over
+            if fut.done() and not fut.cancelled():
+                self.release(0.0, True)
+            else:
+                fut.cancel()
+                self._waiters.remove(fut)
+            raise
+        if self._statsd is not None:
+            self._statsd.distribution("admission.queue_wait", (time.monotonic() - t0) * 1000, tags=self._tags)
+        if fut.done():
+            return None  # release() handed its slot over; in_flight already counts us
+        fut.cancel()
+        self._waiters.remove(fut)
+        self._report()
+        return self._shed("queue_timeout")
+
+    def release(self, latency: float, ok: bool) -> None:
+        if self.adaptive:
+            self._adapt(latency, ok)
+        # Hand the slot straight to the oldest waiter unless the (adaptive) limit has dropped below in_flight
+        if self.in_flight <= int(self.limit):
+            while self._waiters:
+                fut = self._waiters.popleft()
+                if not fut.done():
+                    fut.set_result(None)
+                    self._report()
+                    return
+        self.in_flight -= 1
+        self._report()
+
+    def _adapt(self, latency: float, ok: bool) -> None:
+        now = time.monotonic()
+        if not ok or latency > self.target_latency:
+            # At most one decrease per target-latency window, so one slow burst doesn't collapse the limit
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(float(self.min_limit), self.limit * 0.9)
+                self._last_decrease = now
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+
+class AdmissionControl:
+    """ASGI middleware that admits at most `limit` concurrent requests per configured route.
+
+    Excess requests wait in a bounded queue for up to `queue_timeout`; when the queue is full or the wait
+    times out they get an immediate 503 with Retry-After instead of piling up in the threadpool.
+    """
+
+    def __init__(self, app, limiters: dict, retry_after: int = ADMISSION_RETRY_AFTER_SECONDS):
+        self.app = app
+        self.limiters = limiters
+        self._reject_headers = [
+            (b"content-type", b"application/json"),
+            (b"retry-after", str(retry_after).encode()),
+        ]
+
+    async def _reject(self, send, reason: str) -> None:
+        body = b'{"error":"overloaded","reason":"' + reason.encode() + b'"}'
+        await send({"type": "http.response.start", "status": 503,
+                    "headers": [*self._reject_headers, (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiters.get(route_path(scope)) if scope["type"] == "http" else None
+        if limiter is None:
+            return await self.app(scope, receive, send)
+
+        reason = await limiter.acquire()
+        if reason is not None:
+            return await self._reject(send, reason)
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = time.monotonic()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            limiter.release(time.monotonic() - t0, status < 500)
+
+
+def install_admission(app, statsd=None, spec: str = ADMISSION_LIMITS, workers: int = WEB_CONCURRENCY) -> None:
+    """Add AdmissionControl to `app` for the routes in ADMISSION_LIMITS that this app serves, split over `workers`."""
+    paths = {getattr(r, "path", None) for r in app.routes}
+    limiters = {
+        route: RouteLimiter(
+            route, limit, queue, ADMISSION_QUEUE_TIMEOUT_MS / 1000, statsd=statsd,
+            adaptive=ADMISSION_ADAPTIVE, target_latency=ADMISSION_TARGET_LATENCY_MS / 1000, min_limit=ADMISSION_MIN_LIMIT,
+        )
+        for route, (limit, queue) in parse_limits(spec, workers).items() if route in paths
+    }
+    if limiters:
+        app.add_middleware(AdmissionControl, limiters=limiters)
@@ -0,0 +1,257 @@
+import os, math, time, threading
+from bisect import bisect_right
+from collections import Counter
+from itertools import accumulate
+from typing import List
+from fastapi import HTTPException
+
+# Rolling per-bank aggregates served by GET /stats: the last STATS_WINDOW_SECONDS, kept as STATS_BUCKETS buckets
+# (the window slides one bucket at a time). Amount quantiles are within STATS_SKETCH_ACCURACY relative error.
+STATS_WINDOW_SECONDS = float(os.getenv("STATS_WINDOW_SECONDS", "300"))
+STATS_BUCKETS = int(os.getenv("STATS_BUCKETS", "10"))
+STATS_SKETCH_ACCURACY = float(os.getenv("STATS_SKETCH_ACCURACY", "0.01"))
+# 2048 bins at 1% cover amounts across 18 orders of magnitude; past that the lowest bins are folded together
+SKETCH_MAX_BINS = 2048
+# Distinct reasons kept per bank; any further ones are counted under OTHER
+MAX_REASONS = 32
+OTHER = "other"
+QUANTILES = (0.5, 0.9, 0.99)
+_MIN_VALUE = 1e-9
+
+
+class DDSketch:
+    """Quantile sketch with relative accuracy `alpha` (DDSketch).
+
+    A value x > 0 is counted in bin ceil(log_gamma(x)), gamma = (1 + alpha) / (1 - alpha), so any quantile it
+    reports is within alpha of the true value. Bins are plain counts: sketches with the same alpha merge exactly by
+    adding them (and a merged sketch can be taken apart again by subtracting), whatever order values came in.
+    """
+    __slots__ = ("alpha", "gamma", "_ln_gamma", "max_bins", "bins", "zero", "count", "sum")
+
+    def __init__(self, alpha: float = STATS_SKETCH_ACCURACY, max_bins: int = SKETCH_MAX_BINS):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._ln_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins = {}   # bin key -> count
+        self.zero = 0    # values <= 0 (a zero amount)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, x: float, n: int = 1) -> None:
+        if x > _MIN_VALUE:
+            k = math.ceil(math.log(x) / self._ln_gamma)
+            bins = self.bins
+            bins[k] = bins.get(k, 0) + n
+            if len(bins) > self.max_bins:
+                self._collapse()
+        else:
+            self.zero += n
+        self.count += n
+        self.sum += x * n
+
+    def _collapse(self) -> None:
+        keys = sorted(self.bins)
+        fold = keys[:len(keys) - self.max_bins + 1]
+        self.bins[fold[-1]] = sum(self.bins.pop(k) for k in fold[:-1]) + self.bins[fold[-1]]
+
+    def _check(self, other: "DDSketch") -> None:
+        if other.alpha != self.alpha:
+            raise ValueError(f"cannot combine sketches with accuracy {self.alpha} and {other.alpha}")
+
+    def merge(self, other: "DDSketch") -> None:
+        self._check(other)
+        bins = self.bins
+        for k, c in other.bins.items():
+            bins[k] = bins.get(k, 0) + c
+        if len(bins) > self.max_bins:
+            self._collapse()
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+
+    def subtract(self, other: "DDSketch") -> None:
+        """Remove a sketch previously merged into this one."""
+        self._check(other)
+        bins = self.bins
+        for k, c in other.bins.items():
+            if k not in bins:  # folded away by _collapse
+                k = min(bins, default=k)
+            left = bins.get(k, 0) - c
+            if left > 0:
+                bins[k] = left
+            else:
+                bins.pop(k, None)
+        self.zero = max(0, self.zero - other.zero)
+        self.count = max(0, self.count - other.count)
+        self.sum = self.sum - other.sum if self.count else 0.0
+
+    def quantiles(self, qs) -> list:
+        """Values at the given quantiles; None if the sketch is empty."""
+        if not self.count:
+            return [None] * len(qs)
+        keys = sorted(self.bins)
+        seen = list(accumulate(map(self.bins.__getitem__, keys)))  # values in bins up to and including keys[i]
+        out, gamma = [], self.gamma
+        for q in qs:
+            rank = q * (self.count - 1) - self.zero
+            if rank < 0 or not keys:
+                out.append(0.0)
+                continue
+            k = keys[min(bisect_right(seen, rank), len(keys) - 1)]
+            out.append(2 * gamma ** k / (gamma + 1))
+        return out
+
+    def quantile(self, q: float):
+        return self.quantiles((q,))[0]
+
+    def to_dict(self) -> dict:
+        return {"alpha": self.alpha, "zero": self.zero, "count": self.count, "sum": self.sum, "bins": sorted(self.bins.items())}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "DDSketch":
+        s = cls(float(d["alpha"]))
+        s.bins = {int(k): int(c) for k, c in d["bins"]}
+        s.zero, s.count, s.sum = int(d["zero"]), int(d["count"]), float(d["sum"])
+        return s
+
+
+class _Cell:
+    """One bank's counts by outcome and reason plus its amount sketch."""
+    __slots__ = ("outcomes", "reasons", "amounts")
+
+    def __init__(self, alpha: float):
+        self.outcomes = Counter()
+        self.reasons = Counter()
+        self.amounts = DDSketch(alpha)
+
+    def add(self, outcome: str, reason, amount: float) -> None:
+        self.outcomes[outcome] += 1
+        if reason:
+            self.reasons[reason] += 1
+        self.amounts.add(amount)
+
+    def merge(self, other: "_Cell") -> None:
+        self.outcomes.update(other.outcomes)
+        self.reasons.update(other.reasons)
+        self.amounts.merge(other.amounts)
+
+    def subtract(self, other: "_Cell") -> None:
+        self.outcomes -= other.outcomes  # in-place Counter subtraction drops what reaches zero
+        self.reasons -= other.reasons
+        self.amounts.subtract(other.amounts)
+
+    def summary(self, sketch: bool) -> dict:
+        a = self.amounts
+        out = {
+            "count": a.count, "outcomes": dict(self.outcomes), "reasons": dict(self.reasons),
+            "amount": {"sum": round(a.sum, 2), "mean": round(a.sum / a.count, 2) if a.count else None,
+                       **{f"p{round(q * 100)}": None if v is None else round(v, 2) for q, v in zip(QUANTILES, a.quantiles(QUANTILES))}},
+        }
+        if sketch:
+            out["sketch"] = a.to_dict()
+        return out
+
+    @classmethod
+    def from_summary(cls, d: dict) -> "_Cell":
+        sketch = DDSketch.from_dict(d["sketch"])
+        cell = cls(sketch.alpha)
+        cell.outcomes.update(d["outcomes"])
+        cell.reasons.update(d["reasons"])
+        cell.amounts = sketch
+        return cell
+
+
+class RollingAggregates:
+    """Per-bank outcome/reason counts and amount quantiles over a sliding time window, updated on every record().
+
+    The window is a ring of `buckets` buckets aligned to wall-clock multiples of window / buckets (so replicas'
+    windows line up). Besides the buckets, a running total per bank is kept: record() adds to both, and a bucket
+    leaving the window is subtracted from the totals. A snapshot therefore reads one total per bank, however many
+    payments the window holds. Memory is bounded by banks x (buckets + 1) x (sketch bins + reasons): bank ids
+    outside `keys` share the OTHER row and reasons past MAX_REASONS per bank count as OTHER.
+    """
+
+    def __init__(self, keys, window: float = STATS_WINDOW_SECONDS, buckets: int = STATS_BUCKETS,
+                 alpha: float = STATS_SKETCH_ACCURACY, clock=time.time):
+        self.keys = tuple(keys)
+        self.window = window
+        self.buckets = max(1, buckets)
+        self.width = window / self.buckets
+        self.alpha = alpha
+        self._clock = clock
+        self._ring = [None] * self.buckets   # (bucket index, {bank: _Cell}) per slot
+        self._total = {k: _Cell(alpha) for k in (*self.keys, OTHER)}
+        self._idx = None
+        self._lock = threading.Lock()
+
+    def _advance(self, now: float) -> int:
+        idx = int(now // self.width)
+        if idx != self._idx:
+            for slot, b in enumerate(self._ring):
+                if b is not None and b[0] <= idx - self.buckets:
+                    for bank, cell in b[1].items():
+                        self._total[bank].subtract(cell)
+                    self._ring[slot] = None
+            self._idx = idx
+        return idx
+
+    def record(self, bank: str, outcome: str, amount: float, reason: str = None) -> None:
+        if bank not in self._total:
+            bank = OTHER
+        with self._lock:
+            idx = self._advance(self._clock())
+            total = self._total[bank]
+            if reason and reason not in total.reasons and len(total.reasons) >= MAX_REASONS:
+                reason = OTHER
+            slot = idx % self.buckets
+            b = self._ring[slot]
+            if b is None or b[0] != idx:
+                b = self._ring[slot] = (idx, {})
+            cell = b[1].get(bank)
+            if cell is None:
+                cell = b[1][bank] = _Cell(self.alpha)
+            cell.add(outcome, reason, amount)
+            total.add(outcome, reason, amount)
+
+    def snapshot(self, sketch: bool = False) -> dict:
+        """Window totals per bank; with sketch=True each bank also carries its mergeable amount sketch."""
+        with self._lock:
+            now = self._clock()
+            self._advance(now)
+            banks = {bank: cell.summary(sketch) for bank, cell in self._total.items() if bank != OTHER or cell.amounts.count}
+        return {"window_seconds": self.window, "bucket_seconds": self.width, "as_of": now, "banks": banks}
+
+
+def merge_snapshots(snapshots: List[dict]) -> dict:
+    """Combine /stats?sketch=true snapshots from several replicas into one, as if a single process had seen it all."""
+    if not snapshots:
+        raise ValueError("nothing to merge")
+    merged = {}
+    for snap in snapshots:
+        for bank, d in snap["banks"].items():
+            cell = _Cell.from_summary(d)
+            if bank in merged:
+                merged[bank].merge(cell)
+            else:
+                merged[bank] = cell
+    first = snapshots[0]
+    return {"window_seconds": first["window_seconds"], "bucket_seconds": first["bucket_seconds"],
+            "as_of": max(s["as_of"] for s in snapshots), "replicas": len(snapshots),
+            "banks": {bank: cell.summary(True) for bank, cell in merged.items()}}
+
+
+def install_stats(app, aggregates: RollingAggregates) -> None:
+    """GET /stats (rolling per-bank aggregates) and POST /stats/merge (combine replicas' snapshots)."""
+
+    def stats(sketch: bool = False):
+        return aggregates.snapshot(sketch)
+
+    def merge_stats(snapshots: List[dict]):
+        try:
+            return merge_snapshots(snapshots)
+        except (KeyError, TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail={"error": "bad_snapshot", "reason": str(e)})
+
+    app.add_api_route("/stats", stats, methods=["GET"], summary="Rolling per-bank aggregates; sketch=true adds mergeable amount sketches")
+    app.add_api_route("/stats/merge", merge_stats, methods=["POST"], summary="Merge /stats?sketch=true snapshots from several replicas")
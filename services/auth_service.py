@@ -1,24 +1,24 @@
 import os, random, hashlib, logging
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from datadog import DogStatsd
 from ddtrace import tracer
-from .obs import init_observability, current_dd_ids, base_fields
+from .obs import init_observability, current_dd_ids, base_fields, keep_trace, install_trace_sampling
+from .admission import install_admission
+from .fastjson import install_fast_json
+from .metrics import make_statsd, preintern, tags
 
-init_observability()
+init_observability(integrations=("fastapi",))
 LOG = logging.getLogger("auth_service")
 
 DD_SERVICE = os.getenv("DD_SERVICE", "auth-service")
-statsd = DogStatsd(
-    host=os.getenv("DD_AGENT_HOST", "127.0.0.1"),
-    port=int(os.getenv("DD_DOGSTATSD_PORT", "8125")),
-    constant_tags=[f"service:{DD_SERVICE}", f"env:{os.getenv('DD_ENV','dev')}", f"version:{os.getenv('DD_VERSION','0.1.0')}"],
-)
+statsd = make_statsd(DD_SERVICE)
 
 AUTH_FAIL_RATE = float(os.getenv("AUTH_FAIL_RATE", "0.12"))
 FAIL_REASONS = ["Incorrect password", "incorrect username", "account not found", "Unknown device"]
+preintern(("reason", FAIL_REASONS))
 
 app = FastAPI(title="Auth Service", version=os.getenv("DD_VERSION","0.1.0"))
+install_fast_json(app)
 
 class LoginReq(BaseModel):
     username: str
@@ -34,10 +34,14 @@ def login(req: LoginReq):
 
         if random.random() < AUTH_FAIL_RATE:
             reason = random.choice(FAIL_REASONS)
-            statsd.increment("auth.failed", tags=[f"reason:{reason}"])
+            statsd.increment("auth.failed", tags=tags("reason", reason))
+            keep_trace("auth_error")
             LOG.warning("auth_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": cid, "status": "auth_error", "reason": reason})
             raise HTTPException(status_code=401, detail={"error":"auth_error","reason":reason,"customer_id":cid})
 
         statsd.increment("auth.ok")
         LOG.info("auth_ok", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": cid, "status": "auth_ok"})
         return {"ok": True, "customer_id": cid}
+
+install_admission(app, statsd)
+install_trace_sampling(app, statsd)
@@ -1,3 +1,5 @@
+from .fastjson import dumps
+
 BANKS = [
     {"id": "FNB", "name": "FNB"},
     {"id": "ABN", "name": "ABN AMRO Bank"},
@@ -8,3 +10,8 @@ BANKS = [
     {"id": "BARC", "name": "Barclays"},
     {"id": "CITI", "name": "Citibank"},
 ]
+
+BANK_NAMES = {b["id"]: b["name"] for b in BANKS}
+BANK_IDS = tuple(BANK_NAMES)
+# GET /banks (payment-service) and /api/banks (web-frontend) body, encoded once
+BANKS_JSON = dumps({"banks": BANKS})
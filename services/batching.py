@@ -0,0 +1,173 @@
+import time, queue, asyncio, threading, contextvars, logging
+from concurrent.futures import Future
+from typing import Any, Callable, List
+from .metrics import tags
+
+LOG = logging.getLogger("batching")
+
+
+class RetryAfter(Exception):
+    """Raised by a flush function to have the whole batch retried after `seconds` (e.g. HTTP 429)."""
+
+    def __init__(self, seconds: float, reason: str = "rate_limited"):
+        super().__init__(f"{reason}, retry after {seconds:.2f}s")
+        self.seconds = seconds
+        self.reason = reason
+
+
+class Batcher:
+    """Coalesces items submitted from many threads into batches for a single flush call.
+
+    A batch is flushed when it reaches `max_size` items or `max_wait` seconds after its first item.
+    `flush(items)` returns one result per item, in order; a result that is an Exception fails only
+    that item's future, while an exception raised by `flush` itself fails the whole batch.
+    """
+
+    def __init__(self, flush: Callable[[List[Any]], List[Any]], max_size: int = 50, max_wait: float = 0.05,
+                 max_retries: int = 5, statsd=None, metric_prefix: str = "batch", name: str = "batcher"):
+        self._flush = flush
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self._statsd = statsd
+        self._prefix = metric_prefix
+        self._q = queue.Queue()
+        self._not_before = 0.0  # pacing after a RetryAfter
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        fut = Future()
+        self._q.put((item, fut, time.monotonic()))
+        return fut
+
+    def _collect(self) -> list:
+        batch = [self._q.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            items = [b[0] for b in batch]
+            futures = [b[1] for b in batch]
+            start = time.monotonic()
+            try:
+                results = self._flush_paced(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"flush returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for f in futures:
+                    f.set_exception(e)
+                self._emit(batch, start, "error")
+                continue
+            for f, res in zip(futures, results):
+                if isinstance(res, BaseException):
+                    f.set_exception(res)
+                else:
+                    f.set_result(res)
+            self._emit(batch, start, "ok")
+
+    def _flush_paced(self, items: list) -> list:
+        attempt = 0
+        while True:
+            wait = self._not_before - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                return self._flush(items)
+            except RetryAfter as e:
+                attempt += 1
+                self._not_before = time.monotonic() + e.seconds
+                if self._statsd is not None:
+                    self._statsd.increment(f"{self._prefix}.throttled", tags=[f"reason:{e.reason}"])
+                LOG.warning("batch_throttled", extra={"status": "batch_throttled", "reason": str(e), "attempts": attempt})
+                if attempt > self.max_retries:
+                    raise
+
+    def _emit(self, batch: list, start: float, outcome: str) -> None:
+        if self._statsd is None:
+            return
+        now = time.monotonic()
+        tags = [f"outcome:{outcome}"]
+        self._statsd.distribution(f"{self._prefix}.size", len(batch), tags=tags)
+        self._statsd.distribution(f"{self._prefix}.flush_latency", (now - start) * 1000, tags=tags)
+        self._statsd.distribution(f"{self._prefix}.queue_wait", (start - batch[0][2]) * 1000, tags=tags)
+
+
+class AsyncBatcher:
+    """Gathers concurrent submit() calls into batches for a batch-capable coroutine function.
+
+    A batch is flushed when it reaches `max_size` items or `max_wait` seconds after its first item arrived,
+    whichever comes first. `fn(items)` returns one result per item, in order; an Exception instance in the
+    result list fails only that item's caller. Lives on one event loop (no locks). The batch call runs in a
+    fresh context, so spans it opens don't land in whichever request happened to trigger the flush.
+    """
+
+    def __init__(self, fn, max_size: int, max_wait: float, statsd=None, metric_prefix: str = "batch"):
+        self.fn = fn
+        self.max_size = max(1, int(max_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self._statsd = statsd
+        self._prefix = metric_prefix
+        self._pending = []  # (item, future, enqueued_at)
+        self._timer = None
+
+    async def submit(self, item) -> tuple:
+        """Returns (result, batch_size, queue_wait_seconds) or raises the item's exception."""
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((item, fut, time.monotonic()))
+        if len(self._pending) >= self.max_size or self.max_wait == 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_size], self._pending[self.max_size:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        if batch:
+            loop = asyncio.get_running_loop()
+            contextvars.Context().run(loop.create_task, self._run(batch))
+
+    async def _run(self, batch: list) -> None:
+        started = time.monotonic()
+        size = len(batch)
+        if self._statsd is not None:
+            self._statsd.distribution(f"{self._prefix}.size", size)
+            for _, _, enqueued_at in batch:
+                self._statsd.distribution(f"{self._prefix}.queue_wait", (started - enqueued_at) * 1000)
+        try:
+            results = await self.fn([item for item, _, _ in batch])
+            if len(results) != size:
+                raise RuntimeError(f"batch function returned {len(results)} results for {size} items")
+        except Exception as e:
+            results = [e] * size
+        for (_, fut, enqueued_at), res in zip(batch, results):
+            if fut.done():  # caller went away
+                continue
+            if isinstance(res, Exception):
+                fut.set_exception(res)
+            else:
+                fut.set_result((res, size, started - enqueued_at))
+        if self._statsd is not None:
+            self._statsd.distribution(f"{self._prefix}.duration", (time.monotonic() - started) * 1000,
+                                      tags=tags("size", _size_bucket(size)))
+
+
+def _size_bucket(size: int) -> str:
+    # Bounded tag cardinality: 1, 2-3, 4-7, 8-15, ...
+    low = 1 << (size.bit_length() - 1)
+    return str(low) if low == 1 else f"{low}-{2 * low - 1}"
@@ -0,0 +1,126 @@
+import os, math, time, threading
+from .lru import TTLCache
+
+# A payment repeating (customer, bank, amount) within DUPLICATE_WINDOW_SECONDS is a duplicate. The Bloom
+# generations are sized for DEDUP_EXPECTED_PER_WINDOW distinct payments per window at DEDUP_FALSE_POSITIVE_RATE;
+# every Bloom hit is confirmed against an exact cache of at most DEDUP_EXACT_MAX_ENTRIES keys.
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+DUPLICATE_WINDOW_SECONDS = float(os.getenv("DUPLICATE_WINDOW_SECONDS", "60"))
+DEDUP_EXPECTED_PER_WINDOW = int(os.getenv("DEDUP_EXPECTED_PER_WINDOW", "100000"))
+DEDUP_FALSE_POSITIVE_RATE = float(os.getenv("DEDUP_FALSE_POSITIVE_RATE", "0.01"))
+DEDUP_EXACT_MAX_ENTRIES = int(os.getenv("DEDUP_EXACT_MAX_ENTRIES", "100000"))
+DEDUP_GENERATIONS = 4
+
+NEW, DUPLICATE, PROBABLE = "new", "duplicate", "probable"
+
+
+class _Bloom:
+    __slots__ = ("bits", "m", "k")
+
+    def __init__(self, m: int, k: int):
+        self.bits = bytearray((m + 7) // 8)
+        self.m = m
+        self.k = k
+
+    def positions(self, h1: int, h2: int):
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def contains(self, positions) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def add(self, positions) -> None:
+        bits = self.bits
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+
+
+class DuplicateDetector:
+    """Flags a (customer_id, bank_id, amount) seen again within `window` seconds.
+
+    Rotating Bloom filters answer "definitely new" in O(k) with fixed memory however many customers there
+    are: DEDUP_GENERATIONS filters each cover window/(generations-1) seconds, so together they always span at
+    least the window. A Bloom hit is confirmed in the exact TTL cache (key -> first-seen time). If the exact
+    cache has already evicted the key the verdict is PROBABLE rather than DUPLICATE: callers only reject on
+    DUPLICATE, and count PROBABLE.
+
+    check() records every payment it sees. Callers that should only count payments with a given outcome
+    (payment-service: settled ones, so a retry after a decline goes through) call seen() first and record() later.
+    """
+
+    def __init__(self, window: float = DUPLICATE_WINDOW_SECONDS, expected: int = DEDUP_EXPECTED_PER_WINDOW,
+                 fp_rate: float = DEDUP_FALSE_POSITIVE_RATE, exact_max_entries: int = DEDUP_EXACT_MAX_ENTRIES,
+                 generations: int = DEDUP_GENERATIONS, clock=time.monotonic):
+        self.window = window
+        self._span = window / (generations - 1)
+        per_gen = max(1, math.ceil(expected / (generations - 1)))
+        # A lookup probes every generation, so each gets 1/generations of the false-positive budget
+        per_gen_fp = fp_rate / generations
+        self._m = max(64, math.ceil(-per_gen * math.log(per_gen_fp) / math.log(2) ** 2))
+        self._k = max(1, round(self._m / per_gen * math.log(2)))
+        self._gens = [_Bloom(self._m, self._k) for _ in range(generations)]  # newest first
+        self._gen_start = clock()
+        self._exact = TTLCache(exact_max_entries, window, clock=clock)
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(len(g.bits) for g in self._gens)
+
+    def _rotate(self, now: float) -> None:
+        behind = int((now - self._gen_start) // self._span)
+        if behind <= 0:
+            return
+        for _ in range(min(behind, len(self._gens))):
+            self._gens.pop()
+            self._gens.insert(0, _Bloom(self._m, self._k))
+        self._gen_start += behind * self._span
+
+    @staticmethod
+    def _key(customer_id: str, bank_id: str, amount: float) -> tuple:
+        key = (customer_id, bank_id, round(amount * 100))
+        h1 = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h2 = (hash((h1, key)) & 0xFFFFFFFFFFFFFFFF) | 1
+        return key, h1, h2
+
+    def _lookup(self, key: tuple, positions) -> str:
+        if not any(g.contains(positions) for g in self._gens):
+            return NEW
+        if self._exact.get(key) is not None:
+            return DUPLICATE
+        # The cache has room, so it didn't evict the key: the Bloom hit was a false positive or the key aged out
+        return NEW if len(self._exact) < self._exact.max_entries else PROBABLE
+
+    def _add(self, key: tuple, positions, now: float) -> None:
+        self._gens[0].add(positions)
+        self._exact.set(key, now)
+
+    def seen(self, customer_id: str, bank_id: str, amount: float) -> str:
+        """Return NEW, DUPLICATE or PROBABLE without recording the payment (see record())."""
+        key, h1, h2 = self._key(customer_id, bank_id, amount)
+        with self._lock:
+            self._rotate(self._clock())
+            return self._lookup(key, self._gens[0].positions(h1, h2))
+
+    def record(self, customer_id: str, bank_id: str, amount: float) -> None:
+        """Count the payment from now on, e.g. once it has settled."""
+        key, h1, h2 = self._key(customer_id, bank_id, amount)
+        now = self._clock()
+        with self._lock:
+            self._rotate(now)
+            self._add(key, self._gens[0].positions(h1, h2), now)
+
+    def check(self, customer_id: str, bank_id: str, amount: float) -> str:
+        """seen() and record() in one step: every check counts, whatever its outcome."""
+        key, h1, h2 = self._key(customer_id, bank_id, amount)
+        now = self._clock()
+        with self._lock:
+            self._rotate(now)
+            positions = self._gens[0].positions(h1, h2)
+            verdict = self._lookup(key, positions)
+            self._gens[0].add(positions)
+            if verdict != DUPLICATE:
+                self._exact.set(key, now)  # a duplicate keeps its first-seen time
+            return verdict
@@ -0,0 +1,100 @@
+import os, json, asyncio, inspect, functools
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
+from fastapi.utils import is_body_allowed_for_status_code
+from fastapi.datastructures import Default, DefaultPlaceholder
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, Response
+
+# One JSON encoder for responses, outbound calls and logs. false: responses take FastAPI's own path (jsonable_encoder + json.dumps)
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+
+try:
+    import orjson
+
+    def dumps(obj, default=None, non_str_keys: bool = False) -> bytes:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS if non_str_keys else None)
+
+    def fragment(encoded: bytes):
+        """Already-encoded JSON, embedded as-is wherever it appears in a value passed to dumps()."""
+        return orjson.Fragment(encoded)
+except ImportError:  # pragma: no cover - orjson is in requirements.txt, stdlib json is the fallback
+    def dumps(obj, default=None, non_str_keys: bool = False) -> bytes:
+        return json.dumps(obj, default=default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def fragment(encoded: bytes):
+        return json.loads(encoded)
+
+
+def _fallback(obj):
+    # Whatever orjson has no native encoding for (Pydantic models, sets, ...) goes through FastAPI's encoder
+    return jsonable_encoder(obj)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with dumps(); also embeds fragment() values."""
+
+    def render(self, content) -> bytes:
+        try:
+            return dumps(content, default=_fallback)
+        except TypeError:  # non-string dict keys: written as strings, like json.dumps does
+            return dumps(content, default=_fallback, non_str_keys=True)
+
+
+def _direct(endpoint, status_code: int):
+    """Wrap an endpoint so that a plain return value leaves as a FastJSONResponse, skipping jsonable_encoder."""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def call(*args, **kwargs):
+            out = await endpoint(*args, **kwargs)
+            return out if isinstance(out, Response) else FastJSONResponse(out, status_code=status_code)
+    else:
+        @functools.wraps(endpoint)
+        def call(*args, **kwargs):
+            out = endpoint(*args, **kwargs)
+            return out if isinstance(out, Response) else FastJSONResponse(out, status_code=status_code)
+    return call
+
+
+def _takes_response(endpoint) -> bool:
+    # Headers and cookies set on an injected `response: Response` are only merged on FastAPI's own path
+    annotations = getattr(endpoint, "__annotations__", {})
+    return any(isinstance(a, type) and issubclass(a, Response) for k, a in annotations.items() if k != "return")
+
+
+class FastJSONRoute(APIRoute):
+    """APIRoute whose endpoint results are encoded straight to JSON bytes.
+
+    FastAPI runs every return value through jsonable_encoder (a recursive pure-Python copy) before the response
+    class encodes it; for plain dicts and lists that copy costs far more than the encoding. Routes with a
+    response_model (declared or from a return annotation), a custom response_class, an injected Response
+    parameter, or a generator endpoint keep FastAPI's handling.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        plain = (
+            isinstance(kwargs.get("response_model"), DefaultPlaceholder) and "return" not in getattr(endpoint, "__annotations__", {})
+            and isinstance(kwargs.get("response_class"), DefaultPlaceholder)
+            and not _takes_response(endpoint)
+            and not inspect.isgeneratorfunction(endpoint) and not inspect.isasyncgenfunction(endpoint)
+        )
+        if plain:
+            endpoint = _direct(endpoint, kwargs.get("status_code") or 200)
+        super().__init__(path, endpoint, **kwargs)
+
+
+async def _http_exception(request, exc: HTTPException) -> Response:
+    # fastapi.exception_handlers.http_exception_handler, encoded with dumps()
+    headers = getattr(exc, "headers", None)
+    if not is_body_allowed_for_status_code(exc.status_code):
+        return Response(status_code=exc.status_code, headers=headers)
+    return FastJSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=headers)
+
+
+def install_fast_json(app) -> None:
+    """Encode the app's responses with dumps(). Call right after creating the app: it applies to routes added later."""
+    if not FAST_JSON_ENABLED:
+        return
+    app.router.default_response_class = Default(FastJSONResponse)
+    app.router.route_class = FastJSONRoute
+    app.add_exception_handler(HTTPException, _http_exception)
@@ -0,0 +1,185 @@
+import os, time, threading
+from collections import OrderedDict
+import numpy as np
+
+# Per-customer history: the last FRAUD_HISTORY_SIZE transactions in fixed-size ring buffers, for at most
+# FRAUD_MAX_CUSTOMERS customers (least recently seen customer is evicted). The buffers start with room for
+# FRAUD_INITIAL_CUSTOMERS and double as customers arrive. Per-bank amount history feeds a population baseline
+# for customers without much history of their own.
+FRAUD_HISTORY_SIZE = int(os.getenv("FRAUD_HISTORY_SIZE", "32"))
+FRAUD_MAX_CUSTOMERS = int(os.getenv("FRAUD_MAX_CUSTOMERS", "100000"))
+FRAUD_INITIAL_CUSTOMERS = int(os.getenv("FRAUD_INITIAL_CUSTOMERS", "1024"))
+FRAUD_BANK_HISTORY_SIZE = int(os.getenv("FRAUD_BANK_HISTORY_SIZE", "1024"))
+FRAUD_VELOCITY_WINDOW_SECONDS = float(os.getenv("FRAUD_VELOCITY_WINDOW_SECONDS", "600"))
+FRAUD_SCORE_THRESHOLD = float(os.getenv("FRAUD_SCORE_THRESHOLD", "0.5"))
+
+# Exact repeats are caught before scoring by dedup.DuplicateDetector
+FEATURES = ("velocity", "amount_z", "bank_amount_z", "distinct_banks", "new_bank")
+# Logistic model over FEATURES; contributions are also used to pick the reason for a rejection
+WEIGHTS = np.array([0.35, 0.9, 0.6, 0.5, 0.4], dtype=np.float32)
+BIAS = np.float32(-3.0)
+VELOCITY_FREE = 3            # transactions in the velocity window before velocity counts against a customer
+MIN_HISTORY = 3              # samples needed before a customer's or bank's amount z-score is trusted
+Z_CAP = 6.0
+REASONS = ("suspicious transaction", "transaction above limit", "transaction above limit",
+           "suspicious transaction", "suspicious transaction")
+
+
+def _cumcount(keys: np.ndarray) -> np.ndarray:
+    """For each element, how many earlier elements share its key: [7, 3, 7, 7] -> [0, 0, 1, 2]."""
+    n = len(keys)
+    if n < 2:
+        return np.zeros(n, dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    new_run = np.empty(n, dtype=bool)
+    new_run[0] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=new_run[1:])
+    idx = np.arange(n)
+    run_start = np.maximum.accumulate(np.where(new_run, idx, 0))
+    out = np.empty(n, dtype=np.int64)
+    out[order] = idx - run_start
+    return out
+
+
+class FraudScorer:
+    """Vectorized fraud scoring over rolling per-customer and per-bank features.
+
+    All state lives in NumPy arrays: customer i owns row i of the (customers, history) ring buffers for
+    timestamps, amounts and bank indexes, which grow by doubling up to `max_customers` rows. score_batch() scores n transactions with array ops
+    against the state as it was before the batch (plus earlier transactions of the same batch for velocity),
+    then appends them to the ring buffers. Thread-safe.
+    """
+
+    def __init__(self, bank_ids, max_customers: int = FRAUD_MAX_CUSTOMERS, history: int = FRAUD_HISTORY_SIZE,
+                 bank_history: int = FRAUD_BANK_HISTORY_SIZE, velocity_window: float = FRAUD_VELOCITY_WINDOW_SECONDS,
+                 threshold: float = FRAUD_SCORE_THRESHOLD, initial_customers: int = FRAUD_INITIAL_CUSTOMERS):
+        self.bank_index = {b: i for i, b in enumerate(bank_ids)}
+        n_banks = len(self.bank_index) + 1  # last row: banks we don't know
+        self.history = history
+        self.velocity_window = velocity_window
+        self.threshold = threshold
+        self._epoch = time.time()
+        self._lock = threading.Lock()
+
+        rows = max(1, min(max_customers, initial_customers))
+        self.ts = np.zeros((rows, history), dtype=np.float32)        # seconds since _epoch (float32: ~10 ms resolution for days)
+        self.amount = np.zeros((rows, history), dtype=np.float32)
+        self.bank = np.zeros((rows, history), dtype=np.int16)
+        self.count = np.zeros(rows, dtype=np.int64)                  # transactions ever written
+        self.bank_amount = np.zeros((n_banks, bank_history), dtype=np.float32)
+        self.bank_count = np.zeros(n_banks, dtype=np.int64)
+
+        self._slots = OrderedDict()   # customer_id -> row, least recently seen first
+        self._max_customers = max_customers
+
+    @property
+    def customers(self) -> int:
+        return len(self._slots)
+
+    def state_bytes(self) -> int:
+        return sum(a.nbytes for a in (self.ts, self.amount, self.bank, self.count, self.bank_amount, self.bank_count))
+
+    def _grow(self) -> None:
+        rows = min(self._max_customers, 2 * len(self.count))
+        for name in ("ts", "amount", "bank", "count"):
+            old = getattr(self, name)
+            new = np.zeros((rows, *old.shape[1:]), dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _slot(self, customer_id: str) -> int:
+        slot = self._slots.get(customer_id)
+        if slot is not None:
+            self._slots.move_to_end(customer_id)
+            return slot
+        if len(self._slots) < self._max_customers:
+            slot = len(self._slots)
+            if slot == len(self.count):
+                self._grow()
+        else:
+            _, slot = self._slots.popitem(last=False)
+            self.count[slot] = 0
+        self._slots[customer_id] = slot
+        return slot
+
+    def _bank_stats(self, banks: np.ndarray):
+        """Amount mean, std and sample count of each bank's history, for the given bank indexes."""
+        if len(banks) > 1:
+            banks, inv = np.unique(banks, return_inverse=True)
+        else:
+            inv = slice(None)
+        hist = self.bank_amount[banks]
+        filled = np.minimum(self.bank_count[banks], hist.shape[1])
+        valid = np.arange(hist.shape[1]) < filled[:, None]
+        n = np.maximum(filled, 1)
+        mean = np.where(valid, hist, 0).sum(1) / n
+        std = np.sqrt(np.where(valid, (hist - mean[:, None]) ** 2, 0).sum(1) / n)
+        return mean[inv], std[inv], filled[inv]
+
+    def features(self, slots: np.ndarray, banks: np.ndarray, amounts: np.ndarray, now: float,
+                 prior_in_batch: np.ndarray) -> np.ndarray:
+        """(n, len(FEATURES)) feature matrix; callers hold the lock."""
+        h = self.history
+        ts, amt, bk = self.ts[slots], self.amount[slots], self.bank[slots]           # (n, h)
+        filled = np.minimum(self.count[slots], h)
+        valid = np.arange(h) < filled[:, None]
+
+        recent = valid & (ts > now - self.velocity_window)
+        velocity = recent.sum(1) + prior_in_batch
+
+        n_hist = np.maximum(filled, 1)
+        mean = np.where(valid, amt, 0).sum(1) / n_hist
+        std = np.sqrt(np.where(valid, (amt - mean[:, None]) ** 2, 0).sum(1) / n_hist)
+        amount_z = np.where(filled >= MIN_HISTORY, (amounts - mean) / (std + 0.05 * mean + 1.0), 0)
+
+        b_mean, b_std, b_filled = self._bank_stats(banks)
+        bank_amount_z = np.where(b_filled >= MIN_HISTORY, (amounts - b_mean) / (b_std + 1.0), 0)
+
+        # Distinct banks among recent transactions: sort each row, count value changes (-1 marks empty cells)
+        rb = np.sort(np.where(recent, bk, -1), axis=1)
+        distinct = (rb[:, :1] >= 0).sum(1) + ((rb[:, 1:] != rb[:, :-1]) & (rb[:, 1:] >= 0)).sum(1)
+        same_bank = valid & (bk == banks[:, None])
+        new_bank = (filled > 0) & ~same_bank.any(1)
+
+        return np.stack([
+            np.maximum(velocity - VELOCITY_FREE, 0),
+            np.clip(amount_z, 0, Z_CAP),
+            np.clip(bank_amount_z, 0, Z_CAP),
+            np.maximum(distinct - 1, 0),
+            new_bank,
+        ], axis=1).astype(np.float32)
+
+    def _record(self, slots: np.ndarray, banks: np.ndarray, amounts: np.ndarray, now: float,
+                prior_in_batch: np.ndarray) -> None:
+        h = self.history
+        pos = (self.count[slots] + prior_in_batch) % h
+        self.ts[slots, pos] = now
+        self.amount[slots, pos] = amounts
+        self.bank[slots, pos] = banks
+        np.add.at(self.count, slots, 1)
+
+        bh = self.bank_amount.shape[1]
+        bpos = (self.bank_count[banks] + _cumcount(banks)) % bh
+        self.bank_amount[banks, bpos] = amounts
+        np.add.at(self.bank_count, banks, 1)
+
+    def score_batch(self, customer_ids, bank_ids, amounts, now: float = None):
+        """Score and record n transactions. Returns (scores, fraudulent, reasons) as arrays of length n."""
+        unknown = len(self.bank_index)
+        banks = np.fromiter((self.bank_index.get(b, unknown) for b in bank_ids), dtype=np.int64, count=len(bank_ids))
+        amounts = np.asarray(amounts, dtype=np.float32)
+        now = (time.time() if now is None else now) - self._epoch
+        with self._lock:
+            slots = np.fromiter((self._slot(c) for c in customer_ids), dtype=np.int64, count=len(customer_ids))
+            prior = _cumcount(slots)
+            x = self.features(slots, banks, amounts, now, prior)
+            self._record(slots, banks, amounts, now, prior)
+        contrib = x * WEIGHTS
+        scores = 1.0 / (1.0 + np.exp(-(contrib.sum(1) + BIAS)))
+        reasons = np.take(np.array(REASONS), contrib.argmax(1))
+        return scores, scores >= self.threshold, reasons
+
+    def score(self, customer_id: str, bank_id: str, amount: float, now: float = None):
+        scores, fraudulent, reasons = self.score_batch([customer_id], [bank_id], [amount], now)
+        return float(scores[0]), bool(fraudulent[0]), str(reasons[0])
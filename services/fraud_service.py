@@ -1,22 +1,41 @@
-import os, random, logging, requests
+import os, random, logging, threading
+from typing import List
 from fastapi import FastAPI
 from pydantic import BaseModel
-from datadog import DogStatsd
 from ddtrace import tracer
-from .obs import init_observability, current_dd_ids, base_fields
+from .obs import init_observability, current_dd_ids, base_fields, timed, keep_trace, install_trace_sampling
+from .metrics import make_statsd, preintern, tags
+from .banks import BANK_IDS
+from .http_client import Upstream, install_deadline
+from .admission import install_admission
+from .fastjson import install_fast_json
+from .dedup import DuplicateDetector, DEDUP_ENABLED, DUPLICATE
+from .aggregates import RollingAggregates, install_stats
 
-init_observability()
+init_observability(integrations=("fastapi", "requests"))
 LOG = logging.getLogger("fraud_service")
 
 DD_SERVICE = os.getenv("DD_SERVICE","fraud-service")
-statsd = DogStatsd(host=os.getenv("DD_AGENT_HOST","127.0.0.1"), port=int(os.getenv("DD_DOGSTATSD_PORT","8125")),
-                   constant_tags=[f"service:{DD_SERVICE}", f"env:{os.getenv('DD_ENV','dev')}", f"version:{os.getenv('DD_VERSION','0.1.0')}"])
+statsd = make_statsd(DD_SERVICE)
 
 JIRA_POLLER_URL = os.getenv("JIRA_POLLER_URL","http://jira-poller:8000")
+JIRA_POLLER = Upstream("jira-poller", JIRA_POLLER_URL, timeout=10, statsd=statsd)
+# "random" confirms FRAUD_CONFIRM_RATE of checks; "model" scores with the rolling-feature engine in fraud_scoring
+FRAUD_SCORING = os.getenv("FRAUD_SCORING","random").strip().lower()
 FRAUD_CONFIRM_RATE = float(os.getenv("FRAUD_CONFIRM_RATE","0.35"))
 FRAUD_REASONS = ["incorrect credit card","incorrect PIN number","transaction above limit","duplicate transaction","suspicious transaction"]
+DUPLICATE_REASON = "duplicate transaction"
+preintern(("bank", BANK_IDS))
+preintern(("fraud_reason", FRAUD_REASONS), ("bank", BANK_IDS))
+
+SCORER = None
+_SCORER_LOCK = threading.Lock()
+DEDUP = DuplicateDetector()
+# Last STATS_WINDOW_SECONDS of verdicts, rejection reasons and amounts per bank, served by GET /stats
+STATS = RollingAggregates(BANK_IDS)
 
 app = FastAPI(title="Fraud Service", version=os.getenv("DD_VERSION","0.1.0"))
+install_fast_json(app)
 
 class Req(BaseModel):
     trace_id: str
@@ -24,24 +43,104 @@ class Req(BaseModel):
     customer_id: str
     bank_id: str
     amount: float
-    issue_key: str
+    issue_key: str = ""
+
+class BatchReq(BaseModel):
+    items: List[Req]
+
+def _is_duplicate(item: Req) -> bool:
+    if not DEDUP_ENABLED:
+        return False
+    verdict = DEDUP.check(item.customer_id, item.bank_id, item.amount)
+    if verdict != "new":
+        statsd.increment("fraud.dedup", tags=tags("verdict", verdict, "bank", item.bank_id))
+    return verdict == DUPLICATE
+
+def _scorer():
+    # Built on first use: fraud_scoring pulls in NumPy, which is not needed to start serving (or for FRAUD_SCORING=random)
+    global SCORER
+    if SCORER is None:
+        with _SCORER_LOCK:
+            if SCORER is None:
+                from .fraud_scoring import FraudScorer
+                SCORER = FraudScorer(BANK_IDS)
+    return SCORER
+
+def _score(items: List[Req]) -> list:
+    """(score, fraudulent, reason, duplicate) per item. Duplicates are rejected up front and never reach the scorer;
+    reason is None for approved items."""
+    with timed(statsd, "fraud.stage.duration", "dedup"):
+        dup = [_is_duplicate(i) for i in items]
+    rest = [i for i, d in zip(items, dup) if not d]
+    if not rest:
+        scored = []
+    elif FRAUD_SCORING == "random":
+        scored = []
+        for _ in rest:
+            fraudulent = random.random() < FRAUD_CONFIRM_RATE
+            scored.append((None, fraudulent, random.choice(FRAUD_REASONS) if fraudulent else None))
+    else:
+        with timed(statsd, "fraud.stage.duration", "score"):
+            scores, fraudulent, reasons = _scorer().score_batch([i.customer_id for i in rest], [i.bank_id for i in rest], [i.amount for i in rest])
+        scored = [(s, f, r if f else None) for s, f, r in zip(scores.tolist(), fraudulent.tolist(), reasons.tolist())]
+    it = iter(scored)
+    return [(None, True, DUPLICATE_REASON, True) if d else (*next(it), False) for d in dup]
 
 @app.post("/check")
 def check(req: Req):
-    with tracer.trace("fraud.check", service=DD_SERVICE, resource="POST /check"):
-        fraudulent = random.random() < FRAUD_CONFIRM_RATE
-        reason = random.choice(FRAUD_REASONS)
+    with tracer.trace("fraud.check", service=DD_SERVICE, resource="POST /check") as span:
+        (score, fraudulent, reason, duplicate), = _score([req])
+        STATS.record(req.bank_id, "rejected" if fraudulent else "approved", req.amount, reason)
+        if score is not None:
+            span.set_metric("fraud.score", score)
         if fraudulent:
-            statsd.increment("fraud.check.rejected", tags=[f"fraud_reason:{reason}", f"bank:{req.bank_id}"])
+            statsd.increment("fraud.check.rejected", tags=tags("fraud_reason", reason, "bank", req.bank_id))
+            keep_trace("fraud_rejected")
             comment = "Confirmed fraudulent activity. Please escalate to Product Team"
             LOG.warning("fraud_rejected", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "payment_id": req.payment_id, "customer_id": req.customer_id, "bank_id": req.bank_id, "amount": req.amount, "status":"fraud_rejected", "reason": reason})
         else:
-            statsd.increment("fraud.check.approved", tags=[f"bank:{req.bank_id}"])
+            statsd.increment("fraud.check.approved", tags=tags("bank", req.bank_id))
             comment = "Transaction not fraudulent, please complete it"
             LOG.info("fraud_approved", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "payment_id": req.payment_id, "customer_id": req.customer_id, "bank_id": req.bank_id, "amount": req.amount, "status":"fraud_approved"})
 
-        try:
-            requests.post(f"{JIRA_POLLER_URL.rstrip('/')}/jira/comment", json={"issue_key": req.issue_key, "comment": comment}, timeout=10).raise_for_status()
-        except Exception as e:
-            LOG.error("jira_comment_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status":"jira_comment_error", "reason": str(e)})
-        return {"fraudulent": fraudulent, "reason": reason, "comment": comment}
+        if duplicate:
+            # Obvious repeat of a recent payment: answer without the Jira round trip
+            return {"fraudulent": True, "reason": reason, "comment": None, "score": None}
+
+        with timed(statsd, "fraud.stage.duration", "jira_comment", bank=req.bank_id) as t:
+            try:
+                r = JIRA_POLLER.post("/jira/comment", json={"issue_key": req.issue_key, "payment_id": req.payment_id, "comment": comment}, fallback=lambda: None)
+                if r is None:
+                    t.outcome = "skipped"
+                else:
+                    r.raise_for_status()
+            except Exception as e:
+                t.outcome = "error"
+                LOG.error("jira_comment_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status":"jira_comment_error", "reason": str(e)})
+        return {"fraudulent": fraudulent, "reason": reason, "comment": comment, "score": score}
+
+@app.post("/check/batch")
+def check_batch(req: BatchReq):
+    # Drops duplicates, then scores and records the rest in one vectorized pass; no Jira comments (those stay with /check)
+    with tracer.trace("fraud.check_batch", service=DD_SERVICE, resource="POST /check/batch") as span:
+        span.set_metric("fraud.batch_size", len(req.items))
+        statsd.distribution("fraud.check.batch_size", len(req.items))
+        results = _score(req.items)
+        out = []
+        for item, (score, fraudulent, reason, _) in zip(req.items, results):
+            STATS.record(item.bank_id, "rejected" if fraudulent else "approved", item.amount, reason)
+            if fraudulent:
+                statsd.increment("fraud.check.rejected", tags=tags("fraud_reason", reason, "bank", item.bank_id))
+            else:
+                statsd.increment("fraud.check.approved", tags=tags("bank", item.bank_id))
+            out.append({"payment_id": item.payment_id, "fraudulent": fraudulent, "reason": reason, "score": score})
+        rejected = sum(r["fraudulent"] for r in out)
+        if rejected:
+            keep_trace("fraud_rejected")
+        LOG.info("fraud_batch_scored", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status": "fraud_batch_scored", "batch_size": len(out), "rejected": rejected})
+        return {"results": out}
+
+install_stats(app, STATS)
+install_admission(app, statsd)
+install_deadline(app)
+install_trace_sampling(app, statsd)
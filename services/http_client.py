@@ -0,0 +1,396 @@
+import os, time, asyncio, logging, functools, threading, contextvars, requests
+from requests.adapters import HTTPAdapter
+from ddtrace import tracer
+from ddtrace.propagation.http import HTTPPropagator
+from .metrics import tags
+from .obs import TRACE_KEEP_HEADER, keep_trace
+from .fastjson import dumps
+
+LOG = logging.getLogger("http_client")
+
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+
+# Circuit breaker per upstream: opens when at least CIRCUIT_MIN_CALLS calls in the last CIRCUIT_WINDOW_SECONDS
+# have a failure rate >= CIRCUIT_FAILURE_RATE; after CIRCUIT_OPEN_SECONDS it lets CIRCUIT_HALF_OPEN_CALLS probes through.
+CIRCUIT_ENABLED = os.getenv("CIRCUIT_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "20"))
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "30"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "15"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "3"))
+
+# Remaining time budget of the inbound request, passed to every hop so inner calls never outlive the caller.
+DEADLINE_HEADER = "X-Deadline-Remaining-Ms"
+# Budget given to requests that arrive without the header (0 = none); web-frontend sets it as the edge.
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "0"))
+_deadline = contextvars.ContextVar("request_deadline", default=None)  # time.monotonic() value
+
+# In-process dispatch (services/monolith.py): upstream name -> ASGI app serving it in this process
+_LOCAL_APPS = {}
+
+
+class UpstreamUnavailable(requests.RequestException):
+    """The call was not attempted: the upstream's circuit is open or the request deadline has passed."""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    pass
+
+
+def remaining() -> float:
+    """Seconds left before the current request's deadline, or None when it has none."""
+    d = _deadline.get()
+    return None if d is None else d - time.monotonic()
+
+
+def _pool_size(name: str, default: int) -> int:
+    # e.g. HTTP_POOL_MAXSIZE_PAYMENT_SERVICE=64 overrides the pool for the "payment-service" upstream
+    return int(os.getenv("HTTP_POOL_MAXSIZE_" + name.upper().replace("-", "_"), str(default)))
+
+
+def server_error(r) -> bool:
+    """Default breaker classifier: any 5xx response counts as a failure of the upstream."""
+    return r.status_code >= 500
+
+
+def inject_trace_headers(headers: dict) -> dict:
+    span = tracer.current_span()
+    if span is not None:
+        HTTPPropagator.inject(span.context, headers)
+    return headers
+
+
+def serve_locally(name: str, app) -> None:
+    """Route every Upstream called `name` to `app` in this process instead of over HTTP."""
+    _LOCAL_APPS[name] = app
+
+
+class _IsolatedApp:
+    """Runs each request in a fresh contextvars context, like a separate process would (no caller span or deadline)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await asyncio.create_task(self.app(scope, receive, send), context=contextvars.Context())
+
+
+class DeadlineMiddleware:
+    """ASGI middleware: turns the inbound deadline header (or `default_ms`) into a contextvar for Upstream."""
+
+    def __init__(self, app, default_ms: float = REQUEST_DEADLINE_MS):
+        self.app = app
+        self.default_ms = default_ms
+        self._header = DEADLINE_HEADER.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        budget_ms = self.default_ms
+        for k, v in scope["headers"]:
+            if k == self._header:
+                try:
+                    budget_ms = float(v)
+                except ValueError:
+                    pass
+                break
+        token = _deadline.set(time.monotonic() + budget_ms / 1000 if budget_ms > 0 else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+def install_deadline(app, default_ms: float = REQUEST_DEADLINE_MS) -> None:
+    app.add_middleware(DeadlineMiddleware, default_ms=default_ms)
+
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a rolling time window of call outcomes (thread-safe)."""
+
+    BUCKETS = 10
+
+    def __init__(self, name: str, failure_rate: float = CIRCUIT_FAILURE_RATE, min_calls: int = CIRCUIT_MIN_CALLS,
+                 window: float = CIRCUIT_WINDOW_SECONDS, open_seconds: float = CIRCUIT_OPEN_SECONDS,
+                 half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS, statsd=None, clock=time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._width = window / self.BUCKETS
+        self._buckets = {}  # bucket index -> [calls, failures]
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_ok = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._statsd = statsd
+        self._tags = tags("upstream", name)
+
+    def _window_counts(self, now: float) -> tuple:
+        oldest = int(now / self._width) - self.BUCKETS + 1
+        calls = failures = 0
+        for idx in list(self._buckets):
+            if idx < oldest:
+                del self._buckets[idx]
+            else:
+                calls += self._buckets[idx][0]
+                failures += self._buckets[idx][1]
+        return calls, failures
+
+    def _transition(self, state: str, reason: str) -> None:
+        prev, self.state = self.state, state
+        if state == OPEN:
+            self._opened_at = self._clock()
+        if state in (OPEN, HALF_OPEN):
+            self._probes = self._probe_ok = 0
+        if state == CLOSED:
+            self._buckets.clear()
+        if self._statsd is not None:
+            self._statsd.increment("http.client.circuit.transition", tags=tags("upstream", self.name, "from", prev, "to", state))
+            self._statsd.gauge("http.client.circuit.state", _STATE_VALUE[state], tags=self._tags)
+        log = LOG.warning if state == OPEN else LOG.info
+        log("circuit_state_change", extra={"upstream": self.name, "status": f"circuit_{state}", "reason": reason, "from_state": prev})
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN:
+                if self._clock() - self._opened_at < self.open_seconds:
+                    rejected = True
+                else:
+                    self._transition(HALF_OPEN, "open_timeout_elapsed")
+                    rejected = False
+            else:
+                rejected = False
+            if not rejected and self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    rejected = True
+                else:
+                    self._probes += 1
+        if rejected and self._statsd is not None:
+            self._statsd.increment("http.client.circuit.rejected", tags=self._tags)
+        return not rejected
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if not ok:
+                    self._transition(OPEN, "probe_failed")
+                else:
+                    self._probe_ok += 1
+                    if self._probe_ok >= self.half_open_calls:
+                        self._transition(CLOSED, "probes_succeeded")
+                return
+            if self.state == OPEN:
+                return  # a call admitted before the breaker opened
+            now = self._clock()
+            bucket = self._buckets.setdefault(int(now / self._width), [0, 0])
+            bucket[0] += 1
+            if not ok:
+                bucket[1] += 1
+                calls, failures = self._window_counts(now)
+                if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                    self._transition(OPEN, f"{failures}/{calls} calls failed")
+
+
+class Upstream:
+    """Keep-alive connection pool to one upstream service, with a sync (requests) and async (httpx) face.
+
+    At most `pool_maxsize` calls are in flight per process; further callers wait for a free connection.
+    Calls go through a circuit breaker (transport errors, timeouts and responses for which `is_failure(r)` is
+    true count as failures; by default any 5xx) and are capped by
+    the inbound request's remaining deadline, which is forwarded in DEADLINE_HEADER. When a call is
+    not attempted, UpstreamUnavailable is raised, or `fallback()` is returned if the caller passed one.
+
+    When the upstream is served in this process (serve_locally), calls go straight to its ASGI app with the
+    same headers, breaker and deadline; sync callers must be running in the event loop's threadpool.
+    """
+
+    def __init__(self, name: str, base_url: str, timeout: float = 10, pool_maxsize: int = None, statsd=None, headers: dict = None,
+                 breaker: CircuitBreaker = None, is_failure=server_error):
+        self.name = name
+        self.base_url = (base_url or "").rstrip("/")
+        self.timeout = timeout
+        self.pool_maxsize = _pool_size(name, pool_maxsize or HTTP_POOL_MAXSIZE)
+        self.headers = dict(headers or {})
+        self._statsd = statsd
+        self._tags = tags("upstream", name)
+        self.breaker = breaker or (CircuitBreaker(name, statsd=statsd) if CIRCUIT_ENABLED else None)
+        self.is_failure = is_failure
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize, pool_block=True)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._slots = threading.BoundedSemaphore(self.pool_maxsize)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._async_client = None
+        self._local_client = None
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _prepare(self, kw: dict, body: str) -> dict:
+        headers = inject_trace_headers({**self.headers, **(kw.get("headers") or {})})
+        if "json" in kw:
+            # Encoded here rather than by requests / httpx (stdlib json); `body` is their raw-bytes argument
+            kw[body] = dumps(kw.pop("json"))
+            if not any(k.lower() == "content-type" for k in headers):
+                headers["Content-Type"] = "application/json"
+        timeout = kw.get("timeout", self.timeout)
+        left = remaining()
+        if left is not None:
+            if left <= 0:
+                raise DeadlineExceeded(f"{self.name}: request deadline already passed")
+            timeout = min(timeout, left)
+            headers[DEADLINE_HEADER] = str(int(left * 1000))
+        kw["headers"] = headers
+        kw["timeout"] = timeout
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpen(f"{self.name}: circuit open")
+        return kw
+
+    def _unavailable(self, e: UpstreamUnavailable, fallback):
+        if self._statsd is not None:
+            self._statsd.increment("http.client.short_circuited", tags=tags("upstream", self.name, "reason", type(e).__name__))
+        if fallback is None:
+            raise e
+        return fallback()
+
+    def _record(self, ok: bool) -> None:
+        if self.breaker is not None:
+            self.breaker.record(ok)
+
+
+    @staticmethod
+    def _honour_keep(r) -> None:
+        # The upstream force-kept its part of the trace (error, rejection, fraud branch): keep ours too
+        reason = r.headers.get(TRACE_KEEP_HEADER)
+        if reason:
+            keep_trace(reason)
+
+    def _enter(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+            in_flight = self._in_flight
+        if self._statsd is not None:
+            self._statsd.gauge("http.client.in_flight", in_flight, tags=self._tags)
+            self._statsd.gauge("http.client.pool.utilisation", in_flight / self.pool_maxsize, tags=self._tags)
+
+    def _exit(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(blocking=False):
+            if self._statsd is not None:
+                self._statsd.increment("http.client.pool.saturated", tags=self._tags)
+            self._slots.acquire()
+        self._enter()
+
+    def _release(self) -> None:
+        self._exit()
+        self._slots.release()
+
+    # -- sync ---------------------------------------------------------------
+
+    def request(self, method: str, path: str, fallback=None, **kw) -> requests.Response:
+        if self.name in _LOCAL_APPS:
+            import anyio.from_thread
+            return anyio.from_thread.run(functools.partial(self.arequest, method, path, fallback=fallback, **kw))
+        try:
+            kw = self._prepare(kw, "data")
+        except UpstreamUnavailable as e:
+            return self._unavailable(e, fallback)
+        self._acquire()
+        ok = False
+        try:
+            r = self._session.request(method, self.url(path), **kw)
+            ok = not self.is_failure(r)
+        finally:
+            self._release()
+            self._record(ok)
+        self._honour_keep(r)
+        return r
+
+    def get(self, path: str, **kw) -> requests.Response:
+        return self.request("GET", path, **kw)
+
+    def post(self, path: str, **kw) -> requests.Response:
+        return self.request("POST", path, **kw)
+
+    # -- async --------------------------------------------------------------
+
+    def _aclient(self):
+        if self._async_client is None:
+            import httpx  # only pulled in by services that use the async path
+            self._async_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.pool_maxsize,
+                    max_keepalive_connections=self.pool_maxsize,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+                ),
+                timeout=self.timeout,
+            )
+        return self._async_client
+
+    def _local(self, app):
+        if self._local_client is None:
+            import httpx
+            # App errors come back as 500s, as they would over the network
+            transport = httpx.ASGITransport(app=_IsolatedApp(app), raise_app_exceptions=False)
+            self._local_client = httpx.AsyncClient(transport=transport, base_url=f"http://{self.name}")
+        return self._local_client
+
+    async def arequest(self, method: str, path: str, fallback=None, **kw):
+        try:
+            kw = self._prepare(kw, "content")
+        except UpstreamUnavailable as e:
+            return self._unavailable(e, fallback)
+        app = _LOCAL_APPS.get(self.name)
+        self._enter()
+        ok = False
+        try:
+            if app is None:
+                r = await self._aclient().request(method, self.url(path), **kw)  # httpx enforces max_connections itself
+            else:
+                # ASGITransport has no timeouts of its own
+                r = await asyncio.wait_for(self._local(app).request(method, "/" + path.lstrip("/"), **kw), kw["timeout"])
+            ok = not self.is_failure(r)
+        finally:
+            self._exit()
+            # Errors, timeouts and cancellation (CancelledError is not an Exception) all count as failures, so a
+            # half-open probe always reports back and its slot cannot leak
+            self._record(ok)
+        self._honour_keep(r)
+        return r
+
+    async def aget(self, path: str, **kw):
+        return await self.arequest("GET", path, **kw)
+
+    async def apost(self, path: str, **kw):
+        return await self.arequest("POST", path, **kw)
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._local_client is not None:
+            await self._local_client.aclose()
+            self._local_client = None
+
+    def close(self) -> None:
+        self._session.close()
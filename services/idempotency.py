@@ -0,0 +1,98 @@
+import os
+from fastapi import HTTPException
+from .lru import TTLCache
+from .singleflight import SingleFlight, AsyncSingleFlight
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "100000"))
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "value", "error")
+
+    def __init__(self, fingerprint, value=None, error: HTTPException = None):
+        self.fingerprint = fingerprint
+        self.value = value
+        self.error = error
+
+
+class IdempotencyCache:
+    """Runs a request handler at most once per Idempotency-Key.
+
+    Completed results live in a bounded TTL cache; concurrent duplicates wait for the in-flight execution
+    instead of starting their own. `fingerprint` identifies the request body: reusing a key for a different
+    request is a 422. Returned values are cached when `cacheable(value)` is true; HTTPExceptions only when
+    their status is in `cache_statuses` (definitive business outcomes, not transient upstream failures).
+    """
+
+    def __init__(self, statsd=None, metric_prefix: str = "idempotency", max_entries: int = IDEMPOTENCY_MAX_ENTRIES,
+                 ttl: float = IDEMPOTENCY_TTL_SECONDS, cacheable=None, cache_statuses=()):
+        self._done = TTLCache(max_entries, ttl)
+        self._flight = SingleFlight()
+        self._aflight = AsyncSingleFlight()
+        self._statsd = statsd
+        self._prefix = metric_prefix
+        self._cacheable = cacheable or (lambda value: True)
+        self._cache_statuses = frozenset(cache_statuses)
+
+    def _count(self, name: str) -> None:
+        if self._statsd is not None:
+            self._statsd.increment(f"{self._prefix}.{name}")
+
+    def _store(self, key, entry: _Entry) -> None:
+        if entry.error is None and not self._cacheable(entry.value):
+            return
+        if entry.error is not None and entry.error.status_code not in self._cache_statuses:
+            return
+        if self._done.set(key, entry):
+            self._count("evicted")
+
+    def _replay(self, entry: _Entry, fingerprint, outcome: str):
+        self._count(outcome)
+        if entry.fingerprint != fingerprint:
+            self._count("conflict")
+            raise HTTPException(status_code=422, detail={"error": "idempotency_key_reused", "reason": "key was used for a different request"})
+        replayed = outcome != "miss"
+        if entry.error is not None:
+            e = entry.error
+            headers = {**(e.headers or {}), REPLAYED_HEADER: "true"} if replayed else e.headers
+            raise HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+        return entry.value, replayed
+
+    def run(self, key, fingerprint, fn):
+        """Sync handlers: returns (value, replayed) or raises the (possibly replayed) HTTPException."""
+        entry = self._done.get(key)
+        if entry is not None:
+            return self._replay(entry, fingerprint, "hit")
+
+        def execute():
+            done = self._done.get(key)  # finished between the lookup above and becoming leader
+            if done is not None:
+                return done, True
+            try:
+                entry = _Entry(fingerprint, value=fn())
+            except HTTPException as e:
+                entry = _Entry(fingerprint, error=e)
+            self._store(key, entry)
+            return entry, False
+
+        (entry, cached), shared = self._flight.do(key, execute)
+        return self._replay(entry, fingerprint, "hit" if cached else "joined" if shared else "miss")
+
+    async def arun(self, key, fingerprint, fn):
+        """Async handlers: `fn` is a zero-argument coroutine function."""
+        entry = self._done.get(key)
+        if entry is not None:
+            return self._replay(entry, fingerprint, "hit")
+
+        async def execute():
+            try:
+                entry = _Entry(fingerprint, value=await fn())
+            except HTTPException as e:
+                entry = _Entry(fingerprint, error=e)
+            self._store(key, entry)
+            return entry
+
+        entry, shared = await self._aflight.do(key, execute)
+        return self._replay(entry, fingerprint, "joined" if shared else "miss")
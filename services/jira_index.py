@@ -0,0 +1,82 @@
+import os, json, time, threading
+from typing import Optional
+
+DONE_CATEGORY = "done"
+
+
+class FraudIssueIndex:
+    """Local index of open suspected-fraud issues keyed by issue key, plus the incremental poll cursor.
+
+    State is persisted as one JSON file (written atomically) so a restarted poller resumes from its
+    cursor instead of re-downloading every issue.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.cursor: Optional[float] = None  # epoch seconds of the last successful poll start
+        self.last_full_sync: float = 0.0
+        self._issues = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.cursor = state.get("cursor")
+        self.last_full_sync = state.get("last_full_sync", 0.0)
+        self._issues = state.get("issues") or {}
+
+    def save(self) -> None:
+        with self._lock:
+            state = {"cursor": self.cursor, "last_full_sync": self.last_full_sync, "issues": self._issues}
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.path)
+
+    def apply(self, issue: dict) -> None:
+        """Upsert one issue from a Jira search result; issues in the Done category leave the index."""
+        key = issue.get("key")
+        if not key:
+            return
+        fields = issue.get("fields") or {}
+        status = fields.get("status") or {}
+        category = ((status.get("statusCategory") or {}).get("key") or "").lower()
+        with self._lock:
+            if category == DONE_CATEGORY:
+                self._issues.pop(key, None)
+            else:
+                self._issues[key] = {
+                    "summary": fields.get("summary", ""),
+                    "status": status.get("name", ""),
+                    "created": fields.get("created", ""),
+                    "updated": fields.get("updated", ""),
+                }
+
+    def add_created(self, key: str, summary: str) -> None:
+        if not key:
+            return
+        now = time.strftime("%Y-%m-%dT%H:%M:%S.000+0000", time.gmtime())
+        with self._lock:
+            self._issues.setdefault(key, {"summary": summary, "status": "To Do", "created": now, "updated": now})
+
+    def replace_all(self, issues: list) -> None:
+        with self._lock:
+            self._issues = {}
+        for issue in issues:
+            self.apply(issue)
+
+    def open_count(self) -> int:
+        return len(self._issues)
+
+    def snapshot(self, limit: int = None) -> list:
+        with self._lock:
+            items = [{"key": k, **v} for k, v in self._issues.items()]
+        items.sort(key=lambda i: i["updated"], reverse=True)
+        return items[:limit] if limit else items
@@ -2,23 +2,23 @@ import os, time, threading, logging, requests
 from requests.auth import HTTPBasicAuth
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from datadog import DogStatsd
 from ddtrace import tracer
-from .obs import init_observability, current_dd_ids, base_fields
-
-init_observability()
+from .obs import init_observability, current_dd_ids, base_fields, timed, keep_trace, install_trace_sampling
+from .metrics import make_statsd, tags
+from .http_client import Upstream, install_deadline
+from .admission import install_admission
+from .fastjson import dumps, fragment, install_fast_json
+from .outbox import Outbox
+from .batching import Batcher, RetryAfter
+from .jira_index import FraudIssueIndex
+from .lru import TTLCache
+
+# No sqlite3: the outbox and index polling loops would each start a trace per query
+init_observability(integrations=("fastapi", "requests"))
 LOG = logging.getLogger("jira_poller")
 
 DD_SERVICE = os.getenv("DD_SERVICE", "jira-poller")
-statsd = DogStatsd(
-    host=os.getenv("DD_AGENT_HOST", "127.0.0.1"),
-    port=int(os.getenv("DD_DOGSTATSD_PORT", "8125")),
-    constant_tags=[
-        f"service:{DD_SERVICE}",
-        f"env:{os.getenv('DD_ENV', 'dev')}",
-        f"version:{os.getenv('DD_VERSION', '0.1.0')}",
-    ],
-)
+statsd = make_statsd(DD_SERVICE)
 
 JIRA_BASE_URL = os.getenv("JIRA_BASE_URL", "").strip()
 JIRA_EMAIL = os.getenv("JIRA_EMAIL", "").strip()
@@ -26,11 +26,31 @@ JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN", "").strip()
 JIRA_PROJECT_KEY = os.getenv("JIRA_PROJECT_KEY", "PER").strip()
 JIRA_ISSUE_TYPE = os.getenv("JIRA_ISSUE_TYPE", "Task").strip()
 POLL_INTERVAL = int(os.getenv("JIRA_POLL_INTERVAL_SECONDS", "1800"))
+POLL_PAGE_SIZE = int(os.getenv("JIRA_POLL_PAGE_SIZE", "100"))
+POLL_FIELDS = "summary,status,created,updated"
+# Periodically rebuild the index from scratch to drop issues deleted (rather than closed) in Jira
+POLL_FULL_RESYNC_SECONDS = int(os.getenv("JIRA_POLL_FULL_RESYNC_SECONDS", "86400"))
+POLL_STATE_PATH = os.getenv("JIRA_POLL_STATE_PATH", "/tmp/jira-poll-state.json")
+
+JIRA = Upstream("jira", JIRA_BASE_URL, timeout=15, statsd=statsd)
+
+# Jira side effects are queued in a durable local outbox and delivered in the background
+OUTBOX_ENABLED = os.getenv("JIRA_OUTBOX_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+OUTBOX_PATH = os.getenv("JIRA_OUTBOX_PATH", "/tmp/jira-outbox.db")
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("JIRA_OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_WORKERS = int(os.getenv("JIRA_OUTBOX_WORKERS", "16"))
+
+# Coalesce issue creation into POST /rest/api/3/issue/bulk calls (Jira Cloud takes up to 50 per call)
+BULK_ENABLED = os.getenv("JIRA_BULK_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+BULK_MAX_SIZE = int(os.getenv("JIRA_BULK_MAX_SIZE", "50"))
+BULK_MAX_WAIT_MS = float(os.getenv("JIRA_BULK_MAX_WAIT_MS", "200"))
 
 # Optional: allow disabling poller thread in some environments/tests
 POLL_ENABLED = os.getenv("JIRA_POLL_ENABLED", "true").lower() in ("1", "true", "yes", "y")
 
 app = FastAPI(title="Jira Poller", version=os.getenv("DD_VERSION", "0.1.0"))
+install_fast_json(app)
+INDEX = FraudIssueIndex(POLL_STATE_PATH)
 
 
 class CreateReq(BaseModel):
@@ -43,8 +63,10 @@ class CreateReq(BaseModel):
 
 
 class CommentReq(BaseModel):
-    issue_key: str
     comment: str
+    issue_key: str = ""
+    # Lets callers comment on the issue for a payment before its key is known (outbox mode)
+    payment_id: str = ""
 
 
 def _auth() -> HTTPBasicAuth:
@@ -71,6 +93,214 @@ def _headers() -> dict:
     return {"Accept": "application/json", "Content-Type": "application/json"}
 
 
+# Constant parts of the Jira payloads, encoded once; dumps() embeds fragments as they are
+_PROJECT = fragment(dumps({"key": JIRA_PROJECT_KEY}))
+_ISSUE_TYPE = fragment(dumps({"name": JIRA_ISSUE_TYPE}))
+# Atlassian Document Format (ADF) document of one paragraph per line of text
+_ADF_HEAD, _ADF_TAIL = b'{"type":"doc","version":1,"content":[', b"]}"
+_PARAGRAPH_HEAD, _PARAGRAPH_TAIL = b'{"type":"paragraph","content":[{"type":"text","text":', b"}]}"
+
+
+def _adf(*lines: str):
+    return fragment(_ADF_HEAD + b",".join(_PARAGRAPH_HEAD + dumps(line) + _PARAGRAPH_TAIL for line in lines) + _ADF_TAIL)
+
+
+def _issue_fields(req: CreateReq) -> dict:
+    return {
+        "project": _PROJECT,
+        "summary": f"Suspected Fraud {req.trace_id}",
+        "issuetype": _ISSUE_TYPE,
+        # ADF for Cloud description
+        "description": _adf(
+            f"Trace ID: {req.trace_id}",
+            f"Payment ID: {req.payment_id}",
+            f"Customer ID: {req.customer_id}",
+            f"Bank: {req.bank_id}",
+            f"Amount: {req.amount}",
+            f"Reason: {req.reason}",
+        ),
+    }
+
+
+def _log_create_failed(r) -> None:
+    # If Jira returns a helpful JSON error, surface it in logs
+    try:
+        jira_err = r.json()
+    except Exception:
+        jira_err = {"text": r.text}
+    LOG.error(
+        "jira_create_failed",
+        extra={
+            **base_fields(DD_SERVICE),
+            **current_dd_ids(),
+            "status": "jira_create_failed",
+            "reason": f"HTTP {r.status_code}",
+            "jira_error": jira_err,
+        },
+    )
+
+
+def _retry_after(r) -> float:
+    try:
+        return max(0.0, float(r.headers.get("Retry-After", "")))
+    except ValueError:
+        return 5.0
+
+
+@timed(statsd, "jira.stage.duration", "bulk_create")
+def _bulk_create(fields: list) -> list:
+    """One bulk-create call for a batch; returns an issue key (or an exception) per element, in order."""
+    with tracer.trace("jira.bulk_create", service=DD_SERVICE, resource="POST /rest/api/3/issue/bulk") as span:
+        span.set_tag("jira.batch_size", len(fields))
+        r = JIRA.post("/rest/api/3/issue/bulk", auth=_auth(), headers=_headers(), json={"issueUpdates": [{"fields": f} for f in fields]})
+        if r.status_code == 429:
+            raise RetryAfter(_retry_after(r))
+        body = {}
+        if r.status_code in (200, 201, 400):
+            try:
+                body = r.json() or {}
+            except ValueError:
+                pass
+        # 400 with per-element errors means every element was rejected; anything else fails the batch
+        if not r.ok and not body.get("errors"):
+            _log_create_failed(r)
+            r.raise_for_status()
+
+        failed = {e.get("failedElementNumber"): e for e in body.get("errors") or []}
+        created = iter(body.get("issues") or [])
+        results = []
+        for i in range(len(fields)):
+            if i in failed:
+                results.append(requests.HTTPError(f"Jira rejected issue: {failed[i].get('elementErrors')}"))
+            else:
+                # Fewer issues than accepted elements: fail the slot so the outbox retries it, rather than store ""
+                key = (next(created, None) or {}).get("key")
+                results.append(key or RuntimeError("bulk create returned no key"))
+        span.set_tag("jira.batch_failed", sum(isinstance(x, Exception) for x in results))
+        return results
+
+
+CREATE_BATCHER = Batcher(
+    _bulk_create,
+    max_size=BULK_MAX_SIZE,
+    max_wait=BULK_MAX_WAIT_MS / 1000,
+    statsd=statsd,
+    metric_prefix="jira.bulk",
+    name="jira-bulk-create",
+) if BULK_ENABLED else None
+
+
+# Bulk-create futures by payment id. A create that timed out waiting is still queued or in flight in the batcher;
+# the outbox's retry waits on that same future instead of submitting a second copy (a duplicate issue).
+_BULK_PENDING = TTLCache(100_000, 3600)
+_BULK_PENDING_LOCK = threading.Lock()
+BULK_RESULT_TIMEOUT_SECONDS = 120
+
+
+def _bulk_create_one(req: CreateReq) -> str:
+    with _BULK_PENDING_LOCK:
+        fut = _BULK_PENDING.get(req.payment_id)
+        if fut is None or (fut.done() and fut.exception() is not None):
+            fut = CREATE_BATCHER.submit(_issue_fields(req))
+            _BULK_PENDING.set(req.payment_id, fut)
+    try:
+        return fut.result(timeout=BULK_RESULT_TIMEOUT_SECONDS)
+    finally:
+        if fut.done():
+            with _BULK_PENDING_LOCK:
+                if _BULK_PENDING.get(req.payment_id) is fut:
+                    _BULK_PENDING.pop(req.payment_id)
+
+
+@timed(statsd, "jira.stage.duration", "create_issue")
+def _create_issue(req: CreateReq) -> str:
+    """Create the Jira issue; raises requests.HTTPError (after logging Jira's error body) on failure."""
+    if CREATE_BATCHER is not None:
+        issue_key = _bulk_create_one(req)
+    else:
+        r = JIRA.post("/rest/api/3/issue", auth=_auth(), headers=_headers(), json={"fields": _issue_fields(req)})
+        if not r.ok:
+            _log_create_failed(r)
+            r.raise_for_status()
+        issue_key = (r.json() or {}).get("key", "")
+
+    INDEX.add_created(issue_key, f"Suspected Fraud {req.trace_id}")
+    statsd.increment("jira.create.ok")
+    LOG.info(
+        "jira_create_ok",
+        extra={
+            **base_fields(DD_SERVICE),
+            **current_dd_ids(),
+            "status": "jira_create_ok",
+            "customer_id": req.customer_id,
+            "payment_id": req.payment_id,
+            "bank_id": req.bank_id,
+            "issue_key": issue_key,
+        },
+    )
+    return issue_key
+
+
+@timed(statsd, "jira.stage.duration", "add_comment")
+def _add_comment(issue_key: str, text: str) -> None:
+    r = JIRA.post(f"/rest/api/3/issue/{issue_key}/comment", auth=_auth(), headers=_headers(), json={"body": _adf(text)})
+    if not r.ok:
+        try:
+            jira_err = r.json()
+        except Exception:
+            jira_err = {"text": r.text}
+        LOG.error(
+            "jira_comment_failed",
+            extra={
+                **base_fields(DD_SERVICE),
+                **current_dd_ids(),
+                "status": "jira_comment_failed",
+                "reason": f"HTTP {r.status_code}",
+                "jira_error": jira_err,
+                "issue_key": issue_key,
+            },
+        )
+        r.raise_for_status()
+
+    statsd.increment("jira.comment.ok")
+    LOG.info(
+        "jira_comment_ok",
+        extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status": "jira_comment_ok", "issue_key": issue_key},
+    )
+
+
+def _deliver_create(payload: dict, key: str) -> dict:
+    # Outbox deliveries start their own traces; every one of them is suspected-fraud work
+    keep_trace("suspected_fraud")
+    return {"issue_key": _create_issue(CreateReq(**payload))}
+
+
+def _deliver_comment(payload: dict, key: str) -> dict:
+    keep_trace("suspected_fraud")
+    # Comments queued by payment_id pick up the key of the issue created for that payment
+    issue_key = payload.get("issue_key") or (OUTBOX.result(key, "create_issue") or {}).get("issue_key", "")
+    if not issue_key:
+        raise RuntimeError(f"No Jira issue known for {key}")
+    _add_comment(issue_key, payload["comment"])
+    return {"issue_key": issue_key}
+
+
+def _needs_created_issue(dead_kind: str, kind: str, payload: dict) -> bool:
+    # A comment queued by payment_id has no issue to go on once that payment's create is dead-lettered
+    return dead_kind == "create_issue" and kind == "comment" and not payload.get("issue_key")
+
+
+OUTBOX = Outbox(
+    OUTBOX_PATH,
+    {"create_issue": _deliver_create, "comment": _deliver_comment},
+    statsd=statsd,
+    metric_prefix="jira.outbox",
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+    workers=OUTBOX_WORKERS,
+    dependent=_needs_created_issue,
+) if OUTBOX_ENABLED else None
+
+
 @app.post("/jira/create_suspected_fraud")
 def create(req: CreateReq):
     with tracer.trace(
@@ -79,76 +309,26 @@ def create(req: CreateReq):
         try:
             _require_jira_config()
         except Exception as e:
-            statsd.increment("jira.create.error", tags=["reason:missing_config"])
+            statsd.increment("jira.create.error", tags=tags("reason", "missing_config"))
             LOG.error(
                 "jira_create_error_missing_config",
                 extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status": "jira_create_error", "reason": str(e)},
             )
             raise HTTPException(status_code=500, detail=str(e))
 
-        summary = f"Suspected Fraud {req.trace_id}"
-        payload = {
-            "fields": {
-                "project": {"key": JIRA_PROJECT_KEY},
-                "summary": summary,
-                "issuetype": {"name": JIRA_ISSUE_TYPE},
-                # Atlassian Document Format (ADF) for Cloud description
-                "description": {
-                    "type": "doc",
-                    "version": 1,
-                    "content": [
-                        {"type": "paragraph", "content": [{"type": "text", "text": f"Trace ID: {req.trace_id}"}]},
-                        {"type": "paragraph", "content": [{"type": "text", "text": f"Payment ID: {req.payment_id}"}]},
-                        {"type": "paragraph", "content": [{"type": "text", "text": f"Customer ID: {req.customer_id}"}]},
-                        {"type": "paragraph", "content": [{"type": "text", "text": f"Bank: {req.bank_id}"}]},
-                        {"type": "paragraph", "content": [{"type": "text", "text": f"Amount: {req.amount}"}]},
-                        {"type": "paragraph", "content": [{"type": "text", "text": f"Reason: {req.reason}"}]},
-                    ],
-                },
-            }
-        }
+        if OUTBOX_ENABLED:
+            with timed(statsd, "jira.stage.duration", "outbox_enqueue", kind="create_issue"):
+                outbox_id = OUTBOX.enqueue("create_issue", req.payment_id, req.model_dump())
+            return {"issue_key": "", "queued": True, "outbox_id": outbox_id}
 
-        url = f"{JIRA_BASE_URL.rstrip('/')}/rest/api/3/issue"
         try:
-            r = requests.post(url, auth=_auth(), headers=_headers(), json=payload, timeout=15)
-            # If Jira returns a helpful JSON error, surface it in logs
-            if not r.ok:
-                try:
-                    jira_err = r.json()
-                except Exception:
-                    jira_err = {"text": r.text}
-                LOG.error(
-                    "jira_create_failed",
-                    extra={
-                        **base_fields(DD_SERVICE),
-                        **current_dd_ids(),
-                        "status": "jira_create_failed",
-                        "reason": f"HTTP {r.status_code}",
-                        "jira_error": jira_err,
-                    },
-                )
-                r.raise_for_status()
-
-            issue_key = (r.json() or {}).get("key", "")
-            statsd.increment("jira.create.ok")
-            LOG.info(
-                "jira_create_ok",
-                extra={
-                    **base_fields(DD_SERVICE),
-                    **current_dd_ids(),
-                    "status": "jira_create_ok",
-                    "customer_id": req.customer_id,
-                    "payment_id": req.payment_id,
-                    "bank_id": req.bank_id,
-                },
-            )
-            return {"issue_key": issue_key}
+            return {"issue_key": _create_issue(req)}
         except requests.HTTPError as e:
-            statsd.increment("jira.create.error", tags=["reason:http_error"])
+            statsd.increment("jira.create.error", tags=tags("reason", "http_error"))
             LOG.exception("jira_create_http_error")
             raise HTTPException(status_code=502, detail=str(e))
         except Exception as e:
-            statsd.increment("jira.create.error", tags=["reason:exception"])
+            statsd.increment("jira.create.error", tags=tags("reason", "exception"))
             LOG.exception("jira_create_error")
             raise HTTPException(status_code=502, detail=str(e))
 
@@ -159,58 +339,95 @@ def comment(req: CommentReq):
         try:
             _require_jira_config()
         except Exception as e:
-            statsd.increment("jira.comment.error", tags=["reason:missing_config"])
+            statsd.increment("jira.comment.error", tags=tags("reason", "missing_config"))
             LOG.error(
                 "jira_comment_error_missing_config",
                 extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status": "jira_comment_error", "reason": str(e)},
             )
             raise HTTPException(status_code=500, detail=str(e))
 
-        payload = {
-            "body": {
-                "type": "doc",
-                "version": 1,
-                "content": [{"type": "paragraph", "content": [{"type": "text", "text": req.comment}]}],
-            }
-        }
+        if not (req.issue_key or req.payment_id):
+            raise HTTPException(status_code=400, detail="issue_key or payment_id is required")
 
-        url = f"{JIRA_BASE_URL.rstrip('/')}/rest/api/3/issue/{req.issue_key}/comment"
-        try:
-            r = requests.post(url, auth=_auth(), headers=_headers(), json=payload, timeout=15)
-            if not r.ok:
-                try:
-                    jira_err = r.json()
-                except Exception:
-                    jira_err = {"text": r.text}
-                LOG.error(
-                    "jira_comment_failed",
-                    extra={
-                        **base_fields(DD_SERVICE),
-                        **current_dd_ids(),
-                        "status": "jira_comment_failed",
-                        "reason": f"HTTP {r.status_code}",
-                        "jira_error": jira_err,
-                        "issue_key": req.issue_key,
-                    },
-                )
-                r.raise_for_status()
+        if OUTBOX_ENABLED:
+            with timed(statsd, "jira.stage.duration", "outbox_enqueue", kind="comment"):
+                outbox_id = OUTBOX.enqueue("comment", req.payment_id or req.issue_key, req.model_dump())
+            return {"ok": True, "queued": True, "outbox_id": outbox_id}
 
-            statsd.increment("jira.comment.ok")
-            LOG.info(
-                "jira_comment_ok",
-                extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status": "jira_comment_ok", "issue_key": req.issue_key},
-            )
+        if not req.issue_key:
+            raise HTTPException(status_code=400, detail="issue_key is required when the outbox is disabled")
+        try:
+            _add_comment(req.issue_key, req.comment)
             return {"ok": True}
         except requests.HTTPError as e:
-            statsd.increment("jira.comment.error", tags=["reason:http_error"])
+            statsd.increment("jira.comment.error", tags=tags("reason", "http_error"))
             LOG.exception("jira_comment_http_error")
             raise HTTPException(status_code=502, detail=str(e))
         except Exception as e:
-            statsd.increment("jira.comment.error", tags=["reason:exception"])
+            statsd.increment("jira.comment.error", tags=tags("reason", "exception"))
             LOG.exception("jira_comment_error")
             raise HTTPException(status_code=502, detail=str(e))
 
 
+def _search_pages(jql: str):
+    """Yield issues matching `jql`, page by page, asking Jira only for the fields the index keeps."""
+    start = 0
+    while True:
+        with timed(statsd, "jira.stage.duration", "search_page"):
+            r = JIRA.get(
+                "/rest/api/3/search",
+                auth=_auth(),
+                headers={"Accept": "application/json"},
+                params={"jql": jql, "startAt": start, "maxResults": POLL_PAGE_SIZE, "fields": POLL_FIELDS},
+            )
+        if not r.ok:
+            try:
+                jira_err = r.json()
+            except Exception:
+                jira_err = {"text": r.text}
+            LOG.error(
+                "jira_poll_failed",
+                extra={
+                    **base_fields(DD_SERVICE),
+                    **current_dd_ids(),
+                    "status": "jira_poll_failed",
+                    "reason": f"HTTP {r.status_code}",
+                    "jira_error": jira_err,
+                },
+            )
+            r.raise_for_status()
+
+        body = r.json() or {}
+        issues = body.get("issues", []) or []
+        statsd.increment("jira.poll.pages")
+        yield from issues
+        start += len(issues)
+        if not issues or start >= body.get("total", 0):
+            return
+
+
+@timed(statsd, "jira.stage.duration", "poll")
+def _poll_once() -> int:
+    """One incremental poll: fetch issues updated since the cursor (or all open ones on a full sync)."""
+    started = time.time()
+    base = f'project = "{JIRA_PROJECT_KEY}" AND summary ~ "Suspected Fraud"'
+    full = INDEX.cursor is None or started - INDEX.last_full_sync > POLL_FULL_RESYNC_SECONDS
+    if full:
+        issues = list(_search_pages(f"{base} AND statusCategory != Done ORDER BY updated ASC"))
+        INDEX.replace_all(issues)
+        INDEX.last_full_sync = started
+    else:
+        # Relative JQL dates avoid Jira user-timezone issues; one extra minute covers minute granularity
+        minutes = int((started - INDEX.cursor) // 60) + 2
+        issues = list(_search_pages(f"{base} AND updated >= -{minutes}m ORDER BY updated ASC"))
+        for issue in issues:
+            INDEX.apply(issue)
+    INDEX.cursor = started
+    INDEX.save()
+    statsd.increment("jira.poll.changed", len(issues), tags=tags("mode", "full" if full else "incremental"))
+    return len(issues)
+
+
 def poll_loop():
     # Do not crash the app if Jira isn't configured; just disable polling.
     try:
@@ -222,42 +439,15 @@ def poll_loop():
         )
         return
 
-    url = f"{JIRA_BASE_URL.rstrip('/')}/rest/api/3/search"
-    jql = f'project = "{JIRA_PROJECT_KEY}" AND summary ~ "Suspected Fraud" ORDER BY created DESC'
-
     while True:
         try:
             with tracer.trace("jira.poll", service=DD_SERVICE, resource="jira.search"):
-                r = requests.get(
-                    url,
-                    auth=_auth(),
-                    headers={"Accept": "application/json"},
-                    params={"jql": jql, "maxResults": 5},
-                    timeout=15,
-                )
-                if not r.ok:
-                    try:
-                        jira_err = r.json()
-                    except Exception:
-                        jira_err = {"text": r.text}
-                    LOG.error(
-                        "jira_poll_failed",
-                        extra={
-                            **base_fields(DD_SERVICE),
-                            **current_dd_ids(),
-                            "status": "jira_poll_failed",
-                            "reason": f"HTTP {r.status_code}",
-                            "jira_error": jira_err,
-                        },
-                    )
-                    r.raise_for_status()
-
-                issues = (r.json() or {}).get("issues", []) or []
-                statsd.gauge("jira.suspected_fraud.open", len(issues))
+                changed = _poll_once()
+                statsd.gauge("jira.suspected_fraud.open", INDEX.open_count())
                 statsd.increment("jira.poll.success")
                 LOG.info(
                     "jira_poll_ok",
-                    extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status": "jira_poll_ok", "count": len(issues)},
+                    extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status": "jira_poll_ok", "count": changed, "open": INDEX.open_count()},
                 )
         except Exception as e:
             statsd.increment("jira.poll.error")
@@ -268,8 +458,20 @@ def poll_loop():
         time.sleep(POLL_INTERVAL)
 
 
+@app.get("/jira/open")
+def open_issues(limit: int = 100):
+    """Open suspected-fraud issues, served from the local index (no Jira call)."""
+    return {
+        "count": INDEX.open_count(),
+        "cursor": INDEX.cursor,
+        "issues": INDEX.snapshot(limit),
+    }
+
+
 @app.on_event("startup")
 def startup():
+    if OUTBOX_ENABLED:
+        OUTBOX.start()
     if POLL_ENABLED:
         threading.Thread(target=poll_loop, daemon=True).start()
     else:
@@ -277,3 +479,7 @@ def startup():
             "poll_disabled",
             extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status": "poll_disabled", "reason": "JIRA_POLL_ENABLED=false"},
         )
+
+install_admission(app, statsd)
+install_deadline(app)
+install_trace_sampling(app, statsd)
@@ -0,0 +1,286 @@
+import os, mmap, time, uuid, zlib, fcntl, queue, struct, asyncio, logging, threading
+from concurrent.futures import Future
+from typing import Optional
+
+LOG = logging.getLogger("ledger")
+
+LEDGER_ENABLED = os.getenv("LEDGER_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+LEDGER_PATH = os.getenv("LEDGER_PATH", "/tmp/payment-ledger.bin")
+# false: records are written but not fsynced (page cache only); for tmpfs or benchmarks
+LEDGER_FSYNC = os.getenv("LEDGER_FSYNC", "true").lower() in ("1", "true", "yes", "y")
+# Most records written (and fsynced) at once by the writer thread
+LEDGER_MAX_BATCH = int(os.getenv("LEDGER_MAX_BATCH", "1024"))
+# Longest a request waits for its records to become durable before giving up (a stalled disk or writer)
+LEDGER_SYNC_TIMEOUT_SECONDS = float(os.getenv("LEDGER_SYNC_TIMEOUT_SECONDS", "5"))
+
+CREATED, SETTLED, FAILED = "created", "settled", "failed"
+_STATES = (CREATED, SETTLED, FAILED)
+_STATE_CODE = {s: i for i, s in enumerate(_STATES)}
+
+_MAGIC = b"PAYLDG01"
+# length, crc32 of everything after the crc, ts, amount, payment_id (uuid bytes), state, then the byte lengths of
+# customer_id, bank_id and reason, which follow the header as utf-8
+_HEAD = struct.Struct("<IIdd16sBBBB")
+
+
+def encode(payment_id: bytes, state: str, customer_id: str, bank_id: str, amount: float, reason: str = "", ts: float = None) -> bytes:
+    cust, bank, why = (s.encode("utf-8")[:255] for s in (customer_id, bank_id, reason or ""))
+    body = _HEAD.pack(0, 0, time.time() if ts is None else ts, amount, payment_id, _STATE_CODE[state],
+                      len(cust), len(bank), len(why))[8:] + cust + bank + why
+    return struct.pack("<II", 8 + len(body), zlib.crc32(body)) + body
+
+
+def decode(buf, offset: int) -> tuple:
+    """(record dict, length) of the record at `offset`; raises ValueError for a torn or corrupt record."""
+    if offset + _HEAD.size > len(buf):
+        raise ValueError("truncated header")
+    length, crc, ts, amount, pid, state, n_cust, n_bank, n_why = _HEAD.unpack_from(buf, offset)
+    if length != _HEAD.size + n_cust + n_bank + n_why or offset + length > len(buf):
+        raise ValueError("bad length")
+    if zlib.crc32(buf[offset + 8:offset + length]) != crc or state >= len(_STATES):
+        raise ValueError("bad checksum")
+    p = offset + _HEAD.size
+    cust = bytes(buf[p:p + n_cust]).decode("utf-8", "replace")
+    bank = bytes(buf[p + n_cust:p + n_cust + n_bank]).decode("utf-8", "replace")
+    why = bytes(buf[p + n_cust + n_bank:offset + length]).decode("utf-8", "replace")
+    return {"payment_id": pid, "state": _STATES[state], "customer_id": cust, "bank_id": bank, "amount": amount,
+            "reason": why or None, "ts": ts}, length
+
+
+def payment_key(payment_id: str) -> Optional[bytes]:
+    try:
+        return uuid.UUID(payment_id).bytes
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+class Ledger:
+    """Append-only file of payment state transitions (created / settled / failed + reason).
+
+    append() packs a binary record and queues it; a writer thread writes everything queued with one write()
+    and one fdatasync (group commit), so concurrent requests share the cost of a disk flush. sync() /
+    async_sync() wait until everything appended so far is durable. Reads go through an mmap of the file and
+    two in-memory indexes (payment id -> record offsets, customer id -> payment ids), which only ever point at
+    durable records. On open the file is scanned to rebuild the indexes, and a torn tail from a crash is cut.
+
+    One process per file: a second process (another uvicorn worker) gets `<path>.<pid>` instead.
+    """
+
+    def __init__(self, path: str, statsd=None, metric_prefix: str = "ledger", fsync: bool = LEDGER_FSYNC,
+                 max_batch: int = LEDGER_MAX_BATCH):
+        self.fsync = fsync
+        self.max_batch = max(1, max_batch)
+        self._statsd = statsd
+        self._prefix = metric_prefix
+        self._by_payment = {}   # payment id bytes -> [offset, ...] in write order
+        self._by_customer = {}  # customer id -> [payment id bytes, ...] in creation order
+        self._lock = threading.Lock()
+        self._seq = 0           # records appended
+        self._durable = 0       # records written (and fsynced)
+        self._waiters = []      # (seq, Future) resolved once `seq` records are durable
+        self._q = queue.Queue()
+        self._map = None
+
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path, self._fd = self._open(path)
+        self._end = self._recover()
+        self._thread = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _open(path: str) -> tuple:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            path = f"{path}.{os.getpid()}"
+            LOG.warning("ledger_locked", extra={"status": "ledger_locked", "reason": f"another process owns the ledger, using {path}"})
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return path, fd
+
+    def _recover(self) -> int:
+        size = os.fstat(self._fd).st_size
+        if size == 0:
+            os.write(self._fd, _MAGIC)
+            os.fsync(self._fd)
+            return len(_MAGIC)
+        self._remap()
+        if self._map[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"{self.path} is not a payment ledger")
+        # decode() without building records: only what the indexes need
+        m, offset, unpack, crc32 = self._map, len(_MAGIC), _HEAD.unpack_from, zlib.crc32
+        while offset + _HEAD.size <= size:
+            length, crc, _, _, pid, state, n_cust, n_bank, n_why = unpack(m, offset)
+            end = offset + length
+            if length != _HEAD.size + n_cust + n_bank + n_why or end > size or crc32(m[offset + 8:end]) != crc \
+                    or state >= len(_STATES):
+                break
+            p = offset + _HEAD.size
+            self._index(pid, m[p:p + n_cust].decode("utf-8", "replace"), offset)
+            offset = end
+        if offset < size:
+            LOG.warning("ledger_truncated", extra={"status": "ledger_truncated", "reason": f"dropped {size - offset} bytes of torn tail"})
+            self._map = None
+            os.ftruncate(self._fd, offset)
+            os.fsync(self._fd)
+        return offset
+
+    def _index(self, pid: bytes, customer_id: str, offset: int) -> None:
+        offsets = self._by_payment.get(pid)
+        if offsets is None:
+            self._by_payment[pid] = [offset]
+            self._by_customer.setdefault(customer_id, []).append(pid)
+        else:
+            offsets.append(offset)
+
+    # -- writes -------------------------------------------------------------
+
+    def append(self, payment_id: str, state: str, customer_id: str, bank_id: str, amount: float, reason: str = "") -> int:
+        """Queue one transition; returns its sequence number (see sync)."""
+        pid = payment_key(payment_id)
+        if pid is None:
+            raise ValueError(f"payment id must be a UUID: {payment_id!r}")
+        rec = encode(pid, state, customer_id, bank_id, amount, reason)
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            # Enqueued under the lock so the writer sees records in sequence order
+            self._q.put((seq, rec, pid, customer_id))
+        return seq
+
+    def _barrier(self) -> Optional[Future]:
+        with self._lock:
+            if self._durable >= self._seq:
+                return None
+            fut = Future()
+            self._waiters.append((self._seq, fut))
+            return fut
+
+    def sync(self, timeout: float = None) -> None:
+        """Block until every record appended so far (by any thread) is durable.
+
+        Raises the writer's error if the write failed, or TimeoutError after `timeout` seconds.
+        """
+        fut = self._barrier()
+        if fut is not None:
+            fut.result(timeout)
+
+    async def async_sync(self, timeout: float = None) -> None:
+        fut = self._barrier()
+        if fut is not None:
+            # Shielded: a timeout must not cancel the Future the writer thread will resolve
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)), timeout)
+
+    def _run(self) -> None:
+        while True:
+            first = self._q.get()
+            if first is None:
+                return
+            batch = [first]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._q.put(None)  # finish this batch, then stop
+                    break
+                batch.append(item)
+            try:
+                self._commit(batch)
+            except Exception as e:
+                LOG.error("ledger_write_error", extra={"status": "ledger_write_error", "reason": str(e)})
+                try:
+                    os.ftruncate(self._fd, self._end)  # drop a partly written batch; its callers get the error
+                except OSError:
+                    pass
+                self._resolve(batch[-1][0], e)
+
+    def _commit(self, batch: list) -> None:
+        start = time.perf_counter()
+        data = memoryview(b"".join(b[1] for b in batch))
+        while data:
+            data = data[os.write(self._fd, data):]
+        if self.fsync:
+            os.fdatasync(self._fd)
+        offset = self._end
+        for _, rec, pid, customer_id in batch:
+            self._index(pid, customer_id, offset)
+            offset += len(rec)
+        self._end = offset
+        self._resolve(batch[-1][0])
+        if self._statsd is not None:
+            self._statsd.distribution(f"{self._prefix}.batch.size", len(batch))
+            self._statsd.distribution(f"{self._prefix}.commit.duration", (time.perf_counter() - start) * 1000)
+
+    def _resolve(self, seq: int, error: Exception = None) -> None:
+        with self._lock:
+            self._durable = seq
+            ready = [w for w in self._waiters if w[0] <= seq]
+            self._waiters = [w for w in self._waiters if w[0] > seq]
+        for _, fut in ready:
+            if error is None:
+                fut.set_result(None)
+            else:
+                fut.set_exception(error)
+
+    # -- reads --------------------------------------------------------------
+
+    def _remap(self) -> mmap.mmap:
+        with self._lock:
+            size = os.fstat(self._fd).st_size
+            if self._map is None or len(self._map) < size:
+                # Readers still holding the old map keep using it; it is unmapped once they drop it
+                self._map = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+            return self._map
+
+    def _read(self, offset: int) -> dict:
+        m = self._map
+        if m is None or offset + _HEAD.size > len(m) or offset + _HEAD.unpack_from(m, offset)[0] > len(m):
+            m = self._remap()
+        return decode(m, offset)[0]
+
+    def history(self, payment_id: str) -> list:
+        """Every recorded transition of a payment, oldest first."""
+        pid = payment_key(payment_id)
+        offsets = self._by_payment.get(pid) if pid is not None else None
+        return [self._read(o) for o in list(offsets or ())]
+
+    def get(self, payment_id: str) -> Optional[dict]:
+        """The payment's current state plus its full history, or None if it was never recorded."""
+        history = self.history(payment_id)
+        if not history:
+            return None
+        first, last = history[0], history[-1]
+        return {
+            "payment_id": str(uuid.UUID(bytes=first["payment_id"])), "customer_id": first["customer_id"], "bank_id": first["bank_id"], "amount": first["amount"],
+            "status": last["state"], "reason": last["reason"], "created_at": first["ts"], "updated_at": last["ts"],
+            "history": [{"status": h["state"], "reason": h["reason"], "ts": h["ts"]} for h in history],
+        }
+
+    def customer_payments(self, customer_id: str, limit: int = 50) -> list:
+        """The customer's payments, newest first, each in its current state."""
+        out = []
+        for pid in reversed(self._by_customer.get(customer_id, [])[-limit:] if limit > 0 else []):
+            offsets = self._by_payment[pid]
+            first, last = self._read(offsets[0]), self._read(offsets[-1])
+            out.append({"payment_id": str(uuid.UUID(bytes=pid)), "bank_id": first["bank_id"], "amount": first["amount"],
+                        "status": last["state"], "reason": last["reason"], "created_at": first["ts"], "updated_at": last["ts"]})
+        return out
+
+    def close(self) -> None:
+        """Write out what is queued, then stop the writer and close the file."""
+        self._q.put(None)
+        self._thread.join()
+        self._map = None
+        os.close(self._fd)
+
+    def __len__(self) -> int:
+        return len(self._by_payment)
+
+    def size_bytes(self) -> int:
+        return self._end
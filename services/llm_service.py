@@ -1,36 +1,60 @@
-import os, random, logging
+import os, re, time, random, asyncio, hashlib, logging
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from datadog import DogStatsd
 from ddtrace import tracer
-from .obs import init_observability, current_dd_ids, base_fields
-import os, random, logging
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from datadog import DogStatsd
-from ddtrace import tracer
-from .obs import init_observability, current_dd_ids, base_fields
-
-init_observability()
+from .obs import init_observability, current_dd_ids, base_fields, keep_trace, install_trace_sampling
+from .admission import install_admission
+from .fastjson import dumps, install_fast_json
+from .metrics import make_statsd, tags
+from .lru import TTLCache
+from .singleflight import AsyncSingleFlight
+from .batching import AsyncBatcher
+
+init_observability(integrations=("fastapi",))
 LOG = logging.getLogger("llm_service")
 
 DD_SERVICE = os.getenv("DD_SERVICE","llm-service")
-statsd = DogStatsd(host=os.getenv("DD_AGENT_HOST","127.0.0.1"), port=int(os.getenv("DD_DOGSTATSD_PORT","8125")),
-                   constant_tags=[f"service:{DD_SERVICE}", f"env:{os.getenv('DD_ENV','dev')}", f"version:{os.getenv('DD_VERSION','0.1.0')}"])
-
-# Datadog LLM Observability SDK (ddtrace>=2.11.0)
-from ddtrace.llmobs import LLMObs
-from ddtrace.llmobs.decorators import llm, workflow
-
-LLMObs.enable(service=DD_SERVICE)
+statsd = make_statsd(DD_SERVICE)
+
+_llmobs = None
+
+def llmobs():
+    """Datadog LLM Observability SDK (ddtrace>=2.11.0), imported and enabled on first use rather than at startup."""
+    global _llmobs
+    if _llmobs is None:
+        from ddtrace.llmobs import LLMObs
+        LLMObs.enable(service=DD_SERVICE)
+        _llmobs = LLMObs
+    return _llmobs
+
+MODEL_NAME = "local-rule-model"
+MODEL_PROVIDER = "local"
+# Successful generations are cached by sha256(model, prompt); errors never are
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED","true").lower() in ("1","true","yes","y")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES","10000"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS","600"))
+# Concurrent prompts share one forward pass of up to LLM_BATCH_MAX_SIZE prompts, waiting at most
+# LLM_BATCH_MAX_WAIT_MS for the batch to fill; LLM_BATCH_MAX_SIZE=1 runs prompts one at a time
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE","8"))
+LLM_BATCH_MAX_WAIT_MS = float(os.getenv("LLM_BATCH_MAX_WAIT_MS","10"))
+# Simulated model cost: LLM_PREFILL_MS per forward pass (+10% per extra prompt in the batch), then LLM_TOKEN_MS per output token
+LLM_PREFILL_MS = float(os.getenv("LLM_PREFILL_MS","40"))
+LLM_TOKEN_MS = float(os.getenv("LLM_TOKEN_MS","5"))
+# Forward passes the simulated model runs at once (an accelerator's worth of capacity)
+LLM_MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY","1"))
+
+CACHE = TTLCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS)
+FLIGHT = AsyncSingleFlight()
+MODEL_SLOTS = asyncio.Semaphore(LLM_MODEL_CONCURRENCY)
 
 app = FastAPI(title="LLM Service (Simulated)", version=os.getenv("DD_VERSION","0.1.0"))
+install_fast_json(app)
 
 class PromptReq(BaseModel):
     prompt: str
 
-@llm(model_name="local-rule-model", model_provider="local", name="generate_text")
-def _simulate_llm(prompt: str) -> str:
+def _rule_model(prompt: str) -> str:
     if random.random() < 0.08:
         raise RuntimeError("simulated_model_error")
     if "summarize" in prompt.lower():
@@ -39,59 +63,128 @@ def _simulate_llm(prompt: str) -> str:
         return "Label: neutral"
     return "Response: " + prompt[::-1][:220]
 
-@app.post("/llm/generate")
-def generate(req: PromptReq):
-    with workflow(name="llm_request"):
-        with tracer.trace("llm.endpoint", service=DD_SERVICE, resource="POST /llm/generate"):
+def _tokens(text: str) -> list:
+    # Word-level "tokens" that keep their trailing whitespace, so "".join(tokens) == text
+    return re.findall(r"\S+\s*|\s+", text)
+
+async def _simulate_llm_batch(prompts: list) -> list:
+    """One simulated forward pass for the whole batch; a failed prompt gets its exception in its slot."""
+    with tracer.trace("llm.batch", service=DD_SERVICE, resource="generate_text") as span:
+        span.set_metric("llm.batch_size", len(prompts))
+        async with MODEL_SLOTS:
+            await asyncio.sleep(LLM_PREFILL_MS / 1000 * (1 + 0.1 * (len(prompts) - 1)))
+        out = []
+        for prompt in prompts:
             try:
-                out = _simulate_llm(req.prompt)
-                statsd.increment("llm.request.ok")
-                LOG.info("llm_ok", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status":"llm_ok"})
-                return {"ok": True, "output": out}
+                out.append(_rule_model(prompt))
             except Exception as e:
-                statsd.increment("llm.request.error", tags=[f"error:{type(e).__name__}"])
-                LOG.error("llm_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status":"llm_error", "reason": str(e)})
-                raise HTTPException(status_code=502, detail={"error":"llm_error","reason":str(e)})
-
-
-init_observability()
-LOG = logging.getLogger("llm_service")
-
-DD_SERVICE = os.getenv("DD_SERVICE","llm-service")
-statsd = DogStatsd(host=os.getenv("DD_AGENT_HOST","127.0.0.1"), port=int(os.getenv("DD_DOGSTATSD_PORT","8125")),
-                   constant_tags=[f"service:{DD_SERVICE}", f"env:{os.getenv('DD_ENV','dev')}", f"version:{os.getenv('DD_VERSION','0.1.0')}"])
-
-# Datadog LLM Observability SDK (ddtrace>=2.11.0)
-from ddtrace.llmobs import LLMObs
-from ddtrace.llmobs.decorators import llm, workflow
-
-LLMObs.enable(service=DD_SERVICE)
+                out.append(e)
+        return out
 
-app = FastAPI(title="LLM Service (Simulated)", version=os.getenv("DD_VERSION","0.1.0"))
-
-class PromptReq(BaseModel):
-    prompt: str
+BATCHER = AsyncBatcher(_simulate_llm_batch, LLM_BATCH_MAX_SIZE, LLM_BATCH_MAX_WAIT_MS / 1000, statsd=statsd, metric_prefix="llm.batch")
 
-@llm(model_name="local-rule-model", model_provider="local", name="generate_text")
-def _simulate_llm(prompt: str) -> str:
-    if random.random() < 0.08:
-        raise RuntimeError("simulated_model_error")
-    if "summarize" in prompt.lower():
-        return "Summary: " + prompt[:160].strip()
-    if "classify" in prompt.lower():
-        return "Label: neutral"
-    return "Response: " + prompt[::-1][:220]
+async def _model_call(prompt: str) -> str:
+    # One generate_text LLM span per request, covering its queue wait and its share of the batch
+    with llmobs().llm(model_name=MODEL_NAME, model_provider=MODEL_PROVIDER, name="generate_text") as span:
+        try:
+            out, batch_size, queue_wait = await BATCHER.submit(prompt)
+        except Exception:
+            llmobs().annotate(span=span, input_data=prompt, tags={"cache": "miss"})
+            raise
+        llmobs().annotate(span=span, input_data=prompt, output_data=out, tags={"cache": "miss"},
+                        metadata={"batch_size": batch_size}, metrics={"queue_wait_ms": queue_wait * 1000})
+        return out
+
+def _served_from_cache(prompt: str, out: str, source: str) -> None:
+    # Same span name/model as a real call, so LLM Observability still shows one generate_text per request
+    with llmobs().llm(model_name=MODEL_NAME, model_provider=MODEL_PROVIDER, name="generate_text") as span:
+        llmobs().annotate(span=span, input_data=prompt, output_data=out, tags={"cache": source})
+
+def _cache_key(prompt: str) -> bytes:
+    return hashlib.sha256(MODEL_NAME.encode() + b"\0" + prompt.encode()).digest()
+
+async def _generate(prompt: str) -> tuple:
+    """(output, source): source is "hit", "miss" or "coalesced" (waited for an identical in-flight call)."""
+    if not LLM_CACHE_ENABLED:
+        return await _model_call(prompt), "miss"
+    key = _cache_key(prompt)
+    out = CACHE.get(key)
+    if out is not None:
+        _served_from_cache(prompt, out, "hit")
+        return out, "hit"
+
+    async def call():
+        cached = CACHE.get(key)  # finished between the lookup above and becoming leader
+        if cached is not None:
+            return cached, "hit"
+        out = await _model_call(prompt)
+        CACHE.set(key, out)
+        return out, "miss"
+
+    (out, source), shared = await FLIGHT.do(key, call)
+    if shared or source == "hit":
+        source = "coalesced" if shared else source
+        _served_from_cache(prompt, out, source)
+    return out, source
+
+def _decode_delay(source: str) -> float:
+    # Cached outputs are replayed without per-token cost
+    return 0.0 if source == "hit" else LLM_TOKEN_MS / 1000
+
+def _ok(span, endpoint: str, source: str, prompt: str, out: str, ttft_ms: float) -> None:
+    span.set_tag("llm.cache", source)
+    span.set_metric("llm.time_to_first_token_ms", ttft_ms)
+    llmobs().annotate(input_data=prompt, output_data=out, metrics={"time_to_first_token_ms": ttft_ms}, tags={"cache": source})
+    statsd.distribution("llm.time_to_first_token", ttft_ms, tags=tags("endpoint", endpoint, "cache", source))
+    statsd.increment("llm.cache.requests", tags=tags("result", source))
+    statsd.increment("llm.request.ok")
+    LOG.info("llm_ok", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status":"llm_ok", "cache": source, "ttft_ms": round(ttft_ms, 1)})
+
+def _error(e: Exception) -> dict:
+    statsd.increment("llm.request.error", tags=tags("error", type(e).__name__))
+    keep_trace("error")  # streamed errors arrive after a 200, so the middleware can't see them
+    LOG.error("llm_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status":"llm_error", "reason": str(e)})
+    return {"error":"llm_error","reason":str(e)}
 
 @app.post("/llm/generate")
-@workflow(name="llm_request")
-def generate(req: PromptReq):
-    with tracer.trace("llm.endpoint", service=DD_SERVICE, resource="POST /llm/generate"):
+async def generate(req: PromptReq):
+    t0 = time.perf_counter()
+    with llmobs().workflow(name="llm_request"), tracer.trace("llm.endpoint", service=DD_SERVICE, resource="POST /llm/generate") as span:
         try:
-            out = _simulate_llm(req.prompt)
-            statsd.increment("llm.request.ok")
-            LOG.info("llm_ok", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status":"llm_ok"})
-            return {"ok": True, "output": out}
+            out, source = await _generate(req.prompt)
         except Exception as e:
-            statsd.increment("llm.request.error", tags=[f"error:{type(e).__name__}"])
-            LOG.error("llm_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status":"llm_error", "reason": str(e)})
-            raise HTTPException(status_code=502, detail={"error":"llm_error","reason":str(e)})
+            raise HTTPException(status_code=502, detail=_error(e))
+        await asyncio.sleep(len(_tokens(out)) * _decode_delay(source))
+        # Without streaming the client sees its first token only when the whole output is done
+        _ok(span, "generate", source, req.prompt, out, (time.perf_counter() - t0) * 1000)
+        return {"ok": True, "output": out}
+
+def _sse(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+async def _stream(prompt: str, t0: float):
+    with llmobs().workflow(name="llm_request_stream"):
+        with tracer.trace("llm.endpoint", service=DD_SERVICE, resource="POST /llm/generate/stream") as span:
+            try:
+                out, source = await _generate(prompt)
+            except Exception as e:
+                yield _sse("error", _error(e))
+                return
+            delay, ttft_ms = _decode_delay(source), None
+            for tok in _tokens(out):
+                if delay:
+                    await asyncio.sleep(delay)
+                yield _sse("token", {"text": tok})
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - t0) * 1000
+            _ok(span, "stream", source, prompt, out, ttft_ms or (time.perf_counter() - t0) * 1000)
+            yield _sse("done", {"ok": True, "output": out, "cache": source})
+
+@app.post("/llm/generate/stream")
+async def generate_stream(req: PromptReq):
+    """Server-sent events: one `token` event per output token, then `done` (or `error`)."""
+    return StreamingResponse(_stream(req.prompt, time.perf_counter()), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+install_admission(app, statsd)
+install_trace_sampling(app, statsd)
@@ -0,0 +1,62 @@
+import time, threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU map with per-entry expiry. get/set/pop are O(1)."""
+
+    def __init__(self, max_entries: int, ttl: float, clock=time.monotonic):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.expired = self.evicted = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None) -> int:
+        """Insert/refresh `key`; returns how many LRU entries were evicted to make room."""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        evicted = 0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+            self.evicted += evicted
+        return evicted
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def purge_expired(self) -> int:
+        now = self._clock()
+        with self._lock:
+            dead = [k for k, (exp, _) in self._data.items() if exp <= now]
+            for k in dead:
+                del self._data[k]
+            self.expired += len(dead)
+        return len(dead)
+
+    def __len__(self) -> int:
+        return len(self._data)
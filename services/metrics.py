@@ -0,0 +1,62 @@
+import os, time
+from itertools import product
+from functools import lru_cache
+from datadog import DogStatsd
+
+# Counters, gauges and sets are summed / last-valued in memory and flushed every STATSD_FLUSH_INTERVAL_SECONDS
+# as packed datagrams (many metrics per UDP packet). STATSD_AGGREGATION=false sends one datagram per call.
+STATSD_AGGREGATION = os.getenv("STATSD_AGGREGATION", "true").lower() == "true"
+STATSD_FLUSH_INTERVAL_SECONDS = float(os.getenv("STATSD_FLUSH_INTERVAL_SECONDS", "2"))
+STATSD_MAX_BUFFER_BYTES = int(os.getenv("STATSD_MAX_BUFFER_BYTES", "8192"))
+
+
+class AggregatingStatsd(DogStatsd):
+    """DogStatsd with client-side aggregation and buffering on, plus self-metrics about its own flushes.
+
+    Each flush reports `statsd.client.flush_latency` (ms) and `statsd.client.packets_dropped` (packets the
+    client failed to write since the previous flush); both ride along in the next flush.
+    """
+
+    def __init__(self, service: str, aggregate: bool = STATSD_AGGREGATION, flush_interval: float = STATSD_FLUSH_INTERVAL_SECONDS):
+        super().__init__(
+            host=os.getenv("DD_AGENT_HOST", "127.0.0.1"),
+            port=int(os.getenv("DD_DOGSTATSD_PORT", "8125")),
+            constant_tags=[f"service:{service}", f"env:{os.getenv('DD_ENV','dev')}", f"version:{os.getenv('DD_VERSION','0.1.0')}"],
+            disable_aggregation=not aggregate,
+            disable_buffering=not aggregate,
+            flush_interval=flush_interval,
+            max_buffer_len=STATSD_MAX_BUFFER_BYTES,  # packet size; max_buffer_size is deprecated and ignored
+        )
+        self._dropped_seen = 0
+
+    def flush_aggregated_metrics(self):
+        t0 = time.perf_counter()
+        super().flush_aggregated_metrics()
+        self.flush_buffered_metrics()
+        self.distribution("statsd.client.flush_latency", (time.perf_counter() - t0) * 1000)
+        # The client's own telemetry resets its drop counters periodically; a drop in the total means a reset
+        dropped = self.packets_dropped
+        new = dropped - self._dropped_seen if dropped >= self._dropped_seen else dropped
+        self._dropped_seen = dropped
+        if new:
+            self.increment("statsd.client.packets_dropped", new)
+
+
+def make_statsd(service: str) -> DogStatsd:
+    return AggregatingStatsd(service)
+
+
+@lru_cache(maxsize=4096)
+def tags(*pairs: str) -> tuple:
+    """Interned tag tuple for key/value pairs: tags("bank", bank_id, "reason", reason).
+
+    Repeated tag sets reuse one tuple instead of rebuilding the list and f-strings on every call.
+    """
+    return tuple(f"{k}:{v}" for k, v in zip(pairs[::2], pairs[1::2]))
+
+
+def preintern(*dims) -> None:
+    """Warm tags() for every combination of known values: preintern(("reason", FAIL_REASONS), ("bank", BANK_IDS))."""
+    keys = [k for k, _ in dims]
+    for combo in product(*(values for _, values in dims)):
+        tags(*(x for pair in zip(keys, combo) for x in pair))
@@ -0,0 +1,151 @@
+"""All six services in one process: `uvicorn services.monolith:app`.
+
+Each request goes to the service that owns its first path segment (/auth -> auth-service, /pay and /banks ->
+payment-service, /check -> fraud-service, /jira -> jira-poller, /llm -> llm-service); everything else, including
+/ and /api, goes to web-frontend. With MONOLITH_DISPATCH=inprocess (the default) calls between services skip
+HTTP and go straight to the other service's app (see http_client.serve_locally); with "http" they keep using
+the *_SERVICE_URL / JIRA_POLLER_URL settings, which should then point at this process. Either way every service
+keeps its own name on spans, logs and metrics.
+
+A path several services serve (/stats) goes to the first of them in SERVICES order; every service is also reachable
+under its own name, e.g. /fraud-service/stats.
+"""
+import os, importlib, contextlib
+import anyio.to_thread
+from ddtrace import tracer
+from .http_client import serve_locally
+
+try:
+    from ddtrace.trace import TraceFilter
+except ImportError:  # ddtrace < 2.20
+    from ddtrace.filters import TraceFilter
+try:
+    # Private API: ddtrace re-applies the service from its request context when the ASGI span finishes
+    from ddtrace.internal import core
+except ImportError:
+    core = None
+
+MONOLITH_DISPATCH = os.getenv("MONOLITH_DISPATCH", "inprocess").strip().lower()
+# A sync handler holds a worker thread for every in-process hop below it (web -> payment -> fraud -> jira),
+# so one process serving all of them needs a bigger threadpool than anyio's default of 40
+MONOLITH_THREADPOOL_SIZE = int(os.getenv("MONOLITH_THREADPOOL_SIZE", "200"))
+
+SERVICES = {
+    "auth-service": "services.auth_service",
+    "payment-service": "services.payment_service",
+    "fraud-service": "services.fraud_service",
+    "jira-poller": "services.jira_poller",
+    "llm-service": "services.llm_service",
+    "web-frontend": "services.web_frontend",
+}
+DEFAULT_SERVICE = "web-frontend"
+# Set on each service's request span; ServiceNameFilter names the span after it when the trace finishes
+SERVICE_TAG = "monolith.service"
+# Every FastAPI app has these; the monolith serves web-frontend's
+_FRAMEWORK_PATHS = {"docs", "redoc", "openapi.json"}
+
+
+def _load(module: str):
+    # Service modules take their name from DD_SERVICE at import; hide the process's value so each keeps its own
+    saved = os.environ.pop("DD_SERVICE", None)
+    try:
+        return importlib.import_module(module).app
+    finally:
+        if saved is not None:
+            os.environ["DD_SERVICE"] = saved
+
+
+class ServiceNameMiddleware:
+    """Names ddtrace's request span after the service instead of the process (DD_SERVICE / inferred name)."""
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        span = tracer.current_span() if scope["type"] == "http" else None  # the ASGI request span
+        if span is not None:
+            span.service = self.service  # child spans started from here on inherit it
+            span.set_tag(SERVICE_TAG, self.service)
+            if core is not None:
+                core.set_item("service", self.service)
+        await self.app(scope, receive, send)
+
+
+class ServiceNameFilter(TraceFilter):
+    """Puts the service name back on tagged spans once the trace is done, whatever ddtrace did at finish.
+
+    core.set_item above is enough on the ddtrace versions this was written against; this public hook keeps span
+    names right if a ddtrace upgrade moves or drops it.
+    """
+
+    def process_trace(self, trace):
+        for span in trace:
+            service = span.get_tag(SERVICE_TAG)
+            if service:
+                span.service = service
+        return trace
+
+
+def _install_filter(f: TraceFilter) -> None:
+    try:
+        tracer.configure(trace_processors=[f])
+    except TypeError:  # ddtrace 2.x
+        tracer.configure(settings={"FILTERS": [f]})
+
+
+def route_table(apps: dict) -> dict:
+    """First path segment -> service name, from the apps' own routes; a segment claimed twice goes to the first app."""
+    table = {}
+    for name, sub in apps.items():
+        for route in sub.routes:
+            segment = route.path.split("/")[1]
+            if segment in apps:
+                raise RuntimeError(f"/{segment} of {name} clashes with the /{segment} service prefix")
+            if segment and segment not in _FRAMEWORK_PATHS:
+                table.setdefault(segment, name)
+    return table
+
+
+class Monolith:
+    """ASGI app dispatching to the service apps by path and running all their startup/shutdown handlers."""
+
+    def __init__(self, apps: dict, default: str = DEFAULT_SERVICE):
+        self.apps = apps
+        self.default = apps[default]
+        self.routes = {segment: apps[name] for segment, name in route_table(apps).items()}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        segment = scope["path"].split("/", 2)[1]
+        sub = self.apps.get(segment)
+        if sub is not None:
+            # /<service>/... : mounted like a sub-application, the service routes what follows the prefix
+            scope = {**scope, "root_path": scope.get("root_path", "") + "/" + segment}
+            return await sub(scope, receive, send)
+        await self.routes.get(segment, self.default)(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        await receive()  # lifespan.startup
+        async with contextlib.AsyncExitStack() as stack:
+            try:
+                anyio.to_thread.current_default_thread_limiter().total_tokens = MONOLITH_THREADPOOL_SIZE
+                for sub in self.apps.values():
+                    await stack.enter_async_context(sub.router.lifespan_context(sub))
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": repr(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+            await receive()  # lifespan.shutdown
+        await send({"type": "lifespan.shutdown.complete"})
+
+
+APPS = {name: _load(module) for name, module in SERVICES.items()}
+_install_filter(ServiceNameFilter())
+for _name, _sub in APPS.items():
+    _sub.add_middleware(ServiceNameMiddleware, service=_name)
+    if MONOLITH_DISPATCH == "inprocess":
+        serve_locally(_name, _sub)
+
+app = Monolith(APPS)
@@ -1,24 +1,114 @@
 import os
+import sys
+import queue
+import atexit
 import logging
+import logging.handlers
+import threading
+import time
+import random
+import functools
+import inspect
+from functools import lru_cache
 from pythonjsonlogger import jsonlogger
-from ddtrace import tracer, patch_all
+from ddtrace import tracer, patch, patch_all
+from ddtrace.constants import MANUAL_KEEP_KEY, MANUAL_DROP_KEY
+from .metrics import tags
+from .fastjson import dumps
 
-def init_observability():
-    patch_all()
+
+def _dumps(obj) -> bytes:
+    return dumps(obj, default=str)
+
+# "async": request threads only enqueue records; a writer thread formats and writes them in batches.
+# "sync": format and write on the calling thread (the original StreamHandler + JsonFormatter setup).
+LOG_MODE = os.getenv("LOG_MODE", "async").strip().lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+LOG_FLUSH_INTERVAL_MS = float(os.getenv("LOG_FLUSH_INTERVAL_MS", "200"))
+
+# Sampling of high-volume INFO events, e.g. "payment_created=0.1,payment_settled=0.1,auth_ok=0.05".
+# WARNING and above, and anything fraud-related, are always kept. LOG_SAMPLE_BUDGET_PER_SEC additionally
+# caps each event listed there to roughly that many lines per second per process (0 = no cap).
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_SAMPLE_BUDGET_PER_SEC = float(os.getenv("LOG_SAMPLE_BUDGET_PER_SEC", "0"))
+
+# Trace sampling: the root service (web-frontend) keeps routine traces at about TRACE_TARGET_TPS traces per second
+# per pod (split between its WEB_CONCURRENCY uvicorn workers) and every downstream service honours that decision. Errors, failed/rejected outcomes and the
+# suspected-fraud branch are always kept, wherever in the trace they happen (see keep_trace).
+TRACE_SAMPLING_ENABLED = os.getenv("TRACE_SAMPLING_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+TRACE_TARGET_TPS = float(os.getenv("TRACE_TARGET_TPS", "10"))
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# Response header a downstream service uses to tell its caller the trace was force-kept (value: the reason)
+TRACE_KEEP_HEADER = "X-Trace-Keep"
+KEEP_REASON_TAG = "sampling.keep_reason"
+
+# ddtrace integrations to patch. Each service passes the ones it actually uses to init_observability();
+# TRACE_INTEGRATIONS (e.g. "fastapi,requests,sqlite3") overrides that list, and "all" restores patch_all().
+# "logging" is always patched: it stamps dd.service/dd.env/dd.version on every log record.
+TRACE_INTEGRATIONS = os.getenv("TRACE_INTEGRATIONS", "")
+
+LOG_FORMAT = (
+    "%(asctime)s %(levelname)s %(name)s %(message)s "
+    "%(dd.trace_id)s %(dd.span_id)s %(dd.service)s %(dd.env)s %(dd.version)s "
+    "%(service)s %(env)s %(version)s %(bank_id)s %(customer_id)s %(payment_id)s %(amount)s %(status)s %(reason)s"
+)
+
+_writer = None
+_patched = set()  # integrations patched so far in this process; "all" once patch_all() ran
+
+
+def parse_integrations(spec: str) -> tuple:
+    return tuple(name.strip() for name in spec.split(",") if name.strip())
+
+
+def patch_integrations(integrations=None) -> None:
+    """Patch `integrations` (None = everything ddtrace supports). Idempotent: each call only patches what is new,
+    so services sharing a process (services/monolith.py) end up with the union of their lists."""
+    override = parse_integrations(TRACE_INTEGRATIONS)
+    if override:
+        integrations = None if override == ("all",) else override
+    if "all" in _patched:
+        return
+    if integrations is None:
+        _patched.add("all")
+        patch_all()
+        return
+    new = [name for name in ("logging", *integrations) if name not in _patched]
+    if new:
+        _patched.update(new)
+        patch(**{name: True for name in new})
+
+
+def init_observability(integrations=None):
+    """Logging and tracing setup for a service; `integrations` lists the ddtrace integrations it needs."""
+    global _writer
+    patch_integrations(integrations)
 
     root = logging.getLogger()
     root.handlers = []
     root.setLevel(os.getenv("LOG_LEVEL", "INFO"))
+    sampler = LogSampler(parse_sample_rates(LOG_SAMPLE_RATES), LOG_SAMPLE_BUDGET_PER_SEC)
+
+    if LOG_MODE == "async":
+        # None of these record attributes are emitted; skipping them (per the logging HOWTO's
+        # optimisation notes) saves a few lookups on every log call
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+        if _writer is None:
+            _writer = BatchLogWriter(sys.stderr, FastJsonFormatter(), LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL_MS / 1000)
+            atexit.register(_writer.stop)
+        _writer.handler.filters = [sampler]
+        root.addHandler(_writer.handler)
+        return
 
     handler = logging.StreamHandler()
-    formatter = jsonlogger.JsonFormatter(
-        "%(asctime)s %(levelname)s %(name)s %(message)s "
-        "%(dd.trace_id)s %(dd.span_id)s %(dd.service)s %(dd.env)s %(dd.version)s "
-        "%(service)s %(env)s %(version)s %(bank_id)s %(customer_id)s %(payment_id)s %(amount)s %(status)s %(reason)s"
-    )
-    handler.setFormatter(formatter)
+    handler.setFormatter(jsonlogger.JsonFormatter(LOG_FORMAT))
+    handler.addFilter(sampler)
     root.addHandler(handler)
 
+
 def current_dd_ids():
     span = tracer.current_span()
     if not span:
@@ -26,5 +116,350 @@ def current_dd_ids():
     ctx = span.context
     return {"dd.trace_id": str(ctx.trace_id), "dd.span_id": str(ctx.span_id)}
 
+
+@lru_cache(maxsize=None)
 def base_fields(service: str):
+    # Computed once per service; callers spread it into `extra`, so the shared dict is never mutated
     return {"service": service, "env": os.getenv("DD_ENV","dev"), "version": os.getenv("DD_VERSION","0.1.0")}
+
+
+def parse_sample_rates(spec: str) -> dict:
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+_KNUTH_FACTOR = 1111111111111111111
+_MAX_ID = 2 ** 64
+
+
+class LogSampler(logging.Filter):
+    """Drops a share of high-volume success events and stamps every kept line with `sample_rate`.
+
+    The keep decision is a hash of the trace id (the same scheme as Datadog's trace samplers), so a
+    sampled-in trace keeps its lines in every service that uses the same rate. With a budget, each
+    event's rate is further scaled once per second to budget / events seen in the previous second.
+    Only events named in `rates` are sampled or budgeted; everything else is kept.
+    Counts are re-weighted downstream by summing 1 / sample_rate.
+    """
+
+    def __init__(self, rates: dict, budget_per_sec: float = 0.0, clock=time.monotonic):
+        super().__init__()
+        self.rates = rates
+        self.budget = budget_per_sec
+        self._clock = clock
+        self._window = {}  # event -> [window start, seen this window, budget scale]
+        self._lock = threading.Lock()  # filter() runs on every logging thread
+
+    @staticmethod
+    def always_keep(record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for value in (record.msg, getattr(record, "status", None), getattr(record, "reason", None)):
+            if isinstance(value, str) and "fraud" in value.lower():
+                return True
+        return False
+
+    def _scale(self, event: str) -> float:
+        now = self._clock()
+        with self._lock:
+            w = self._window.get(event)
+            if w is None:
+                w = self._window[event] = [now, 0, 1.0]
+            elif now - w[0] >= 1.0:
+                seen = w[1] / (now - w[0])
+                w[:] = [now, 0, min(1.0, self.budget / seen) if seen else 1.0]
+            w[1] += 1
+            return w[2]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = record.msg
+        rate = self.rates.get(event) if isinstance(event, str) else None
+        if rate is None or rate >= 1.0 and not self.budget or self.always_keep(record):
+            record.sample_rate = 1.0
+            return True
+        if self.budget:
+            rate *= self._scale(event)
+        if rate >= 1.0:
+            record.sample_rate = 1.0
+            return True
+        try:
+            trace_id = int(getattr(record, "dd.trace_id", 0) or 0)
+        except (TypeError, ValueError):
+            trace_id = 0
+        if trace_id:
+            keep = (trace_id * _KNUTH_FACTOR) % _MAX_ID < rate * _MAX_ID
+        else:
+            keep = random.random() < rate
+        if keep:
+            record.sample_rate = rate
+        return keep
+
+
+class TraceSampler:
+    """Head sampler for routine traces: keeps roughly `target_tps` new traces per second.
+
+    Once per second the keep rate is reset to target / traces started in the previous second; the decision
+    itself is the same Knuth hash of the trace id as LogSampler, so logs and traces sampled at the same rate
+    line up. The decision is written as a manual keep/drop on the root span, which ddtrace propagates to
+    every downstream call. Lives on the event loop (no locks).
+    """
+
+    def __init__(self, target_tps: float = TRACE_TARGET_TPS / WEB_CONCURRENCY, clock=time.monotonic):
+        self.target = target_tps
+        self._clock = clock
+        self._window = [clock(), 0, 1.0]  # [window start, seen this window, rate]
+
+    def rate(self) -> float:
+        now = self._clock()
+        w = self._window
+        if now - w[0] >= 1.0:
+            seen = w[1] / (now - w[0])
+            w[:] = [now, 0, min(1.0, self.target / seen) if seen else 1.0]
+        w[1] += 1
+        return w[2]
+
+    def sample(self, span) -> bool:
+        rate = self.rate()
+        keep = rate >= 1.0 or ((span.trace_id & (_MAX_ID - 1)) * _KNUTH_FACTOR) % _MAX_ID < rate * _MAX_ID
+        span.set_tag(MANUAL_KEEP_KEY if keep else MANUAL_DROP_KEY)
+        span.set_metric("sampling.head_rate", rate)
+        return keep
+
+
+def keep_trace(reason: str) -> None:
+    """Force-keep the current trace whatever the head decision was; the first reason given is recorded.
+
+    Called for errors and for outcomes we always want to see (auth_error, failed, fraud_rejected, the
+    suspected-fraud branch). Call it before making downstream calls so they inherit the keep.
+    """
+    if not TRACE_SAMPLING_ENABLED:
+        return
+    span = tracer.current_root_span()
+    if span is None:
+        return
+    if span.get_tag(KEEP_REASON_TAG) is None:
+        span.set_tag(KEEP_REASON_TAG, reason)
+    span.set_tag(MANUAL_KEEP_KEY)
+
+
+class TraceSamplingMiddleware:
+    """ASGI middleware (inside ddtrace's request span) applying the sampling policy to each request.
+
+    As the root it makes the head decision with `sampler`; downstream it leaves the propagated decision
+    alone. Either way, responses with status >= `keep_status` force-keep the trace, and a force-kept trace
+    is reported back to the caller in TRACE_KEEP_HEADER so the caller's part of the trace is kept too.
+    """
+
+    def __init__(self, app, sampler: TraceSampler = None, keep_status: int = 500, statsd=None):
+        self.app = app
+        self.sampler = sampler
+        self.keep_status = keep_status
+        self._statsd = statsd
+        self._header = TRACE_KEEP_HEADER.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        span = tracer.current_root_span() if scope["type"] == "http" else None
+        if span is None:
+            return await self.app(scope, receive, send)
+        if self.sampler is not None:
+            self.sampler.sample(span)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                if message["status"] >= self.keep_status:
+                    keep_trace("error" if message["status"] >= 500 else "rejected")
+                reason = span.get_tag(KEEP_REASON_TAG)
+                if reason is not None and self.sampler is None:
+                    message = {**message, "headers": [*message.get("headers", []), (self._header, reason.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if self._statsd is not None:
+                priority = span.context.sampling_priority
+                reason = span.get_tag(KEEP_REASON_TAG) or ("head" if self.sampler is not None else "upstream")
+                self._statsd.increment("trace.sampling.decision", tags=tags(
+                    "decision", "keep" if priority is None or priority > 0 else "drop", "reason", reason))
+
+
+def install_trace_sampling(app, statsd=None, root: bool = False) -> None:
+    """Add TraceSamplingMiddleware to `app`; `root=True` for the service that starts traces (web-frontend).
+
+    The root also force-keeps 4xx responses, the user-visible rejections (failed logins, declined payments).
+    """
+    if not TRACE_SAMPLING_ENABLED:
+        return
+    app.add_middleware(TraceSamplingMiddleware, sampler=TraceSampler() if root else None,
+                       keep_status=400 if root else 500, statsd=statsd)
+
+
+class timed:
+    """Times one stage of a request, as a context manager or a (sync or async) decorator.
+
+        with timed(statsd, "payment.stage.duration", "jira_create", bank=req.bank_id) as t:
+            ...
+            t.outcome = "skipped"   # optional; defaults to "ok", or "error" if the block raised
+
+    Emits a distribution (ms) tagged stage/outcome plus the given tags, and sets `<stage>.duration_ms`
+    on the active span. Used as a decorator, each call gets its own timer.
+    """
+
+    __slots__ = ("statsd", "metric", "stage", "tag_values", "outcome", "_t0")
+
+    def __init__(self, statsd, metric: str, stage: str, **tag_values):
+        self.statsd = statsd
+        self.metric = metric
+        self.stage = stage
+        self.tag_values = tuple(x for kv in tag_values.items() for x in kv)
+        self.outcome = None
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self._t0) * 1000
+        outcome = self.outcome or ("error" if exc_type else "ok")
+        self.statsd.distribution(self.metric, ms, tags=tags("stage", self.stage, "outcome", outcome, *self.tag_values))
+        span = tracer.current_span()
+        if span is not None:
+            span.set_metric(f"{self.stage}.duration_ms", ms)
+        return False
+
+    def _fresh(self):
+        t = timed.__new__(timed)
+        t.statsd, t.metric, t.stage, t.tag_values, t.outcome = self.statsd, self.metric, self.stage, self.tag_values, None
+        return t
+
+    def __call__(self, fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with self._fresh():
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self._fresh():
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+# Fields named in LOG_FORMAT; emitted as null when absent, like jsonlogger does
+_FORMAT_FIELDS = (
+    "dd.trace_id", "dd.span_id", "dd.service", "dd.env", "dd.version",
+    "service", "env", "version", "bank_id", "customer_id", "payment_id", "amount", "status", "reason",
+)
+
+
+class FastJsonFormatter(logging.Formatter):
+    """Produces the same JSON shape as the jsonlogger setup, encoded with orjson."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return self.encode(record).decode("utf-8")
+
+    def encode(self, record: logging.LogRecord) -> bytes:
+        out = {
+            "asctime": self.formatTime(record),
+            "levelname": record.levelname,
+            "name": record.name,
+            "message": record.getMessage(),
+        }
+        d = record.__dict__
+        for k in _FORMAT_FIELDS:
+            out[k] = d.get(k)
+        for k, v in d.items():
+            if k not in _RESERVED and k not in out:
+                out[k] = v
+        if record.exc_info:
+            out["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            out["exc_info"] = record.exc_text
+        if record.stack_info:
+            out["stack_info"] = self.formatStack(record.stack_info)
+        return _dumps(out)
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Defer message formatting and JSON encoding to the writer thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def take_dropped(self) -> int:
+        """Records dropped since the last call."""
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class BatchLogWriter:
+    """Background thread that drains queued records, encodes them and writes each batch with one write()."""
+
+    def __init__(self, stream, formatter: FastJsonFormatter, queue_size: int, batch_size: int, flush_interval: float):
+        self._stream = getattr(stream, "buffer", None) or stream
+        self._binary = self._stream is not stream
+        self._formatter = formatter
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._q = queue.Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+        self.handler = _EnqueueHandler(self._q)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def _drain(self, first) -> None:
+        batch = [first]
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self._formatter.encode(record))
+            except Exception:
+                pass  # a bad record must not take the writer down
+        dropped = self.handler.take_dropped()
+        if dropped:
+            lines.append(_dumps({"levelname": "WARNING", "name": "obs", "message": "log_records_dropped", "count": dropped}))
+        if not lines:
+            return
+        data = b"\n".join(lines) + b"\n"
+        try:
+            self._stream.write(data if self._binary else data.decode("utf-8"))
+            self._stream.flush()
+        except Exception:
+            pass
+
+    def _run(self) -> None:
+        while not (self._stopped.is_set() and self._q.empty()):
+            try:
+                first = self._q.get(timeout=self._flush_interval)
+            except queue.Empty:
+                continue
+            self._drain(first)
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stopped.set()
+        self._thread.join(timeout)
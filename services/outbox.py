@@ -0,0 +1,209 @@
+import os, json, time, random, sqlite3, threading, logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from ddtrace import tracer
+
+LOG = logging.getLogger("outbox")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    result TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox(status, key, id);
+CREATE INDEX IF NOT EXISTS outbox_key_kind ON outbox(key, kind, status);
+"""
+
+# Oldest pending entry of every key that is due: one in-flight entry per key keeps per-key ordering
+_READY = """
+SELECT o.id, o.key, o.kind, o.payload, o.attempts, o.created FROM outbox o
+WHERE o.status = 'pending' AND o.next_attempt <= ?
+  AND o.id = (SELECT MIN(id) FROM outbox WHERE key = o.key AND status = 'pending')
+ORDER BY o.id LIMIT ?
+"""
+
+
+class Outbox:
+    """Durable SQLite outbox: enqueue() commits and returns; a dispatcher thread delivers with retries.
+
+    Entries sharing a `key` are delivered strictly in enqueue order; a failing entry holds back the
+    entries behind it until it succeeds or is dead-lettered after `max_attempts`. Entries behind a dead-lettered
+    one for which `dependent(dead_kind, kind, payload)` is true are dead-lettered with it rather than retried.
+    """
+
+    def __init__(self, path: str, handlers: Dict[str, Callable[[dict, str], Optional[dict]]], statsd=None,
+                 metric_prefix: str = "outbox", max_attempts: int = 8, base_backoff: float = 1.0,
+                 max_backoff: float = 300.0, workers: int = 4, retention_seconds: float = 86400,
+                 dependent: Callable[[str, str, dict], bool] = None):
+        self.path = path
+        self.handlers = handlers
+        self.dependent = dependent
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self._statsd = statsd
+        self._prefix = metric_prefix
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(_SCHEMA)
+
+    # -- producer side ------------------------------------------------------
+
+    def enqueue(self, kind: str, key: str, payload: dict) -> int:
+        if kind not in self.handlers:
+            raise ValueError(f"no outbox handler for {kind!r}")
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO outbox (key, kind, payload, next_attempt, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, json.dumps(payload), now, now, now),
+            )
+        self._count("enqueued", kind)
+        self._wake.set()
+        return cur.lastrowid
+
+    def result(self, key: str, kind: str) -> Optional[dict]:
+        """Result returned by the handler of the latest delivered `kind` entry for `key`."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result FROM outbox WHERE key = ? AND kind = ? AND status = 'done' ORDER BY id DESC LIMIT 1", (key, kind)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def lag(self) -> float:
+        """Age in seconds of the oldest undelivered entry."""
+        with self._lock:
+            oldest = self._db.execute("SELECT MIN(created) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        return max(0.0, time.time() - oldest) if oldest else 0.0
+
+    # -- dispatcher ---------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="outbox")
+        last_prune = 0.0
+        while not self._stopped.is_set():
+            self._wake.clear()
+            try:
+                now = time.time()
+                with self._lock:
+                    batch = self._db.execute(_READY, (now, self.workers * 4)).fetchall()
+                list(pool.map(self._deliver, batch))
+                self._gauges()
+                if now - last_prune > 600:
+                    self._prune(now)
+                    last_prune = now
+            except Exception as e:
+                LOG.error("outbox_dispatch_error", extra={"status": "outbox_dispatch_error", "reason": str(e)})
+                batch = []
+            if not batch:
+                self._wake.wait(self._idle_wait())
+        pool.shutdown(wait=False)
+
+    def _idle_wait(self) -> float:
+        with self._lock:
+            nxt = self._db.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        if nxt is None:
+            return 5.0
+        return min(5.0, max(0.05, nxt - time.time()))
+
+    def _deliver(self, row) -> None:
+        entry_id, key, kind, payload, attempts, created = row
+        attempts += 1
+        try:
+            with tracer.trace("outbox.deliver", resource=kind) as span:
+                span.set_tag("outbox.key", key)
+                span.set_tag("outbox.attempt", attempts)
+                result = self.handlers[kind](json.loads(payload), key)
+        except Exception as e:
+            now = time.time()
+            if attempts >= self.max_attempts:
+                status, next_attempt = "dead", now
+                self._count("dead", kind)
+                LOG.error("outbox_dead_letter", extra={"status": "outbox_dead_letter", "reason": str(e), "outbox_id": entry_id, "outbox_kind": kind, "attempts": attempts})
+            else:
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                status, next_attempt = "pending", now + delay
+                self._count("retry", kind)
+                LOG.warning("outbox_retry", extra={"status": "outbox_retry", "reason": str(e), "outbox_id": entry_id, "outbox_kind": kind, "attempts": attempts})
+            with self._lock:
+                self._db.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, updated = ?, last_error = ? WHERE id = ?",
+                    (status, attempts, next_attempt, now, str(e)[:500], entry_id),
+                )
+            if status == "dead":
+                self._dead_letter_dependents(entry_id, key, kind, now)
+            return
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET status = 'done', attempts = ?, updated = ?, result = ? WHERE id = ?",
+                (attempts, now, json.dumps(result) if result is not None else None, entry_id),
+            )
+        self._count("delivered", kind)
+        if self._statsd is not None:
+            self._statsd.distribution(f"{self._prefix}.delivery_lag", (now - created) * 1000, tags=[f"kind:{kind}"])
+
+    def _dead_letter_dependents(self, dead_id: int, key: str, dead_kind: str, now: float) -> None:
+        if self.dependent is None:
+            return
+        with self._lock:
+            behind = self._db.execute(
+                "SELECT id, kind, payload FROM outbox WHERE key = ? AND status = 'pending' AND id > ? ORDER BY id", (key, dead_id)
+            ).fetchall()
+            dead = [(entry_id, kind) for entry_id, kind, payload in behind if self.dependent(dead_kind, kind, json.loads(payload))]
+            reason = f"depends on dead-lettered outbox entry {dead_id}"
+            self._db.executemany(
+                "UPDATE outbox SET status = 'dead', updated = ?, last_error = ? WHERE id = ?", [(now, reason, i) for i, _ in dead]
+            )
+        for entry_id, kind in dead:
+            self._count("dead", kind)
+            LOG.error("outbox_dead_letter", extra={"status": "outbox_dead_letter", "reason": reason, "outbox_id": entry_id, "outbox_kind": kind, "attempts": 0})
+
+    def _prune(self, now: float) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE status != 'pending' AND updated < ?", (now - self.retention_seconds,))
+
+    def _gauges(self) -> None:
+        if self._statsd is not None:
+            self._statsd.gauge(f"{self._prefix}.depth", self.depth())
+            self._statsd.gauge(f"{self._prefix}.lag", self.lag())
+
+    def _count(self, name: str, kind: str) -> None:
+        if self._statsd is not None:
+            self._statsd.increment(f"{self._prefix}.{name}", tags=[f"kind:{kind}"])
@@ -1,92 +1,315 @@
-import os, time, uuid, random, logging, requests
-from fastapi import FastAPI, HTTPException
+import os, time, uuid, random, asyncio, logging
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request, Response, Header, Query
 from pydantic import BaseModel
-from datadog import DogStatsd
 from ddtrace import tracer
-from .obs import init_observability, current_dd_ids, base_fields
-from .banks import BANKS
+from .obs import init_observability, current_dd_ids, base_fields, timed, keep_trace, install_trace_sampling
+from .metrics import make_statsd, preintern, tags
+from .banks import BANKS_JSON, BANK_NAMES, BANK_IDS
+from .http_client import Upstream, install_deadline
+from .admission import install_admission
+from .fastjson import install_fast_json
+from .static_cache import StaticResponse
+from .idempotency import IdempotencyCache, REPLAYED_HEADER
+from .dedup import DuplicateDetector, DEDUP_ENABLED, DUPLICATE
+from .ledger import Ledger, LEDGER_ENABLED, LEDGER_PATH, LEDGER_SYNC_TIMEOUT_SECONDS, CREATED, SETTLED, FAILED
+from .aggregates import RollingAggregates, install_stats
 
-init_observability()
+init_observability(integrations=("fastapi", "requests", "httpx"))
 LOG = logging.getLogger("payment_service")
 
 DD_SERVICE = os.getenv("DD_SERVICE","payment-service")
-statsd = DogStatsd(host=os.getenv("DD_AGENT_HOST","127.0.0.1"), port=int(os.getenv("DD_DOGSTATSD_PORT","8125")),
-                   constant_tags=[f"service:{DD_SERVICE}", f"env:{os.getenv('DD_ENV','dev')}", f"version:{os.getenv('DD_VERSION','0.1.0')}"])
+statsd = make_statsd(DD_SERVICE)
 
 FRAUD_SERVICE_URL = os.getenv("FRAUD_SERVICE_URL","http://fraud-service:8000")
 JIRA_POLLER_URL = os.getenv("JIRA_POLLER_URL","http://jira-poller:8000")
 
+FRAUD = Upstream("fraud-service", FRAUD_SERVICE_URL, timeout=10, statsd=statsd)
+JIRA_POLLER = Upstream("jira-poller", JIRA_POLLER_URL, timeout=10, statsd=statsd)
+
 PAYMENT_FAIL_RATE = float(os.getenv("PAYMENT_FAIL_RATE","0.15"))
 PAYMENT_SUSPECTED_FRAUD_RATE = float(os.getenv("PAYMENT_SUSPECTED_FRAUD_RATE","0.05"))
+# "async" serves /pay on the event loop (non-blocking delay + upstream calls); "sync" uses the threadpool handler
+PAYMENT_HANDLER = os.getenv("PAYMENT_HANDLER","async").strip().lower()
+# What to do when fraud-service gave no verdict (down, circuit open, deadline spent): "reject" or "approve"
+PAYMENT_FRAUD_FALLBACK = os.getenv("PAYMENT_FRAUD_FALLBACK","reject").strip().lower()
 
 FAIL_REASONS = ["Request timeout","Insufficient funds","Invalid recipient","incorrect card details"]
+preintern(("bank", BANK_IDS))
+preintern(("reason", FAIL_REASONS), ("bank", BANK_IDS))
 SUSPECTED_FRAUD_REASON = "Suspected Fraud"
+DUPLICATE_REASON = "Duplicate transaction"
+DEDUP = DuplicateDetector()
+# Durable record of every payment's state transitions, served by GET /payments/{id} and /customers/{id}/payments
+LEDGER = Ledger(LEDGER_PATH, statsd=statsd) if LEDGER_ENABLED else None
+# Last STATS_WINDOW_SECONDS of outcomes, failure reasons and amounts per bank, served by GET /stats
+STATS = RollingAggregates(BANK_IDS)
 
 app = FastAPI(title="Payment Service", version=os.getenv("DD_VERSION","0.1.0"))
+install_fast_json(app)
 
 class PayReq(BaseModel):
     customer_id: str
     bank_id: str
     amount: float
 
+BANKS_RESPONSE = StaticResponse.from_bytes(BANKS_JSON, "application/json", "public, max-age=300")
+
 def bank_name(bank_id: str) -> str:
-    for b in BANKS:
-        if b["id"] == bank_id:
-            return b["name"]
-    return bank_id
+    return BANK_NAMES.get(bank_id, bank_id)
 
 @app.get("/banks")
-def banks():
-    return {"banks": BANKS}
+def banks(request: Request):
+    return BANKS_RESPONSE.response(request)
+
+def _stage(name: str, req: PayReq) -> timed:
+    return timed(statsd, "payment.stage.duration", name, bank=req.bank_id)
+
+def _fields(req: PayReq, payment_id: str, **kw) -> dict:
+    return {**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": req.customer_id, "payment_id": payment_id, "bank_id": req.bank_id, "amount": req.amount, **kw}
+
+def _record(req: PayReq, payment_id: str, state: str, reason: str = "") -> None:
+    if LEDGER is not None:
+        LEDGER.append(payment_id, state, req.customer_id, req.bank_id, req.amount, reason)
+
+def _created(req: PayReq) -> str:
+    payment_id = str(uuid.uuid4())
+    _record(req, payment_id, CREATED)
+    statsd.increment("payment.created", tags=tags("bank", req.bank_id))
+    LOG.info("payment_created", extra=_fields(req, payment_id, status="created"))
+    return payment_id
+
+def _processing_delay() -> float:
+    return random.uniform(0.05, 0.25)
+
+def _ticket_payload(req: PayReq, payment_id: str, trace_id: str) -> dict:
+    return {"trace_id": trace_id, "payment_id": payment_id, "customer_id": req.customer_id, "bank_id": req.bank_id, "amount": req.amount, "reason": SUSPECTED_FRAUD_REASON}
+
+def _check_payload(req: PayReq, payment_id: str, trace_id: str, issue_key: str) -> dict:
+    return {"trace_id": trace_id, "payment_id": payment_id, "customer_id": req.customer_id, "bank_id": req.bank_id, "amount": req.amount, "issue_key": issue_key}
+
+def _settled(req: PayReq, payment_id: str) -> dict:
+    _record(req, payment_id, SETTLED)
+    if DEDUP_ENABLED:
+        DEDUP.record(req.customer_id, req.bank_id, req.amount)
+    STATS.record(req.bank_id, SETTLED, req.amount)
+    statsd.increment("payment.settled", tags=tags("bank", req.bank_id))
+    LOG.info("payment_settled", extra=_fields(req, payment_id, status="settled"))
+    return {"ok": True, "payment_id": payment_id, "status": "settled", "bank_id": req.bank_id, "bank_name": bank_name(req.bank_id)}
+
+def _failed(req: PayReq, payment_id: str, reason: str):
+    _record(req, payment_id, FAILED, reason)
+    STATS.record(req.bank_id, FAILED, req.amount, reason)
+    statsd.increment("payment.failed", tags=tags("reason", reason, "bank", req.bank_id))
+    keep_trace("failed")
+    LOG.error("payment_failed", extra=_fields(req, payment_id, status="failed", reason=reason))
+    raise HTTPException(status_code=502, detail={"error":"payment_failed","reason":reason,"payment_id":payment_id})
 
-@app.post("/pay")
-def pay(req: PayReq):
+def _reject_duplicate(req: PayReq, payment_id: str) -> None:
+    # Same customer, bank and amount as a payment settled within DUPLICATE_WINDOW_SECONDS: fail before any
+    # processing or upstream call. Only settled payments are recorded (_settled), so a retry after a decline goes
+    # through; concurrent identical requests are left to the Idempotency-Key the frontend sends.
+    if not DEDUP_ENABLED:
+        return
+    verdict = DEDUP.seen(req.customer_id, req.bank_id, req.amount)
+    if verdict != "new":
+        statsd.increment("payment.dedup", tags=tags("verdict", verdict, "bank", req.bank_id))
+    if verdict == DUPLICATE:
+        _failed(req, payment_id, DUPLICATE_REASON)
+
+def _skip():
+    # Upstream fallback: circuit open or deadline spent -> carry on without that call
+    return None
+
+def _fraud_outcome(req: PayReq, payment_id: str, fraud):
+    if fraud is None and PAYMENT_FRAUD_FALLBACK == "approve":
+        statsd.increment("payment.fraud_check.fallback", tags=tags("action", "approve", "bank", req.bank_id))
+        return _settled(req, payment_id)
+    if fraud and fraud.get("fraudulent") is False:
+        return _settled(req, payment_id)
+    _failed(req, payment_id, SUSPECTED_FRAUD_REASON)
+
+def _normal_outcome(req: PayReq, payment_id: str):
+    if random.random() < PAYMENT_FAIL_RATE:
+        _failed(req, payment_id, random.choice(FAIL_REASONS))
+    return _settled(req, payment_id)
+
+def _pay(req: PayReq):
     with tracer.trace("payment.pay", service=DD_SERVICE, resource="POST /pay"):
-        payment_id = str(uuid.uuid4())
-        statsd.increment("payment.created", tags=[f"bank:{req.bank_id}"])
-        LOG.info("payment_created", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": req.customer_id, "payment_id": payment_id, "bank_id": req.bank_id, "amount": req.amount, "status":"created"})
+        payment_id = _created(req)
+        _reject_duplicate(req, payment_id)
 
-        time.sleep(random.uniform(0.05, 0.25))
+        with _stage("processing_delay", req):
+            time.sleep(_processing_delay())
 
         # Suspected fraud flow
         if random.random() < PAYMENT_SUSPECTED_FRAUD_RATE:
+            keep_trace("suspected_fraud")  # before the Jira/fraud calls, so they inherit the keep
             trace_id = current_dd_ids().get("dd.trace_id","0")
             issue_key = ""
+            with _stage("jira_create", req) as t:
+                try:
+                    r = JIRA_POLLER.post("/jira/create_suspected_fraud", json=_ticket_payload(req, payment_id, trace_id), fallback=_skip)
+                    if r is None:
+                        t.outcome = "skipped"
+                    else:
+                        r.raise_for_status()
+                        issue_key = r.json().get("issue_key","")
+                except Exception as e:
+                    t.outcome = "error"
+                    LOG.error("jira_create_error", extra=_fields(req, payment_id, status="jira_create_error", reason=str(e)))
+
+            fraud = None
+            with _stage("fraud_check", req) as t:
+                try:
+                    fr = FRAUD.post("/check", json=_check_payload(req, payment_id, trace_id, issue_key), fallback=_skip)
+                    if fr is None:
+                        t.outcome = "skipped"
+                    else:
+                        fr.raise_for_status()
+                        fraud = fr.json()
+                except Exception as e:
+                    t.outcome = "error"
+                    LOG.error("fraud_call_error", extra=_fields(req, payment_id, status="fraud_call_error", reason=str(e)))
+
+            return _fraud_outcome(req, payment_id, fraud)
+
+        # Normal failures
+        return _normal_outcome(req, payment_id)
+
+async def _asleep_stage(req: PayReq, delay: float) -> None:
+    with _stage("processing_delay", req):
+        await asyncio.sleep(delay)
+
+async def _acreate_ticket(req: PayReq, payment_id: str, trace_id: str) -> str:
+    with _stage("jira_create", req) as t:
+        try:
+            r = await JIRA_POLLER.apost("/jira/create_suspected_fraud", json=_ticket_payload(req, payment_id, trace_id), fallback=_skip)
+            if r is None:
+                t.outcome = "skipped"
+                return ""
+            r.raise_for_status()
+            return r.json().get("issue_key","")
+        except Exception as e:
+            t.outcome = "error"
+            LOG.error("jira_create_error", extra=_fields(req, payment_id, status="jira_create_error", reason=str(e)))
+            return ""
+
+async def _pay_async(req: PayReq):
+    with tracer.trace("payment.pay", service=DD_SERVICE, resource="POST /pay"):
+        payment_id = _created(req)
+        _reject_duplicate(req, payment_id)
+        delay = _processing_delay()
+
+        if random.random() < PAYMENT_SUSPECTED_FRAUD_RATE:
+            # Branch is decided up front so the Jira ticket is created while the payment is "processing"
+            keep_trace("suspected_fraud")
+            trace_id = current_dd_ids().get("dd.trace_id","0")
+            _, issue_key = await asyncio.gather(_asleep_stage(req, delay), _acreate_ticket(req, payment_id, trace_id))
+
+            fraud = None
+            with _stage("fraud_check", req) as t:
+                try:
+                    fr = await FRAUD.apost("/check", json=_check_payload(req, payment_id, trace_id, issue_key), fallback=_skip)
+                    if fr is None:
+                        t.outcome = "skipped"
+                    else:
+                        fr.raise_for_status()
+                        fraud = fr.json()
+                except Exception as e:
+                    t.outcome = "error"
+                    LOG.error("fraud_call_error", extra=_fields(req, payment_id, status="fraud_call_error", reason=str(e)))
+
+            return _fraud_outcome(req, payment_id, fraud)
+
+        await _asleep_stage(req, delay)
+        return _normal_outcome(req, payment_id)
+
+# Settled and payment_failed (502) outcomes are final, so both are replayed for a repeated Idempotency-Key
+IDEMPOTENCY = IdempotencyCache(statsd=statsd, metric_prefix="payment.idempotency", cache_statuses=(502,))
+
+def _idempotency_args(req: PayReq, key: str) -> tuple:
+    # Keys are scoped to the customer; the fingerprint catches a key reused for a different payment
+    return f"{req.customer_id}:{key}", (req.bank_id, req.amount)
+
+# The outcome is on disk before the caller hears about it; concurrent requests share one fsync (group commit).
+# A ledger write error, or a writer that is not done within LEDGER_SYNC_TIMEOUT_SECONDS, answers 503 instead of
+# an outcome that is not recorded. Committing inside the idempotent call keeps such a 503 out of its cache.
+def _ledger_unavailable(req: PayReq, e: Exception) -> HTTPException:
+    statsd.increment("payment.ledger.unavailable", tags=tags("bank", req.bank_id))
+    LOG.error("ledger_unavailable", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": req.customer_id, "bank_id": req.bank_id, "amount": req.amount, "status": "ledger_unavailable", "reason": repr(e)})
+    return HTTPException(status_code=503, detail="ledger_unavailable")
+
+def _commit(req: PayReq) -> None:
+    if LEDGER is not None:
+        with _stage("ledger_commit", req):
             try:
-                r = requests.post(f"{JIRA_POLLER_URL.rstrip('/')}/jira/create_suspected_fraud", json={
-                    "trace_id": trace_id, "payment_id": payment_id, "customer_id": req.customer_id, "bank_id": req.bank_id, "amount": req.amount, "reason": SUSPECTED_FRAUD_REASON
-                }, timeout=10)
-                r.raise_for_status()
-                issue_key = r.json().get("issue_key","")
+                LEDGER.sync(LEDGER_SYNC_TIMEOUT_SECONDS)
             except Exception as e:
-                LOG.error("jira_create_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": req.customer_id, "payment_id": payment_id, "bank_id": req.bank_id, "amount": req.amount, "status":"jira_create_error", "reason": str(e)})
+                raise _ledger_unavailable(req, e)
 
-            fraud = None
+async def _acommit(req: PayReq) -> None:
+    if LEDGER is not None:
+        with _stage("ledger_commit", req):
             try:
-                fr = requests.post(f"{FRAUD_SERVICE_URL.rstrip('/')}/check", json={
-                    "trace_id": trace_id, "payment_id": payment_id, "customer_id": req.customer_id, "bank_id": req.bank_id, "amount": req.amount, "issue_key": issue_key
-                }, timeout=10)
-                fr.raise_for_status()
-                fraud = fr.json()
+                await LEDGER.async_sync(LEDGER_SYNC_TIMEOUT_SECONDS)
             except Exception as e:
-                LOG.error("fraud_call_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": req.customer_id, "payment_id": payment_id, "bank_id": req.bank_id, "amount": req.amount, "status":"fraud_call_error", "reason": str(e)})
+                raise _ledger_unavailable(req, e)
 
-            if fraud and fraud.get("fraudulent") is False:
-                statsd.increment("payment.settled", tags=[f"bank:{req.bank_id}"])
-                LOG.info("payment_settled", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": req.customer_id, "payment_id": payment_id, "bank_id": req.bank_id, "amount": req.amount, "status":"settled"})
-                return {"ok": True, "payment_id": payment_id, "status": "settled", "bank_id": req.bank_id, "bank_name": bank_name(req.bank_id)}
+def _pay_committed(req: PayReq):
+    try:
+        result = _pay(req)
+    except HTTPException:
+        _commit(req)  # a decline (502) is recorded too
+        raise
+    _commit(req)
+    return result
 
-            statsd.increment("payment.failed", tags=[f"reason:{SUSPECTED_FRAUD_REASON}", f"bank:{req.bank_id}"])
-            LOG.error("payment_failed", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": req.customer_id, "payment_id": payment_id, "bank_id": req.bank_id, "amount": req.amount, "status":"failed", "reason": SUSPECTED_FRAUD_REASON})
-            raise HTTPException(status_code=502, detail={"error":"payment_failed","reason":SUSPECTED_FRAUD_REASON,"payment_id":payment_id})
+async def _apay_committed(req: PayReq):
+    try:
+        result = await _pay_async(req)
+    except HTTPException:
+        await _acommit(req)
+        raise
+    await _acommit(req)
+    return result
 
-        # Normal failures
-        if random.random() < PAYMENT_FAIL_RATE:
-            reason = random.choice(FAIL_REASONS)
-            statsd.increment("payment.failed", tags=[f"reason:{reason}", f"bank:{req.bank_id}"])
-            LOG.error("payment_failed", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": req.customer_id, "payment_id": payment_id, "bank_id": req.bank_id, "amount": req.amount, "status":"failed", "reason": reason})
-            raise HTTPException(status_code=502, detail={"error":"payment_failed","reason":reason,"payment_id":payment_id})
-
-        statsd.increment("payment.settled", tags=[f"bank:{req.bank_id}"])
-        LOG.info("payment_settled", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": req.customer_id, "payment_id": payment_id, "bank_id": req.bank_id, "amount": req.amount, "status":"settled"})
-        return {"ok": True, "payment_id": payment_id, "status":"settled", "bank_id": req.bank_id, "bank_name": bank_name(req.bank_id)}
+def pay(req: PayReq, response: Response, idempotency_key: Optional[str] = Header(default=None)):
+    if not idempotency_key:
+        return _pay_committed(req)
+    result, replayed = IDEMPOTENCY.run(*_idempotency_args(req, idempotency_key), lambda: _pay_committed(req))
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
+async def pay_async(req: PayReq, response: Response, idempotency_key: Optional[str] = Header(default=None)):
+    if not idempotency_key:
+        return await _apay_committed(req)
+    result, replayed = await IDEMPOTENCY.arun(*_idempotency_args(req, idempotency_key), lambda: _apay_committed(req))
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
+app.add_api_route("/pay", pay_async if PAYMENT_HANDLER == "async" else pay, methods=["POST"])
+
+def _ledger() -> Ledger:
+    if LEDGER is None:
+        raise HTTPException(status_code=404, detail="ledger_disabled")
+    return LEDGER
+
+@app.get("/payments/{payment_id}")
+def get_payment(payment_id: str):
+    payment = _ledger().get(payment_id)
+    if payment is None:
+        raise HTTPException(status_code=404, detail="payment_not_found")
+    return payment
+
+@app.get("/customers/{customer_id}/payments")
+def customer_payments(customer_id: str, limit: int = Query(default=50, ge=1, le=1000)):
+    """The customer's payments, newest first, in their current state."""
+    return {"customer_id": customer_id, "payments": _ledger().customer_payments(customer_id, limit)}
+
+install_stats(app, STATS)
+install_admission(app, statsd)
+install_deadline(app)
+install_trace_sampling(app, statsd)
@@ -0,0 +1,196 @@
+import os, time, secrets, sqlite3, tempfile, threading, logging
+from typing import Optional
+from .lru import TTLCache
+
+LOG = logging.getLogger("sessions")
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").strip().lower()
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "100000"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+
+
+def _default_db_path() -> str:
+    # /dev/shm keeps the db in RAM but visible to every worker process in the pod
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "dd-demo-sessions.db")
+
+
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "") or _default_db_path()
+
+
+class MemoryBackend:
+    """Per-process LRU/TTL map. Only valid with a single uvicorn worker."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._cache = TTLCache(max_entries, ttl)
+
+    def get(self, sid: str) -> Optional[str]:
+        return self._cache.get(sid)
+
+    def put(self, sid: str, value: str, ttl: float) -> int:
+        return self._cache.set(sid, value, ttl)
+
+    def delete(self, sid: str) -> None:
+        self._cache.pop(sid)
+
+    def size(self) -> int:
+        return len(self._cache)
+
+
+class SqliteBackend:
+    """Sessions in a WAL-mode SQLite file shared by every worker on the host (point it at /dev/shm)."""
+
+    TRIM_EVERY = 64  # amortise expiry/LRU trimming over puts
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self._local = threading.local()
+        self._puts = 0
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, last_seen REAL NOT NULL)")
+            c.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions(last_seen)")
+            c.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions(expires)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid: str) -> Optional[str]:
+        now = time.time()
+        row = self._conn().execute("SELECT value, last_seen FROM sessions WHERE sid = ? AND expires > ?", (sid, now)).fetchone()
+        if row is None:
+            return None
+        # LRU recency only needs coarse resolution; avoid a write on every request
+        if now - row[1] > 30:
+            self._conn().execute("UPDATE sessions SET last_seen = ? WHERE sid = ?", (now, sid))
+        return row[0]
+
+    def put(self, sid: str, value: str, ttl: float) -> int:
+        now = time.time()
+        c = self._conn()
+        c.execute("INSERT OR REPLACE INTO sessions (sid, value, expires, last_seen) VALUES (?, ?, ?, ?)", (sid, value, now + ttl, now))
+        self._puts += 1
+        if self._puts % self.TRIM_EVERY:
+            return 0
+        c.execute("DELETE FROM sessions WHERE expires <= ?", (now,))
+        over = c.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_entries
+        if over <= 0:
+            return 0
+        c.execute("DELETE FROM sessions WHERE sid IN (SELECT sid FROM sessions ORDER BY last_seen ASC LIMIT ?)", (over,))
+        return over
+
+    def delete(self, sid: str) -> None:
+        self._conn().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sessions WHERE expires > ?", (time.time(),)).fetchone()[0]
+
+
+class RedisBackend:
+    """Cross-pod sessions. Size capping is left to Redis (maxmemory + allkeys-lru).
+
+    Besides one key per session, a sorted set (`<prefix>index`, scored by expiry) tracks the sessions so that
+    size() counts only live sessions rather than every key in the database. Sessions evicted by Redis before
+    they expire stay in the index until their expiry time.
+    """
+
+    def __init__(self, url: str, prefix: str = "session:"):
+        import redis  # optional dependency, only needed for SESSION_BACKEND=redis
+        self._r = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        self._index = prefix + "index"
+
+    def get(self, sid: str) -> Optional[str]:
+        return self._r.get(self._prefix + sid)
+
+    def put(self, sid: str, value: str, ttl: float) -> int:
+        p = self._r.pipeline(transaction=False)
+        p.set(self._prefix + sid, value, ex=max(1, int(ttl)))
+        p.zadd(self._index, {sid: time.time() + ttl})
+        p.execute()
+        return 0
+
+    def delete(self, sid: str) -> None:
+        p = self._r.pipeline(transaction=False)
+        p.delete(self._prefix + sid)
+        p.zrem(self._index, sid)
+        p.execute()
+
+    def size(self) -> int:
+        p = self._r.pipeline(transaction=False)
+        p.zremrangebyscore(self._index, "-inf", time.time())
+        p.zcard(self._index)
+        return p.execute()[1]
+
+
+def make_backend(kind: str = SESSION_BACKEND):
+    if kind == "memory":
+        return MemoryBackend(SESSION_MAX_ENTRIES, SESSION_TTL_SECONDS)
+    if kind == "sqlite":
+        return SqliteBackend(SESSION_DB_PATH, SESSION_MAX_ENTRIES)
+    if kind == "redis":
+        return RedisBackend(SESSION_REDIS_URL)
+    raise RuntimeError(f"Unknown SESSION_BACKEND: {kind}")
+
+
+class SessionStore:
+    def __init__(self, backend, statsd=None, ttl: float = SESSION_TTL_SECONDS, metric_prefix: str = "web.session"):
+        self.backend = backend
+        self.ttl = ttl
+        self._statsd = statsd
+        self._prefix = metric_prefix
+        self._creates = 0
+
+    def _count(self, name: str, value: int = 1) -> None:
+        if self._statsd is not None and value:
+            self._statsd.increment(f"{self._prefix}.{name}", value)
+
+    def _error(self, e: Exception) -> None:
+        self._count("error")
+        LOG.error("session_backend_error", extra={"status": "session_backend_error", "reason": str(e)})
+
+    def create(self, value: str) -> Optional[str]:
+        """New session id for `value`, or None if the backend failed (counted and logged)."""
+        sid = secrets.token_urlsafe(16)
+        try:
+            evicted = self.backend.put(sid, value, self.ttl)
+        except Exception as e:
+            self._error(e)
+            return None
+        self._count("created")
+        self._count("evicted", evicted)
+        self._creates += 1
+        if self._creates % 64 == 1:
+            self.report_size()
+        return sid
+
+    def get(self, sid: Optional[str]) -> Optional[str]:
+        if not sid:
+            self._count("miss")
+            return None
+        try:
+            value = self.backend.get(sid)
+        except Exception as e:
+            self._error(e)
+            return None
+        self._count("hit" if value is not None else "miss")
+        return value
+
+    def delete(self, sid: str) -> None:
+        self.backend.delete(sid)
+
+    def report_size(self) -> None:
+        # Best effort: the session is already stored, a failed count must not fail the login
+        if self._statsd is None:
+            return
+        try:
+            self._statsd.gauge(f"{self._prefix}.size", self.backend.size())
+        except Exception as e:
+            self._error(e)
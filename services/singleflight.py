@@ -0,0 +1,72 @@
+import asyncio, threading
+
+
+class _Call:
+    __slots__ = ("event", "value", "exc")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.exc = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one execution (threads).
+
+    do() returns (value, shared): followers block until the leader finishes and get its value, or its
+    exception re-raised. Nothing is remembered once the leader returns.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            if call.exc is not None:
+                raise call.exc
+            return call.value, True
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.exc = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.value, False
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop; `fn` is a zero-argument coroutine function."""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        fut = self._calls.get(key)
+        if fut is not None:
+            # shield: a follower that is cancelled must not cancel the leader's shared future
+            return await asyncio.shield(fut), True
+        fut = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved so a leader-only failure doesn't log "never retrieved"
+            raise
+        else:
+            fut.set_result(value)
+        finally:
+            del self._calls[key]
+        return value, False
@@ -0,0 +1,95 @@
+"""Cold-start check: how long each service module takes to import and initialise.
+
+    python -m services.startup                                   # total import time per service
+    python -m services.startup --profile-startup services.payment_service --top 20
+
+Each module is imported in a fresh interpreter, so nothing is shared between measurements. With
+--profile-startup the child runs under `python -X importtime` and the report breaks the time down into our
+own modules (self time = module body, i.e. initialisation such as patching, clients and app setup) and the
+third-party packages they pull in (cumulative time of each package's first import).
+"""
+import os, re, sys, json, argparse, subprocess
+
+SERVICES = (
+    "services.auth_service", "services.payment_service", "services.fraud_service",
+    "services.jira_poller", "services.web_frontend", "services.llm_service",
+)
+
+# __import__ rather than importlib.import_module: -X importtime only reports imports that go through it
+_CHILD = "import sys, time, json; t = time.perf_counter(); __import__(sys.argv[1]); " \
+         "print(json.dumps({'import_ms': (time.perf_counter() - t) * 1000}), file=sys.__stdout__, flush=True)"
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def _run(module: str, profile: bool, env: dict = None) -> tuple:
+    cmd = [sys.executable, *(["-X", "importtime"] if profile else []), "-c", _CHILD, module]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    p = subprocess.run(cmd, cwd=root, env={**os.environ, **(env or {})}, capture_output=True, text=True, timeout=120)
+    lines = p.stdout.strip().splitlines()
+    if p.returncode != 0 or not lines:
+        raise RuntimeError(f"importing {module} failed:\n{p.stderr[-2000:]}")
+    return json.loads(lines[-1]), p.stderr
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self_ms, cumulative_ms, depth) per line of `-X importtime` output, in import order."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)) / 1000, int(m.group(2)) / 1000, len(m.group(3)) // 2))
+    return rows
+
+
+def breakdown(rows: list, own_prefix: str = "services") -> dict:
+    """Self time of our modules, and cumulative time of each third-party top-level package."""
+    own, packages = {}, {}
+    for name, self_ms, cum_ms, _ in rows:
+        top = name.split(".")[0]
+        if top == own_prefix:
+            own[name] = {"self_ms": round(self_ms, 1), "cumulative_ms": round(cum_ms, 1)}
+        elif name == top:
+            # A package's own line comes after its submodules and its cumulative time includes them
+            packages[top] = round(cum_ms, 1)
+    return {"own": own, "packages": packages}
+
+
+def profile(module: str, env: dict = None, detail: bool = False) -> dict:
+    result, stderr = _run(module, detail, env)
+    out = {"module": module, "import_ms": round(result["import_ms"], 1)}
+    if detail:
+        out.update(breakdown(parse_importtime(stderr)))
+    return out
+
+
+def _print(res: dict, top: int) -> None:
+    print(f"{res['module']:28s} {res['import_ms']:8.1f} ms")
+    if "own" not in res:
+        return
+    own = sorted(res["own"].items(), key=lambda kv: -kv[1]["self_ms"])[:top]
+    for name, t in own:
+        print(f"    {name:40s} self {t['self_ms']:7.1f} ms   cumulative {t['cumulative_ms']:7.1f} ms")
+    for name, ms in sorted(res["packages"].items(), key=lambda kv: -kv[1])[:top]:
+        print(f"    {name:40s} {ms:7.1f} ms")
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("modules", nargs="*", default=list(SERVICES))
+    ap.add_argument("--profile-startup", action="store_true", help="per-module import and initialisation breakdown")
+    ap.add_argument("--top", type=int, default=10, help="rows per section in the breakdown")
+    ap.add_argument("--json", help="also write the results to this file")
+    args = ap.parse_args(argv)
+
+    results = []
+    for module in args.modules:
+        res = profile(module, detail=args.profile_startup)
+        results.append(res)
+        _print(res, args.top)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os, gzip, hashlib, pathlib, threading
+from typing import Callable, Optional
+from fastapi import Request, Response
+
+# Re-stat source files on every request and rebuild when they change (for local dev)
+STATIC_RELOAD = os.getenv("STATIC_RELOAD", "false").lower() in ("1", "true", "yes", "y")
+
+
+class StaticResponse:
+    """A constant response rendered, gzipped and hashed once, served with ETag/304 support."""
+
+    def __init__(self, render: Callable[[], bytes], media_type: str, cache_control: str, source: Optional[pathlib.Path] = None, reload: bool = STATIC_RELOAD):
+        self._render = render
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.source = source
+        self.reload = reload and source is not None
+        self._lock = threading.Lock()
+        self._build()
+
+    @classmethod
+    def from_bytes(cls, body: bytes, media_type: str, cache_control: str) -> "StaticResponse":
+        return cls(lambda: body, media_type, cache_control)
+
+    @classmethod
+    def from_file(cls, path: pathlib.Path, media_type: str, cache_control: str, transform: Callable[[str], str] = None, reload: bool = STATIC_RELOAD) -> "StaticResponse":
+        def render() -> bytes:
+            text = path.read_text(encoding="utf-8")
+            return (transform(text) if transform else text).encode("utf-8")
+        return cls(render, media_type, cache_control, source=path, reload=reload)
+
+    def _build(self) -> None:
+        mtime = self.source.stat().st_mtime_ns if self.source is not None else None
+        body = self._render()
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        gz = gzip.compress(body, compresslevel=9, mtime=0)
+        # The gzip variant is a different representation, so it gets its own strong ETag
+        self._variants = {
+            False: (body, f'"{digest}"'),
+            True: (gz, f'"{digest}-gz"') if len(gz) < len(body) else (body, f'"{digest}"'),
+        }
+        self._etags = {self._variants[False][1], self._variants[True][1]}
+        self._mtime = mtime
+
+    def _maybe_reload(self) -> None:
+        try:
+            mtime = self.source.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._build()
+
+    def _not_modified(self, request: Request) -> bool:
+        inm = request.headers.get("if-none-match")
+        if not inm:
+            return False
+        tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+        return "*" in tags or not tags.isdisjoint(self._etags)
+
+    def response(self, request: Request) -> Response:
+        if self.reload:
+            self._maybe_reload()
+        want_gzip = "gzip" in request.headers.get("accept-encoding", "")
+        body, etag = self._variants[want_gzip]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if self._not_modified(request):
+            return Response(status_code=304, headers=headers)
+        if body is not self._variants[False][0]:
+            headers["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type=self.media_type, headers=headers)
@@ -1,13 +1,20 @@
-import os, json, logging, secrets, pathlib, requests
-from fastapi import FastAPI, Request, Response, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+import os, json, logging, pathlib
+from typing import Optional
+from fastapi import FastAPI, Request, Response, HTTPException, Header
+from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
-from datadog import DogStatsd
 from ddtrace import tracer
-from .obs import init_observability, current_dd_ids, base_fields
-from .banks import BANKS
-
-init_observability()
+from .obs import init_observability, current_dd_ids, base_fields, timed, install_trace_sampling
+from .metrics import make_statsd, preintern, tags
+from .banks import BANKS_JSON, BANK_IDS
+from .sessions import SessionStore, make_backend
+from .idempotency import IdempotencyCache, REPLAYED_HEADER
+from .http_client import CIRCUIT_OPEN_SECONDS, Upstream, UpstreamUnavailable, install_deadline
+from .admission import install_admission
+from .fastjson import FastJSONResponse, install_fast_json
+from .static_cache import StaticResponse
+
+init_observability(integrations=("fastapi", "requests"))
 LOG = logging.getLogger("web_frontend")
 
 DD_SERVICE = os.getenv("DD_SERVICE","web-frontend")
@@ -24,11 +31,31 @@ RUM = {
   "sessionReplaySampleRate": int(os.getenv("DD_RUM_SESSION_REPLAY_SAMPLE_RATE","100")),
 }
 
-statsd = DogStatsd(host=os.getenv("DD_AGENT_HOST","127.0.0.1"), port=int(os.getenv("DD_DOGSTATSD_PORT","8125")),
-                   constant_tags=[f"service:{DD_SERVICE}", f"env:{os.getenv('DD_ENV','dev')}", f"version:{os.getenv('DD_VERSION','0.1.0')}"])
+statsd = make_statsd(DD_SERVICE)
+preintern(("bank", BANK_IDS))
+
+def _declined(status: int, body) -> bool:
+    # payment-service answers a declined payment with 502 {"detail": {"error": "payment_failed", ...}}
+    detail = body.get("detail") if isinstance(body, dict) else None
+    return status == 502 and isinstance(detail, dict) and detail.get("error") == "payment_failed"
+
+def _payment_fault(r) -> bool:
+    # Breaker classifier for payment-service: declines are final business results, not upstream faults
+    if r.status_code == 502:
+        try:
+            return not _declined(502, r.json())
+        except ValueError:
+            return True
+    return r.status_code in (500, 503, 504)
+
+AUTH = Upstream("auth-service", AUTH_SERVICE_URL, timeout=10, statsd=statsd)
+PAYMENT = Upstream("payment-service", PAYMENT_SERVICE_URL, timeout=15, statsd=statsd, is_failure=_payment_fault)
+# Retry-After sent when an upstream's circuit is open, so clients back off instead of hammering it
+UNAVAILABLE_RETRY_AFTER = str(int(CIRCUIT_OPEN_SECONDS))
 
 app = FastAPI(title="Web Frontend", version=os.getenv("DD_VERSION","0.1.0"))
-SESSIONS = {}
+install_fast_json(app)
+SESSIONS = SessionStore(make_backend(), statsd=statsd)
 
 class LoginReq(BaseModel):
     username: str
@@ -38,60 +65,109 @@ class PayReq(BaseModel):
     bank_id: str
     amount: float
 
-def _index_html() -> str:
-    html_path = pathlib.Path(__file__).parent / "web" / "index.html"
-    return html_path.read_text(encoding="utf-8")
+# HTML embeds the RUM config, so browsers must revalidate (cheap 304 via ETag)
+INDEX_PAGE = StaticResponse.from_file(
+    pathlib.Path(__file__).parent / "web" / "index.html", "text/html; charset=utf-8", "no-cache",
+    transform=lambda html: html.replace("__RUM_CONFIG__", json.dumps(RUM)),
+)
+BANKS_RESPONSE = StaticResponse.from_bytes(BANKS_JSON, "application/json", "public, max-age=300")
 
 @app.get("/", response_class=HTMLResponse)
-def index():
-    html = _index_html().replace("__RUM_CONFIG__", json.dumps(RUM))
-    return HTMLResponse(html)
+def index(request: Request):
+    return INDEX_PAGE.response(request)
 
 @app.get("/api/banks")
-def banks():
-    return {"banks": BANKS}
+def banks(request: Request):
+    return BANKS_RESPONSE.response(request)
 
 @app.post("/api/login")
-def login(req: LoginReq, response: Response):
+def login(req: LoginReq):
     with tracer.trace("web.login", service=DD_SERVICE, resource="POST /api/login"):
         try:
-            r = requests.post(f"{AUTH_SERVICE_URL.rstrip('/')}/auth/login", json=req.dict(), timeout=10)
+            with timed(statsd, "web.stage.duration", "auth_upstream") as t:
+                r = AUTH.post("/auth/login", json=req.model_dump())
+                if r.status_code != 200:
+                    t.outcome = "rejected"
+        except UpstreamUnavailable as e:
+            LOG.warning("auth_upstream_unavailable", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status":"auth_upstream_unavailable", "reason": str(e)})
+            raise HTTPException(status_code=503, detail="auth_unavailable", headers={"Retry-After": UNAVAILABLE_RETRY_AFTER})
         except Exception as e:
             LOG.error("auth_upstream_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "status":"auth_upstream_error", "reason": str(e)})
             raise HTTPException(status_code=502, detail="auth_upstream_error")
 
         if r.status_code != 200:
             statsd.increment("web.auth.failed")
-            return JSONResponse(status_code=401, content=r.json())
+            # auth-service's error body as it came, without decoding and re-encoding it
+            return Response(r.content, status_code=401, media_type=r.headers.get("content-type", "application/json"))
 
         cid = r.json()["customer_id"]
-        sid = secrets.token_urlsafe(16)
-        SESSIONS[sid] = cid
-        response.set_cookie("session_id", sid, httponly=False)
+        with timed(statsd, "web.stage.duration", "session_create") as t:
+            sid = SESSIONS.create(cid)
+            if sid is None:
+                t.outcome = "error"
+        if sid is None:
+            # Session backend (sqlite / redis) down: the login is fine, but there is nowhere to keep it
+            raise HTTPException(status_code=503, detail="session_unavailable")
+        response = FastJSONResponse({"ok": True, "customer_id": cid})
+        response.set_cookie("session_id", sid, httponly=False, max_age=int(SESSIONS.ttl))
         statsd.increment("web.auth.ok")
         LOG.info("auth_ok", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": cid, "status":"auth_ok"})
-        return {"ok": True, "customer_id": cid}
+        return response
 
 def _require_session(request: Request) -> str:
-    sid = request.cookies.get("session_id")
-    if not sid or sid not in SESSIONS:
+    with timed(statsd, "web.stage.duration", "session_lookup"):
+        cid = SESSIONS.get(request.cookies.get("session_id"))
+    if cid is None:
         raise HTTPException(status_code=401, detail="not_authenticated")
-    return SESSIONS[sid]
+    return cid
+
+def _forward_pay(cid: str, req: PayReq, idempotency_key: Optional[str]) -> tuple:
+    """Call payment-service; returns (status, body, headers) for the browser."""
+    headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+    try:
+        with timed(statsd, "web.stage.duration", "payment_upstream", bank=req.bank_id) as t:
+            r = PAYMENT.post("/pay", json={"customer_id": cid, "bank_id": req.bank_id, "amount": req.amount}, headers=headers)
+            if r.status_code != 200:
+                t.outcome = "rejected"
+    except UpstreamUnavailable as e:
+        LOG.warning("payment_upstream_unavailable", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": cid, "bank_id": req.bank_id, "amount": req.amount, "status":"payment_upstream_unavailable", "reason": str(e)})
+        raise HTTPException(status_code=503, detail="payment_unavailable", headers={"Retry-After": UNAVAILABLE_RETRY_AFTER})
+    except Exception as e:
+        LOG.error("payment_upstream_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": cid, "bank_id": req.bank_id, "amount": req.amount, "status":"payment_upstream_error", "reason": str(e)})
+        raise HTTPException(status_code=502, detail="payment_upstream_error")
+
+    if r.status_code != 200:
+        statsd.increment("web.payment.error", tags=tags("bank", req.bank_id))
+        # Pass load-shedding back-off through to the browser
+        retry = {"Retry-After": r.headers["Retry-After"]} if "Retry-After" in r.headers else None
+        return r.status_code, r.json(), retry
+
+    statsd.increment("web.payment.ok", tags=tags("bank", req.bank_id))
+    LOG.info("payment_ok", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": cid, "bank_id": req.bank_id, "amount": req.amount, "status":"payment_ok"})
+    return 200, r.json(), None
+
+def _final_outcome(result: tuple) -> bool:
+    # Settled or declined payments are final; shedding and upstream errors are worth retrying
+    status, body, _ = result
+    return status == 200 or _declined(status, body)
+
+IDEMPOTENCY = IdempotencyCache(statsd=statsd, metric_prefix="web.idempotency", cacheable=_final_outcome)
 
 @app.post("/api/pay")
-def pay(req: PayReq, request: Request):
+def pay(req: PayReq, request: Request, idempotency_key: Optional[str] = Header(default=None)):
     with tracer.trace("web.pay", service=DD_SERVICE, resource="POST /api/pay"):
         cid = _require_session(request)
-        try:
-            r = requests.post(f"{PAYMENT_SERVICE_URL.rstrip('/')}/pay", json={"customer_id": cid, "bank_id": req.bank_id, "amount": req.amount}, timeout=15)
-        except Exception as e:
-            LOG.error("payment_upstream_error", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": cid, "bank_id": req.bank_id, "amount": req.amount, "status":"payment_upstream_error", "reason": str(e)})
-            raise HTTPException(status_code=502, detail="payment_upstream_error")
-
-        if r.status_code != 200:
-            statsd.increment("web.payment.error", tags=[f"bank:{req.bank_id}"])
-            return JSONResponse(status_code=r.status_code, content=r.json())
-
-        statsd.increment("web.payment.ok", tags=[f"bank:{req.bank_id}"])
-        LOG.info("payment_ok", extra={**base_fields(DD_SERVICE), **current_dd_ids(), "customer_id": cid, "bank_id": req.bank_id, "amount": req.amount, "status":"payment_ok"})
-        return r.json()
+        if not idempotency_key:
+            status, body, headers = _forward_pay(cid, req, None)
+        else:
+            (status, body, headers), replayed = IDEMPOTENCY.run(
+                f"{cid}:{idempotency_key}", (req.bank_id, req.amount), lambda: _forward_pay(cid, req, idempotency_key)
+            )
+            if replayed:
+                headers = {**(headers or {}), REPLAYED_HEADER: "true"}
+        return FastJSONResponse(status_code=status, content=body, headers=headers)
+
+install_admission(app, statsd)
+install_deadline(app)
+# Outermost: the head sampling decision is made before anything else runs
+install_trace_sampling(app, statsd, root=True)
@@ -0,0 +1,11 @@
+import os, sys, pathlib, tempfile
+
+# Agent-less, quiet defaults (as scripts/bench/common.py uses) so the services import without Datadog or Jira
+for k, v in {
+    "DD_TRACE_ENABLED": "false", "DD_LLMOBS_AGENTLESS_ENABLED": "false", "DD_LLMOBS_ML_APP": "tests",
+    "JIRA_POLL_ENABLED": "false", "JIRA_OUTBOX_ENABLED": "false", "LOG_LEVEL": "WARNING",
+    "LEDGER_PATH": os.path.join(tempfile.mkdtemp(prefix="ledger-"), "ledger.bin"),
+}.items():
+    os.environ.setdefault(k, v)
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from services.admission import RouteLimiter, install_admission, parse_limits
+
+
+def _app(gate: asyncio.Event, spec: str, queue_timeout_ms: float = 500, monkeypatch=None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        await gate.wait()
+        return {"ok": True}
+
+    if monkeypatch is not None:
+        monkeypatch.setattr("services.admission.ADMISSION_QUEUE_TIMEOUT_MS", queue_timeout_ms)
+    install_admission(app, spec=spec, workers=1)
+    return app
+
+
+async def _burst(app, path: str, n: int, gate: asyncio.Event, release_after: float = 0.1) -> list:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        calls = [asyncio.create_task(client.get(path)) for _ in range(n)]
+        await asyncio.sleep(release_after)
+        gate.set()
+        return await asyncio.gather(*calls)
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def main():
+        gate = asyncio.Event()
+        responses = await _burst(_app(gate, "/slow=1:1"), "/slow", 4, gate)
+        shed = [r for r in responses if r.status_code == 503]
+        assert sorted(r.status_code for r in responses) == [200, 200, 503, 503]
+        assert all(r.json()["reason"] == "queue_full" and r.headers["retry-after"] == "1" for r in shed)
+    asyncio.run(main())
+
+
+def test_queued_request_times_out(monkeypatch):
+    async def main():
+        gate = asyncio.Event()
+        responses = await _burst(_app(gate, "/slow=1:4", queue_timeout_ms=20, monkeypatch=monkeypatch), "/slow", 2, gate)
+        assert [r.status_code for r in responses] == [200, 503]
+        assert responses[1].json()["reason"] == "queue_timeout"
+    asyncio.run(main())
+
+
+def test_service_prefixed_path_is_limited_in_the_monolith():
+    async def main():
+        gate = asyncio.Event()
+        app = _app(gate, "/slow=1:0")
+
+        async def mounted(scope, receive, send):
+            # What services.monolith does for /<service>/... paths
+            await app({**scope, "root_path": "/payment-service"}, receive, send)
+
+        responses = await _burst(mounted, "/payment-service/slow", 3, gate)
+        assert sorted(r.status_code for r in responses) == [200, 503, 503]
+    asyncio.run(main())
+
+
+def test_limits_are_split_between_workers():
+    assert parse_limits("/pay=64:128,/api/pay=5", workers=2) == {"/pay": (32, 64), "/api/pay": (3, 3)}
+
+
+def test_aimd_grows_slowly_and_backs_off_once_per_window():
+    async def main():
+        limiter = RouteLimiter("/pay", 10, 0, 1.0, adaptive=True, target_latency=0.5, min_limit=4)
+        for _ in range(10):
+            assert await limiter.acquire() is None
+            limiter.release(0.01, True)
+        assert 10.9 < limiter.limit < 11.0
+        for _ in range(3):
+            await limiter.acquire()
+            limiter.release(2.0, True)
+        assert limiter.limit < 10.0 and limiter.limit > 9.8
+        limiter._last_decrease -= 1.0
+        await limiter.acquire()
+        limiter.release(0.01, False)  # a 5xx counts like a slow request
+        assert limiter.limit < 9.0
+        assert limiter.in_flight == 0
+    asyncio.run(main())
+
+
+def test_aimd_never_drops_below_the_floor():
+    limiter = RouteLimiter("/pay", 5, 0, 1.0, adaptive=True, target_latency=0.0, min_limit=4)
+    for _ in range(10):
+        limiter.in_flight += 1
+        limiter.release(1.0, False)
+    assert limiter.limit == 4.0
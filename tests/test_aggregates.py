@@ -0,0 +1,114 @@
+import random
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.aggregates import OTHER, DDSketch, RollingAggregates, install_stats, merge_snapshots
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _exact(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+def test_quantiles_are_within_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(4, 1.5) for _ in range(20000)]
+    sketch = DDSketch(0.01)
+    for v in values:
+        sketch.add(v)
+    for q, got in zip((0.5, 0.9, 0.99), sketch.quantiles((0.5, 0.9, 0.99))):
+        assert got == pytest.approx(_exact(values, q), rel=0.01)
+    assert sketch.count == 20000 and sketch.sum == pytest.approx(sum(values))
+
+
+def test_merge_matches_one_sketch_and_subtract_undoes_it():
+    rng = random.Random(3)
+    a, b, both = DDSketch(0.01), DDSketch(0.01), DDSketch(0.01)
+    for i in range(5000):
+        v = rng.uniform(1, 5000)
+        (a if i % 2 else b).add(v)
+        both.add(v)
+    before = a.to_dict()
+    a.merge(b)
+    assert a.bins == both.bins and a.count == both.count
+    a.subtract(b)
+    assert a.bins == dict(before["bins"]) and a.count == before["count"]
+
+
+def test_sketches_with_different_accuracy_do_not_mix():
+    with pytest.raises(ValueError):
+        DDSketch(0.01).merge(DDSketch(0.02))
+
+
+def test_bins_stay_bounded():
+    sketch = DDSketch(0.01, max_bins=64)
+    for e in range(-20, 20):
+        for m in range(1, 50):
+            sketch.add(m * 10.0 ** e)
+    assert len(sketch.bins) <= 64
+    assert sketch.quantile(1.0) == pytest.approx(49e19, rel=0.01)  # folding only merges the lowest bins
+
+
+def test_zero_amounts_are_counted():
+    sketch = DDSketch()
+    for v in (0.0, 0.0, 0.0, 10.0):
+        sketch.add(v)
+    assert sketch.quantiles((0.5, 1.0)) == [0.0, pytest.approx(10.0, rel=0.01)]
+
+
+def test_window_slides_one_bucket_at_a_time():
+    clock = Clock()
+    agg = RollingAggregates(["ING"], window=10, buckets=5, clock=clock)
+    agg.record("ING", "approved", 10.0)
+    clock.now += 4
+    agg.record("ING", "rejected", 30.0, "suspicious transaction")
+    assert agg.snapshot()["banks"]["ING"]["outcomes"] == {"approved": 1, "rejected": 1}
+    clock.now += 6  # the first bucket has left the window
+    ing = agg.snapshot()["banks"]["ING"]
+    assert ing["outcomes"] == {"rejected": 1} and ing["reasons"] == {"suspicious transaction": 1}
+    assert ing["amount"]["sum"] == 30.0
+    clock.now += 10
+    assert agg.snapshot()["banks"]["ING"]["count"] == 0
+
+
+def test_unknown_banks_and_excess_reasons_share_other():
+    agg = RollingAggregates(["ING"], clock=Clock())
+    agg.record("NOPE", "approved", 1.0)
+    for i in range(40):
+        agg.record("ING", "rejected", 1.0, f"reason {i}")
+    banks = agg.snapshot()["banks"]
+    assert banks[OTHER]["count"] == 1
+    assert len(banks["ING"]["reasons"]) == 33 and banks["ING"]["reasons"][OTHER] == 8
+
+
+def test_replica_snapshots_merge_into_one():
+    clock = Clock()
+    replicas = [RollingAggregates(["ING", "BNP"], clock=clock) for _ in range(3)]
+    single = RollingAggregates(["ING", "BNP"], clock=clock)
+    rng = random.Random(1)
+    for i in range(600):
+        bank, amount = rng.choice(["ING", "BNP"]), rng.uniform(1, 900)
+        replicas[i % 3].record(bank, "approved", amount)
+        single.record(bank, "approved", amount)
+    app = FastAPI()
+    install_stats(app, single)
+    client = TestClient(app)
+    merged = client.post("/stats/merge", json=[r.snapshot(sketch=True) for r in replicas]).json()
+    expected = client.get("/stats", params={"sketch": "true"}).json()
+    assert merged["replicas"] == 3
+    for bank in ("ING", "BNP"):
+        assert merged["banks"][bank]["sketch"]["bins"] == expected["banks"][bank]["sketch"]["bins"]
+        assert merged["banks"][bank]["amount"]["p99"] == expected["banks"][bank]["amount"]["p99"]
+    assert client.post("/stats/merge", json=[{"banks": {"ING": {}}}]).status_code == 400
+    with pytest.raises(ValueError):
+        merge_snapshots([])
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from services.batching import AsyncBatcher, Batcher
+
+
+def test_async_batcher_fails_every_caller_on_a_short_result_list():
+    async def short(items):
+        return items[:-1]
+
+    async def run():
+        batcher = AsyncBatcher(short, max_size=3, max_wait=1)
+        return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True), 1)
+
+    results = asyncio.run(run())
+    assert len(results) == 3 and all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_async_batcher_scatters_results_and_per_item_errors():
+    async def fn(items):
+        return [ValueError(i) if i == 1 else i * 10 for i in items]
+
+    async def run():
+        batcher = AsyncBatcher(fn, max_size=3, max_wait=1)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    ok0, err, ok2 = asyncio.run(run())
+    assert (ok0[0], ok0[1], ok2[0]) == (0, 3, 20)
+    assert isinstance(err, ValueError)
+
+
+def test_batcher_fails_every_caller_on_a_short_result_list():
+    batcher = Batcher(lambda items: items[:-1], max_size=2, max_wait=0.5)
+    futures = [batcher.submit(i) for i in range(2)]
+    for f in futures:
+        with pytest.raises(RuntimeError):
+            f.result(timeout=2)
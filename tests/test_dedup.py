@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+
+from services import payment_service
+from services.dedup import DUPLICATE, NEW, DuplicateDetector
+
+
+def test_seen_does_not_record():
+    d = DuplicateDetector(window=60, expected=1000)
+    assert d.seen("c1", "ING", 10.0) == NEW
+    assert d.seen("c1", "ING", 10.0) == NEW
+    d.record("c1", "ING", 10.0)
+    assert d.seen("c1", "ING", 10.0) == DUPLICATE
+    assert d.seen("c1", "ING", 10.01) == NEW
+
+
+def test_check_records_every_payment():
+    d = DuplicateDetector(window=60, expected=1000)
+    assert d.check("c1", "ING", 10.0) == NEW
+    assert d.check("c1", "ING", 10.0) == DUPLICATE
+
+
+def test_retry_after_decline_is_not_a_duplicate(monkeypatch):
+    monkeypatch.setattr(payment_service, "DEDUP", DuplicateDetector(window=60, expected=1000))
+    monkeypatch.setattr(payment_service, "DEDUP_ENABLED", True)
+    monkeypatch.setattr(payment_service, "PAYMENT_SUSPECTED_FRAUD_RATE", 0.0)
+    monkeypatch.setattr(payment_service, "_processing_delay", lambda: 0.0)
+    client = TestClient(payment_service.app)
+    body = {"customer_id": "cust_retry", "bank_id": "ING", "amount": 42.0}
+
+    monkeypatch.setattr(payment_service, "PAYMENT_FAIL_RATE", 1.0)
+    for _ in range(2):
+        r = client.post("/pay", json=body)
+        assert r.status_code == 502
+        assert r.json()["detail"]["reason"] in payment_service.FAIL_REASONS
+
+    monkeypatch.setattr(payment_service, "PAYMENT_FAIL_RATE", 0.0)
+    assert client.post("/pay", json=body).status_code == 200
+    r = client.post("/pay", json=body)
+    assert r.status_code == 502
+    assert r.json()["detail"]["reason"] == payment_service.DUPLICATE_REASON
@@ -0,0 +1,67 @@
+import datetime
+import uuid
+
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from services.fastjson import FastJSONResponse, dumps, fragment, install_fast_json
+
+
+class Item(BaseModel):
+    name: str
+    secret: str = "hidden"
+
+
+def _app(fast: bool) -> FastAPI:
+    app = FastAPI()
+    if fast:
+        install_fast_json(app)
+
+    @app.get("/plain")
+    def plain():
+        return {"id": uuid.UUID(int=1), "at": datetime.date(2024, 1, 2), "items": [Item(name="a")], "n": 1.5, "none": None}
+
+    @app.get("/keys")
+    async def keys():
+        return {1: "one", 2: "two"}
+
+    class Public(BaseModel):
+        name: str
+
+    @app.get("/model", response_model=Public)
+    def model():
+        return Item(name="b")
+
+    @app.get("/headers")
+    def headers(response: Response):
+        response.headers["X-Extra"] = "1"
+        return {"ok": True}
+
+    @app.get("/error")
+    def error():
+        raise HTTPException(status_code=418, detail={"error": "teapot"}, headers={"X-Why": "tea"})
+
+    @app.get("/empty", status_code=204)
+    def empty():
+        raise HTTPException(status_code=304)
+
+    return app
+
+
+def test_responses_match_fastapi():
+    fast, default = TestClient(_app(True)), TestClient(_app(False))
+    for path in ("/plain", "/keys", "/model", "/headers", "/error"):
+        a, b = fast.get(path), default.get(path)
+        assert (a.status_code, a.json()) == (b.status_code, b.json()), path
+    assert fast.get("/model").json() == {"name": "b"}  # response_model still filters
+    assert fast.get("/headers").headers["X-Extra"] == "1"
+    assert fast.get("/error").headers["X-Why"] == "tea"
+    r = fast.get("/empty")
+    assert r.status_code == 304 and r.content == b""
+
+
+def test_fragments_are_embedded_verbatim():
+    body = FastJSONResponse({"cached": fragment(b'{"a":[1,2]}'), "b": 1}).body
+    assert body == b'{"cached":{"a":[1,2]},"b":1}'
+    assert dumps({"x": "é"}) == '{"x":"é"}'.encode()
@@ -0,0 +1,42 @@
+from services.banks import BANK_IDS
+from services.fraud_scoring import FraudScorer
+
+BANK = BANK_IDS[0]
+
+
+def test_buffers_grow_with_customers_up_to_the_cap():
+    scorer = FraudScorer(BANK_IDS, max_customers=10, initial_customers=2)
+    assert len(scorer.count) == 2
+    scorer.score_batch([f"c{i}" for i in range(5)], [BANK] * 5, [50.0] * 5, now=0)
+    assert len(scorer.count) == 8
+    scorer.score_batch([f"c{i}" for i in range(5, 20)], [BANK] * 15, [50.0] * 15, now=1)
+    assert len(scorer.count) == 10
+    assert scorer.customers == 10
+
+
+def test_history_survives_growth():
+    scorer = FraudScorer(BANK_IDS, max_customers=100, initial_customers=1)
+    for t in range(5):
+        scorer.score("steady", BANK, 40.0, now=t)
+    scorer.score_batch([f"other{i}" for i in range(50)], [BANK] * 50, [40.0] * 50, now=10)
+    score, fraudulent, reason = scorer.score("steady", BANK, 4000.0, now=11)
+    assert fraudulent and reason == "transaction above limit"
+
+
+def test_evicted_customer_starts_over():
+    scorer = FraudScorer(BANK_IDS, max_customers=2, initial_customers=1)
+    for t in range(5):
+        scorer.score("a", BANK, 40.0, now=t)
+    scorer.score("b", BANK, 40.0, now=5)
+    scorer.score("c", BANK, 40.0, now=6)
+    assert "a" not in scorer._slots
+    scorer.score("a", BANK, 40.0, now=7)
+    assert scorer.count[scorer._slots["a"]] == 1
+
+
+def test_a_burst_from_one_customer_is_rejected():
+    scorer = FraudScorer(BANK_IDS)
+    results = [scorer.score("burst", BANK_IDS[t % len(BANK_IDS)], 30.0, now=t) for t in range(12)]
+    assert not results[0][1]
+    assert results[-1][1] and results[-1][2] == "suspicious transaction"
+    assert [r[0] for r in results] == sorted(r[0] for r in results)
@@ -0,0 +1,37 @@
+import uuid
+
+from fastapi.testclient import TestClient
+
+from services import fraud_service
+from services.dedup import DuplicateDetector
+
+
+def _item(i: int) -> dict:
+    return {"trace_id": "1", "payment_id": str(uuid.uuid4()), "customer_id": f"cust_{i}", "bank_id": "ING", "amount": 10.0 + i}
+
+
+def _random_mode(monkeypatch, rate: float):
+    monkeypatch.setattr(fraud_service, "FRAUD_SCORING", "random")
+    monkeypatch.setattr(fraud_service, "FRAUD_CONFIRM_RATE", rate)
+    monkeypatch.setattr(fraud_service, "DEDUP", DuplicateDetector(window=60, expected=1000))
+    monkeypatch.setattr(fraud_service.JIRA_POLLER, "post", lambda *a, **kw: kw["fallback"]())
+
+
+def test_random_scoring_with_zero_confirm_rate_rejects_nothing(monkeypatch):
+    _random_mode(monkeypatch, 0.0)
+    client = TestClient(fraud_service.app)
+    for i in range(200):
+        body = client.post("/check", json=_item(i)).json()
+        assert body["fraudulent"] is False and body["reason"] is None
+        assert body["comment"] is not None  # approved checks still comment on Jira
+    results = client.post("/check/batch", json={"items": [_item(1000 + i) for i in range(50)]}).json()["results"]
+    assert not any(r["fraudulent"] for r in results)
+
+
+def test_duplicate_is_rejected_without_a_comment(monkeypatch):
+    _random_mode(monkeypatch, 0.0)
+    client = TestClient(fraud_service.app)
+    item = _item(1)
+    assert client.post("/check", json=item).json()["fraudulent"] is False
+    body = client.post("/check", json={**item, "payment_id": str(uuid.uuid4())}).json()
+    assert body == {"fraudulent": True, "reason": fraud_service.DUPLICATE_REASON, "comment": None, "score": None}
@@ -0,0 +1,88 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from services.http_client import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, Upstream, serve_locally
+from services.web_frontend import _payment_fault
+
+
+def _upstream(name: str, status: int, body: dict) -> Upstream:
+    app = FastAPI()
+
+    @app.post("/pay")
+    def pay():
+        return JSONResponse(body, status_code=status)
+
+    serve_locally(name, app)
+    return Upstream(name, "", breaker=CircuitBreaker(name, min_calls=5), is_failure=_payment_fault)
+
+
+def _call(up: Upstream, n: int) -> list:
+    async def run():
+        out = [(await up.apost("/pay", json={"amount": 1})).status_code for _ in range(n)]
+        await up.aclose()
+        return out
+    return asyncio.run(run())
+
+
+def test_declines_do_not_open_the_circuit():
+    up = _upstream("payment-declines", 502, {"detail": {"error": "payment_failed", "reason": "Insufficient funds"}})
+    assert _call(up, 40) == [502] * 40
+    assert up.breaker.state == CLOSED
+
+
+def test_upstream_errors_open_the_circuit():
+    up = _upstream("payment-errors", 502, {"detail": "bad_gateway"})
+    _call(up, 5)
+    assert up.breaker.state == OPEN
+
+
+def test_payment_fault_classifier():
+    class R:
+        def __init__(self, status, body=None):
+            self.status_code, self._body = status, body
+
+        def json(self):
+            if self._body is None:
+                raise ValueError("no body")
+            return self._body
+
+    assert not _payment_fault(R(200, {}))
+    assert not _payment_fault(R(404, {}))
+    assert not _payment_fault(R(502, {"detail": {"error": "payment_failed"}}))
+    assert _payment_fault(R(502))
+    assert all(_payment_fault(R(s, {})) for s in (500, 503, 504))
+
+
+def test_cancelled_half_open_probe_does_not_wedge_the_breaker():
+    now = [0.0]
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(10)
+
+    serve_locally("payment-cancel", app)
+    breaker = CircuitBreaker("payment-cancel", min_calls=1, open_seconds=1, half_open_calls=1, clock=lambda: now[0])
+    up = Upstream("payment-cancel", "", breaker=breaker)
+    breaker.record(False)
+    assert breaker.state == OPEN
+    now[0] = 2.0  # open_seconds elapsed: the next call is a half-open probe
+
+    async def run():
+        probe = asyncio.create_task(up.aget("/slow"))
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+        await up.aclose()
+    asyncio.run(run())
+
+    # The cancelled probe counted as a failure: open again, and half-open again once open_seconds pass
+    assert breaker.state == OPEN
+    now[0] = 4.0
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from services import payment_service
+from services.idempotency import IdempotencyCache, REPLAYED_HEADER
+
+
+def test_result_is_replayed_for_the_same_key():
+    cache = IdempotencyCache()
+    calls = []
+    fn = lambda: calls.append(1) or {"payment_id": "p1"}
+    assert cache.run("k", ("ING", 10.0), fn) == ({"payment_id": "p1"}, False)
+    assert cache.run("k", ("ING", 10.0), fn) == ({"payment_id": "p1"}, True)
+    assert len(calls) == 1
+
+
+def test_key_reused_for_a_different_request_is_422():
+    cache = IdempotencyCache()
+    cache.run("k", ("ING", 10.0), lambda: {"ok": True})
+    with pytest.raises(HTTPException) as e:
+        cache.run("k", ("ING", 99.0), lambda: {"ok": True})
+    assert e.value.status_code == 422
+
+
+def test_only_final_outcomes_are_remembered():
+    cache = IdempotencyCache(cache_statuses=(502,), cacheable=lambda value: value != "shed")
+
+    def fail(status):
+        raise HTTPException(status_code=status, detail="x")
+
+    for status, replayed in ((503, False), (502, True)):
+        with pytest.raises(HTTPException):
+            cache.run(f"k{status}", 1, lambda: fail(status))
+        with pytest.raises(HTTPException) as e:
+            cache.run(f"k{status}", 1, lambda: fail(status))
+        assert (REPLAYED_HEADER in (e.value.headers or {})) is replayed
+    assert cache.run("shed", 1, lambda: "shed") == ("shed", False)
+    assert cache.run("shed", 1, lambda: "paid") == ("paid", False)
+
+
+def test_concurrent_duplicates_run_once():
+    cache = IdempotencyCache()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return "paid"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.run("k", 1, slow))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(replayed for _, replayed in results) == [False] + [True] * 7
+
+
+def test_concurrent_async_duplicates_run_once():
+    async def main():
+        cache = IdempotencyCache()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "paid"
+
+        results = await asyncio.gather(*(cache.arun("k", 1, slow) for _ in range(5)))
+        assert len(calls) == 1
+        assert sorted(replayed for _, replayed in results) == [False] + [True] * 4
+    asyncio.run(main())
+
+
+def test_pay_replays_with_header(monkeypatch):
+    monkeypatch.setattr(payment_service, "IDEMPOTENCY", IdempotencyCache(cache_statuses=(502,)))
+    monkeypatch.setattr(payment_service, "DEDUP_ENABLED", False)
+    monkeypatch.setattr(payment_service, "PAYMENT_SUSPECTED_FRAUD_RATE", 0.0)
+    monkeypatch.setattr(payment_service, "PAYMENT_FAIL_RATE", 0.0)
+    monkeypatch.setattr(payment_service, "LEDGER", None)
+    monkeypatch.setattr(payment_service, "_processing_delay", lambda: 0.0)
+    client = TestClient(payment_service.app)
+    body = {"customer_id": "cust_idem", "bank_id": "ING", "amount": 20.0}
+    first = client.post("/pay", json=body, headers={"Idempotency-Key": "abc"})
+    again = client.post("/pay", json=body, headers={"Idempotency-Key": "abc"})
+    other = client.post("/pay", json={**body, "customer_id": "cust_other"}, headers={"Idempotency-Key": "abc"})
+    assert first.status_code == again.status_code == other.status_code == 200
+    assert again.json() == first.json() and again.headers[REPLAYED_HEADER] == "true"
+    assert other.json()["payment_id"] != first.json()["payment_id"]  # keys are scoped to the customer
@@ -0,0 +1,45 @@
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+
+from services import jira_poller
+from services.batching import Batcher
+
+
+class _Resp:
+    status_code, ok, headers = 201, True, {}
+
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+def test_bulk_create_without_a_key_fails_the_slot(monkeypatch):
+    monkeypatch.setattr(jira_poller, "JIRA_EMAIL", "bot@example.com")
+    monkeypatch.setattr(jira_poller, "JIRA_API_TOKEN", "token")
+    monkeypatch.setattr(jira_poller.JIRA, "post", lambda *a, **kw: _Resp({"issues": [{"key": "FRAUD-1"}], "errors": []}))
+    first, second = jira_poller._bulk_create([{"summary": "a"}, {"summary": "b"}])
+    assert first == "FRAUD-1"
+    assert isinstance(second, RuntimeError)
+
+
+def test_retry_after_a_bulk_timeout_reuses_the_queued_create(monkeypatch):
+    release, flushed = threading.Event(), []
+
+    def flush(fields):
+        release.wait(5)
+        flushed.extend(fields)
+        return [f"FRAUD-{i}" for i in range(len(fields))]
+
+    monkeypatch.setattr(jira_poller, "CREATE_BATCHER", Batcher(flush, max_size=10, max_wait=0.01))
+    monkeypatch.setattr(jira_poller, "BULK_RESULT_TIMEOUT_SECONDS", 0.1)
+    req = jira_poller.CreateReq(trace_id="1", payment_id="pay-1", customer_id="c", bank_id="ING", amount=1.0, reason="Suspected Fraud")
+    for _ in range(2):  # the outbox retrying while the first create is still in flight
+        with pytest.raises(FutureTimeout):
+            jira_poller._bulk_create_one(req)
+    release.set()
+    assert jira_poller._bulk_create_one(req) == "FRAUD-0"
+    assert len(flushed) == 1
@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from services import payment_service
+from services.ledger import Ledger
+
+BODY = {"customer_id": "cust_ledger", "bank_id": "ING", "amount": 12.5}
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    led = Ledger(str(tmp_path / "ledger.bin"))
+    monkeypatch.setattr(payment_service, "LEDGER", led)
+    monkeypatch.setattr(payment_service, "DEDUP_ENABLED", False)
+    monkeypatch.setattr(payment_service, "PAYMENT_SUSPECTED_FRAUD_RATE", 0.0)
+    monkeypatch.setattr(payment_service, "PAYMENT_FAIL_RATE", 0.0)
+    monkeypatch.setattr(payment_service, "LEDGER_SYNC_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(payment_service, "_processing_delay", lambda: 0.0)
+    yield led
+
+
+def test_settled_payment_is_durable(ledger):
+    r = TestClient(payment_service.app).post("/pay", json=BODY)
+    assert r.status_code == 200
+    assert ledger.get(r.json()["payment_id"])["status"] == "settled"
+
+
+def test_write_error_is_503(ledger, monkeypatch):
+    def fail(batch):
+        raise OSError("disk full")
+    monkeypatch.setattr(ledger, "_commit", fail)
+    r = TestClient(payment_service.app).post("/pay", json=BODY)
+    assert r.status_code == 503
+    assert r.json()["detail"] == "ledger_unavailable"
+
+
+def test_stalled_writer_is_503_not_a_hang(ledger, monkeypatch):
+    release = threading.Event()
+    commit = ledger._commit
+    monkeypatch.setattr(ledger, "_commit", lambda batch: (release.wait(), commit(batch)))
+    try:
+        r = TestClient(payment_service.app).post("/pay", json=BODY)
+        assert r.status_code == 503
+        with pytest.raises(HTTPException) as e:
+            payment_service._pay_committed(payment_service.PayReq(**BODY))
+        assert e.value.status_code == 503
+    finally:
+        release.set()
+    ledger.sync(5)  # the writer recovers once the disk does
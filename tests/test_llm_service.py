@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from services import llm_service
+from services.lru import TTLCache
+from services.singleflight import AsyncSingleFlight
+
+
+@pytest.fixture
+def model(monkeypatch):
+    calls = []
+
+    async def model_call(prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        if prompt == "boom":
+            raise RuntimeError("simulated_model_error")
+        return "out:" + prompt
+
+    monkeypatch.setattr(llm_service, "_model_call", model_call)
+    monkeypatch.setattr(llm_service, "_served_from_cache", lambda prompt, out, source: None)
+    monkeypatch.setattr(llm_service, "CACHE", TTLCache(100, 60))
+    monkeypatch.setattr(llm_service, "FLIGHT", AsyncSingleFlight())
+    monkeypatch.setattr(llm_service, "LLM_CACHE_ENABLED", True)
+    return calls
+
+
+def test_repeated_prompt_is_served_from_cache(model):
+    async def main():
+        assert await llm_service._generate("hello") == ("out:hello", "miss")
+        assert await llm_service._generate("hello") == ("out:hello", "hit")
+    asyncio.run(main())
+    assert model == ["hello"]
+
+
+def test_identical_in_flight_prompts_are_coalesced(model):
+    async def main():
+        return await asyncio.gather(*(llm_service._generate("same") for _ in range(5)), llm_service._generate("other"))
+    results = asyncio.run(main())
+    assert sorted(model) == ["other", "same"]
+    assert sorted(source for _, source in results[:5]) == ["coalesced"] * 4 + ["miss"]
+    assert results[5] == ("out:other", "miss")
+
+
+def test_errors_are_not_cached(model):
+    async def main():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await llm_service._generate("boom")
+    asyncio.run(main())
+    assert model == ["boom", "boom"]
+
+
+def test_cache_can_be_disabled(model, monkeypatch):
+    monkeypatch.setattr(llm_service, "LLM_CACHE_ENABLED", False)
+
+    async def main():
+        return [await llm_service._generate("hello") for _ in range(2)]
+    assert asyncio.run(main()) == [("out:hello", "miss")] * 2
+    assert model == ["hello", "hello"]
+
+
+def test_cache_key_separates_prompts():
+    assert llm_service._cache_key("a") == llm_service._cache_key("a")
+    assert llm_service._cache_key("a") != llm_service._cache_key("b")
+
+
+def test_batch_failure_stays_in_its_slot(monkeypatch):
+    def rule_model(prompt):
+        if prompt == "boom":
+            raise RuntimeError("simulated_model_error")
+        return "out:" + prompt
+
+    monkeypatch.setattr(llm_service, "_rule_model", rule_model)
+    monkeypatch.setattr(llm_service, "LLM_PREFILL_MS", 0.0)
+    out = asyncio.run(llm_service._simulate_llm_batch(["a", "boom", "b"]))
+    assert out[0] == "out:a" and out[2] == "out:b"
+    assert isinstance(out[1], RuntimeError)
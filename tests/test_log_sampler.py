@@ -0,0 +1,70 @@
+import logging
+import queue
+import threading
+
+from services.obs import LogSampler, _EnqueueHandler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _record(msg, level=logging.INFO, trace_id=0):
+    record = logging.LogRecord("test", level, __file__, 1, msg, None, None)
+    setattr(record, "dd.trace_id", str(trace_id))
+    return record
+
+
+def _kept(sampler, msg, n):
+    return sum(sampler.filter(_record(msg)) for _ in range(n))
+
+
+def test_budget_only_applies_to_configured_events():
+    clock = Clock()
+    sampler = LogSampler({"payment_created": 1.0}, budget_per_sec=10, clock=clock)
+    for _ in range(3):
+        _kept(sampler, "payment_created", 1000)
+        _kept(sampler, "request_served", 1000)
+        clock.now += 1.0
+    assert _kept(sampler, "request_served", 1000) == 1000
+    assert _kept(sampler, "payment_created", 1000) < 100
+    assert "request_served" not in sampler._window
+
+
+def test_warnings_and_fraud_events_are_never_sampled():
+    sampler = LogSampler({"payment_created": 0.0, "fraud_approved": 0.0})
+    assert sampler.filter(_record("payment_created", level=logging.WARNING))
+    assert sampler.filter(_record("fraud_approved"))
+    assert not sampler.filter(_record("payment_created"))
+
+
+def test_budget_window_is_consistent_across_threads():
+    clock = Clock()
+    sampler = LogSampler({"payment_created": 1.0}, budget_per_sec=1, clock=clock)
+    threads = [threading.Thread(target=_kept, args=(sampler, "payment_created", 5000)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sampler._window["payment_created"][1] == 40000
+
+
+def test_dropped_records_are_all_counted():
+    handler = _EnqueueHandler(queue.Queue(maxsize=1))
+    handler.enqueue(_record("first"))
+
+    def flood():
+        for _ in range(5000):
+            handler.enqueue(_record("overflow"))
+
+    threads = [threading.Thread(target=flood) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert handler.take_dropped() == 40000
+    assert handler.take_dropped() == 0
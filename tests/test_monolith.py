@@ -0,0 +1,43 @@
+import os, sys, json, pathlib, subprocess
+
+import pytest
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+# Runs in a fresh process: tracing has to be on from import, and the monolith loads every service
+SCRIPT = """
+import json, sys
+from fastapi.testclient import TestClient
+from services import monolith
+
+if sys.argv[1] == "no-core":
+    monolith.core = None  # as if a ddtrace upgrade had moved the private API
+
+spans = []
+
+class Collect(monolith.ServiceNameFilter):
+    def process_trace(self, trace):
+        spans.extend((s.resource, s.service) for s in super().process_trace(trace) if s.name == "fastapi.request")
+        return None  # nothing is sent to an agent
+
+monolith._install_filter(Collect())
+with TestClient(monolith.app) as client:
+    client.post("/api/login", json={"username": "alice", "password": "secret"})  # web-frontend -> auth-service
+    client.get("/banks")
+    client.get("/fraud-service/stats")
+monolith.tracer.flush()
+print(json.dumps(spans))
+"""
+
+
+@pytest.mark.parametrize("mode", ["core", "no-core"])
+def test_request_spans_are_named_after_each_service(mode, tmp_path):
+    env = {**os.environ, "DD_TRACE_ENABLED": "true", "DD_TRACE_AGENT_URL": "http://127.0.0.1:9", "DD_SERVICE": "monolith",
+           "LEDGER_PATH": str(tmp_path / "ledger.bin"), "PYTHONPATH": str(REPO_ROOT)}
+    p = subprocess.run([sys.executable, "-c", SCRIPT, mode], env=env, cwd=REPO_ROOT, capture_output=True, text=True, timeout=120)
+    assert p.returncode == 0, p.stderr
+    services = {resource: service for resource, service in json.loads(p.stdout.strip().splitlines()[-1])}
+    assert services["POST /api/login"] == "web-frontend"
+    assert services["POST /auth/login"] == "auth-service"
+    assert services["GET /banks"] == "payment-service"
+    assert services["GET /stats"] == "fraud-service"
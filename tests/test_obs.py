@@ -0,0 +1,21 @@
+import json
+import logging
+
+from services import obs
+
+
+def test_async_logging_leaves_logging_internals_alone(monkeypatch):
+    srcfile = logging._srcfile
+    monkeypatch.setattr(obs, "LOG_MODE", "async")
+    for name in ("logThreads", "logProcesses", "logMultiprocessing"):
+        monkeypatch.setattr(logging, name, getattr(logging, name))
+    obs.init_observability(integrations=())
+    assert logging._srcfile is srcfile
+    assert not (logging.logThreads or logging.logProcesses or logging.logMultiprocessing)
+
+
+def test_formatter_emits_no_caller_info():
+    record = logging.LogRecord("test", logging.INFO, __file__, 7, "payment_created", None, None, func="pay")
+    line = json.loads(obs.FastJsonFormatter().encode(record))
+    assert line["message"] == "payment_created"
+    assert not {"pathname", "filename", "lineno", "funcName", "module"} & line.keys()
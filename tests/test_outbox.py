@@ -0,0 +1,61 @@
+import pytest
+
+from services.jira_poller import _needs_created_issue
+from services.outbox import Outbox
+
+
+class Statsd:
+    def __init__(self):
+        self.calls = []
+
+    def increment(self, metric, value=1, tags=None):
+        self.calls.append((metric, value, tags))
+
+    def distribution(self, metric, value, tags=None):
+        self.calls.append((metric, value, tags))
+
+    def gauge(self, metric, value, tags=None):
+        self.calls.append((metric, value, tags))
+
+
+def _ready(box):
+    with box._lock:
+        return box._db.execute(
+            "SELECT id, key, kind, payload, attempts, created FROM outbox WHERE status = 'pending' ORDER BY id"
+        ).fetchall()
+
+
+def _statuses(box):
+    with box._lock:
+        return box._db.execute("SELECT kind, status, last_error FROM outbox ORDER BY id").fetchall()
+
+
+def test_dead_create_takes_its_comments_with_it(tmp_path):
+    def create(payload, key):
+        raise RuntimeError("jira down")
+
+    handlers = {"create_issue": create, "comment": lambda payload, key: {"issue_key": "X-1"}}
+    box = Outbox(str(tmp_path / "outbox.db"), handlers, max_attempts=1, dependent=_needs_created_issue)
+    box.enqueue("create_issue", "pay_1", {"summary": "s"})
+    box.enqueue("comment", "pay_1", {"comment": "by payment"})
+    box.enqueue("comment", "pay_1", {"comment": "by issue", "issue_key": "X-9"})
+    box.enqueue("comment", "pay_2", {"comment": "other payment"})
+
+    box._deliver(_ready(box)[0])
+
+    statuses = _statuses(box)
+    assert [s for _, s, _ in statuses] == ["dead", "dead", "pending", "pending"]
+    assert "dead-lettered outbox entry" in statuses[1][2]
+
+
+def test_delivery_lag_is_in_milliseconds(tmp_path, monkeypatch):
+    statsd = Statsd()
+    box = Outbox(str(tmp_path / "outbox.db"), {"comment": lambda payload, key: None}, statsd=statsd)
+    box.enqueue("comment", "pay_1", {})
+    row = _ready(box)[0]
+    monkeypatch.setattr("services.outbox.time.time", lambda: row[5] + 2.5)
+
+    box._deliver(row)
+
+    lag = [v for m, v, _ in statsd.calls if m == "outbox.delivery_lag"]
+    assert lag == [pytest.approx(2500.0)]
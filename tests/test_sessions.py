@@ -0,0 +1,58 @@
+from fastapi.testclient import TestClient
+
+from services import web_frontend
+from services.sessions import MemoryBackend, SessionStore
+
+
+class _Down(MemoryBackend):
+    def put(self, sid, value, ttl):
+        raise ConnectionError("backend down")
+
+    def get(self, sid):
+        raise ConnectionError("backend down")
+
+
+class _AuthOK:
+    status_code, headers = 200, {}
+
+    def json(self):
+        return {"ok": True, "customer_id": "cust_1"}
+
+
+def test_backend_errors_are_absorbed():
+    store = SessionStore(_Down(10, 60))
+    assert store.create("cust_1") is None
+    assert store.get("sid") is None
+
+
+def test_login_is_503_when_the_session_backend_is_down(monkeypatch):
+    monkeypatch.setattr(web_frontend, "SESSIONS", SessionStore(_Down(10, 60)))
+    monkeypatch.setattr(web_frontend.AUTH, "post", lambda *a, **kw: _AuthOK())
+    r = TestClient(web_frontend.app).post("/api/login", json={"username": "alice", "password": "secret"})
+    assert r.status_code == 503
+    assert r.json()["detail"] == "session_unavailable"
+    assert "session_id" not in r.cookies
+
+
+class _SizeDown(MemoryBackend):
+    def size(self):
+        raise ConnectionError("backend down")
+
+
+class _Statsd:
+    def __init__(self):
+        self.counts = []
+
+    def increment(self, name, value=1, tags=None):
+        self.counts.append(name)
+
+    def gauge(self, name, value, tags=None):
+        pass
+
+
+def test_failed_size_report_does_not_fail_create():
+    statsd = _Statsd()
+    store = SessionStore(_SizeDown(10, 60), statsd=statsd)
+    sid = store.create("cust_1")  # the first create reports the size
+    assert sid is not None and store.get(sid) == "cust_1"
+    assert "web.session.error" in statsd.counts
@@ -0,0 +1,56 @@
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from services.static_cache import StaticResponse
+
+BODY = b"<html>" + b"hello world " * 200 + b"</html>"
+
+
+def _client(static: StaticResponse) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/")
+    def index(request: Request):
+        return static.response(request)
+
+    return TestClient(app)
+
+
+def test_gzip_variant_has_its_own_etag():
+    client = _client(StaticResponse.from_bytes(BODY, "text/html", "no-cache"))
+    gz = client.get("/", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert gz.headers["content-encoding"] == "gzip" and gz.content == BODY  # decoded by the client
+    assert "content-encoding" not in plain.headers and plain.content == BODY
+    assert gz.headers["etag"] == plain.headers["etag"][:-1] + '-gz"'
+    assert gz.headers["vary"] == "Accept-Encoding" and gz.headers["cache-control"] == "no-cache"
+
+
+def test_matching_etag_is_304():
+    client = _client(StaticResponse.from_bytes(BODY, "text/html", "no-cache"))
+    etag = client.get("/", headers={"Accept-Encoding": "identity"}).headers["etag"]
+    for inm in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        r = client.get("/", headers={"If-None-Match": inm, "Accept-Encoding": "identity"})
+        assert r.status_code == 304 and r.content == b"" and r.headers["etag"] == etag
+    assert client.get("/", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_small_bodies_are_not_gzipped():
+    client = _client(StaticResponse.from_bytes(b"[]", "application/json", "no-cache"))
+    r = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers and r.content == b"[]"
+
+
+def test_reload_rebuilds_when_the_file_changes(tmp_path):
+    page = tmp_path / "index.html"
+    page.write_text("v1 {{name}}")
+    static = StaticResponse.from_file(page, "text/html", "no-cache", transform=lambda t: t.replace("{{name}}", "demo"), reload=True)
+    client = _client(static)
+    first = client.get("/")
+    assert first.text == "v1 demo"
+    page.write_text("v2 {{name}}")
+    os.utime(page, ns=(0, page.stat().st_mtime_ns + 10**9))
+    second = client.get("/", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200 and second.text == "v2 demo"
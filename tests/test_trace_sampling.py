@@ -0,0 +1,113 @@
+import logging
+
+from ddtrace import tracer
+from ddtrace.constants import MANUAL_DROP_KEY, MANUAL_KEEP_KEY
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from services import obs
+from services.obs import KEEP_REASON_TAG, TRACE_KEEP_HEADER, LogSampler, TraceSampler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Span:
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.tags, self.metrics = {}, {}
+
+    def set_tag(self, key, value=None):
+        self.tags[key] = value
+
+    def set_metric(self, key, value):
+        self.metrics[key] = value
+
+
+def test_rate_adapts_to_the_target_once_per_second():
+    clock = Clock()
+    sampler = TraceSampler(target_tps=10, clock=clock)
+    for _ in range(100):
+        assert sampler.rate() == 1.0
+    clock.now = 1.0
+    assert sampler.rate() == 0.1
+    for _ in range(4):
+        sampler.rate()
+    clock.now = 2.0
+    assert sampler.rate() == 1.0  # 5 traces/s is under the target
+
+
+def test_head_decision_is_marked_on_the_span_and_matches_log_sampling():
+    clock = Clock()
+    sampler = TraceSampler(target_tps=25, clock=clock)
+    for _ in range(100):
+        sampler.rate()
+    clock.now = 1.0
+    log_sampler = LogSampler({"payment_settled": 0.25})
+    kept = 0
+    for trace_id in range(1, 2001):
+        span = Span(trace_id * 7919)
+        keep = sampler.sample(span)
+        assert (MANUAL_KEEP_KEY if keep else MANUAL_DROP_KEY) in span.tags
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "payment_settled", None, None)
+        setattr(record, "dd.trace_id", str(span.trace_id))
+        assert log_sampler.filter(record) is keep
+        kept += keep
+    assert 400 < kept < 600
+
+
+def test_first_keep_reason_wins():
+    with tracer.trace("root") as span:
+        obs.keep_trace("fraud_rejected")
+        obs.keep_trace("error")
+        assert span.get_tag(KEEP_REASON_TAG) == "fraud_rejected"
+        assert span.context.sampling_priority == 2
+
+
+def _traced(app):
+    async def asgi(scope, receive, send):
+        if scope["type"] != "http":
+            return await app(scope, receive, send)
+        with tracer.trace("fastapi.request"):  # ddtrace's request span
+            await app(scope, receive, send)
+    return asgi
+
+
+class Statsd:
+    def __init__(self):
+        self.tags = []
+
+    def increment(self, metric, value=1, tags=None):
+        self.tags.append(tags)
+
+
+def _service(root: bool, statsd=None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/status/{code}")
+    def status(code: int):
+        if code >= 400:
+            raise HTTPException(status_code=code)
+        return {"ok": True}
+
+    obs.install_trace_sampling(app, statsd=statsd, root=root)
+    return app
+
+
+def test_downstream_reports_kept_traces_to_its_caller():
+    client = TestClient(_traced(_service(root=False)))
+    assert client.get("/status/500").headers[TRACE_KEEP_HEADER] == "error"
+    assert TRACE_KEEP_HEADER not in client.get("/status/404").headers  # only the root keeps 4xx
+    assert TRACE_KEEP_HEADER not in client.get("/status/200").headers
+
+
+def test_root_keeps_rejections_without_echoing_the_header():
+    statsd = Statsd()
+    r = TestClient(_traced(_service(root=True, statsd=statsd))).get("/status/401")
+    assert r.status_code == 401 and TRACE_KEEP_HEADER not in r.headers
+    assert [list(t) for t in statsd.tags] == [["decision:keep", "reason:rejected"]]